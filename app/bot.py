@@ -1,19 +1,51 @@
 from __future__ import annotations
 
+from typing import Any, Optional
+
 from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.fsm.storage.base import BaseStorage
 from aiogram.fsm.storage.memory import MemoryStorage
 
-from app.handlers import start, menu, measure, timezone, reminders, reports
+from app.handlers import admin, start, menu, measure, timezone, reminders, reports, export, bulk_import
+from app.infra.metrics import HandlerMetricsMiddleware
+
+class HealthBot(Bot):
+    """Bot that also carries the app's shared objects: bot["db"] = db, callback.bot.get("db")."""
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self._shared: dict[str, Any] = {}
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._shared[key] = value
+
+    def __getitem__(self, key: str) -> Any:
+        return self._shared[key]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._shared.get(key, default)
 
-def create_bot(token: str) -> Bot:
-    return Bot(token=token)
+def create_bot(token: str, api_url: str = "") -> HealthBot:
+    # api_url points at a self-hosted (or fake, for load tests) Bot API server
+    session = AiohttpSession(api=TelegramAPIServer.from_base(api_url)) if api_url else None
+    return HealthBot(token=token, session=session)
 
-def create_dispatcher() -> Dispatcher:
-    dp = Dispatcher(storage=MemoryStorage())
+def create_dispatcher(storage: Optional[BaseStorage] = None) -> Dispatcher:
+    dp = Dispatcher(storage=storage or MemoryStorage())
+    # inner middlewares on the dispatcher also wrap the handlers of every included router
+    handler_metrics = HandlerMetricsMiddleware()
+    dp.message.middleware(handler_metrics)
+    dp.callback_query.middleware(handler_metrics)
     dp.include_router(start.router)
+    # before the FSM input handlers, so an admin mid-flow can still run commands
+    dp.include_router(admin.router)
     dp.include_router(menu.router)
     dp.include_router(measure.router)
     dp.include_router(timezone.router)
     dp.include_router(reminders.router)
     dp.include_router(reports.router)
+    dp.include_router(export.router)
+    dp.include_router(bulk_import.router)
     return dp
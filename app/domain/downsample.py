@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import numpy as np
+
+from app.domain.models import BPSeries, SugarSeries
+
+# Min/max per time bucket rather than LTTB: every bucket keeps its lowest and
+# highest reading, so a hypo or hyper spike can never be averaged or skipped
+# away, only merged with an even more extreme neighbour in the same bucket.
+
+def minmax_indices(ts_ms: np.ndarray, columns: list[np.ndarray], buckets: int) -> np.ndarray:
+    """Ascending indices of the min and max finite value of each column in `buckets` equal time slices.
+
+    The first and last points are always kept so the time axis does not shrink.
+    """
+    n = len(ts_ms)
+    span = int(ts_ms[-1] - ts_ms[0]) + 1
+    bucket = (ts_ms - ts_ms[0]) * max(1, buckets) // span
+    keep = [np.array([0, n - 1])]
+    for values in columns:
+        ok = np.flatnonzero(np.isfinite(values))
+        if not len(ok):
+            continue
+        order = ok[np.lexsort((values[ok], bucket[ok]))]  # by bucket, then value
+        b = bucket[order]
+        starts = np.flatnonzero(np.r_[True, b[1:] != b[:-1]])
+        ends = np.r_[starts[1:], len(order)] - 1
+        keep += [order[starts], order[ends]]
+    return np.unique(np.concatenate(keep))
+
+def downsample_sugar(series: SugarSeries, max_points: int) -> SugarSeries:
+    if max_points <= 0 or len(series) <= max_points:
+        return series
+    idx = minmax_indices(series.ts_ms, [series.value], (max_points - 2) // 2)
+    return SugarSeries(series.ts_ms[idx], series.value[idx])
+
+def downsample_bp(series: BPSeries, max_points: int) -> BPSeries:
+    if max_points <= 0 or len(series) <= max_points:
+        return series
+    idx = minmax_indices(series.ts_ms, [series.sys, series.dia, series.pulse], (max_points - 2) // 6)
+    return BPSeries(series.ts_ms[idx], series.sys[idx], series.dia[idx], series.pulse[idx])
@@ -4,6 +4,8 @@ from dataclasses import dataclass
 from decimal import Decimal
 from typing import Optional
 
+import numpy as np
+
 @dataclass(frozen=True)
 class BP:
     sys: int
@@ -14,3 +16,38 @@ class BP:
 class UserPrefs:
     user_id: int
     timezone: str
+
+@dataclass(frozen=True)
+class MeasurementColumns:
+    """A user's measurements as parallel arrays (one element per row, ascending time).
+
+    Absent values are -1: sugar_cmmol on BP rows, sys/dia/pulse on sugar rows,
+    pulse when it was not entered.
+    """
+    ts_ms: np.ndarray        # int64, UTC epoch ms
+    is_sugar: np.ndarray     # bool; False = BP row
+    sugar_cmmol: np.ndarray  # int32, 0.01 mmol/L
+    sys: np.ndarray          # int32
+    dia: np.ndarray          # int32
+    pulse: np.ndarray        # int32
+
+    def __len__(self) -> int:
+        return len(self.ts_ms)
+
+@dataclass(frozen=True)
+class SugarSeries:
+    ts_ms: np.ndarray  # int64 UTC epoch ms, ascending
+    value: np.ndarray  # float64 mmol/L
+
+    def __len__(self) -> int:
+        return len(self.ts_ms)
+
+@dataclass(frozen=True)
+class BPSeries:
+    ts_ms: np.ndarray  # int64 UTC epoch ms, ascending
+    sys: np.ndarray    # float64 mmHg
+    dia: np.ndarray    # float64 mmHg
+    pulse: np.ndarray  # float64 bpm, NaN where not measured
+
+    def __len__(self) -> int:
+        return len(self.ts_ms)
@@ -0,0 +1,11 @@
+from __future__ import annotations
+
+from typing import Sequence
+
+def median(values: Sequence[float]) -> float:
+    """Median; mean of the two middle values for even-length input."""
+    vals_sorted = sorted(values)
+    mid = len(vals_sorted) // 2
+    if len(vals_sorted) % 2 == 1:
+        return vals_sorted[mid]
+    return (vals_sorted[mid - 1] + vals_sorted[mid]) / 2
@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from decimal import Decimal, ROUND_HALF_UP
+
+# Sugar is stored as an integer number of 0.01 mmol/L ("centi-mmol").
+SUGAR_SCALE = 100
+
+def sugar_to_cmmol(value: Decimal) -> int:
+    return int((value * SUGAR_SCALE).to_integral_value(rounding=ROUND_HALF_UP))
+
+def cmmol_to_float(cmmol: int) -> float:
+    return cmmol / SUGAR_SCALE
+
+def epoch_ms_from_iso(iso: str) -> int:
+    dt = datetime.fromisoformat(iso)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+def utc_from_epoch_ms(ms: int) -> datetime:
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc)
+
+MS_PER_DAY = 86_400_000
+
+def utc_day_from_epoch_ms(ms: int) -> str:
+    return utc_from_epoch_ms(ms).date().isoformat()
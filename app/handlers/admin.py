@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+from aiogram import Router
+from aiogram.filters import BaseFilter, Command, CommandObject
+from aiogram.types import BufferedInputFile, Message
+
+from app.infra.tracing import TraceMiddleware, ignore_current
+from app.services.profiling import MAX_SECONDS, Profiler
+
+router = Router()
+
+class IsAdmin(BaseFilter):
+    async def __call__(self, message: Message) -> bool:
+        return message.from_user is not None and message.from_user.id in (message.bot.get("admin_ids") or ())
+
+# non-admins fall through to the regular handlers as if the commands did not exist
+router.message.filter(IsAdmin())
+
+ADMIN_HELP = (
+    "Админ-команды:\n"
+    "/prof_cpu [сек] [топ] — семплирующий CPU-профиль цикла событий\n"
+    "/prof_mem [сек] [топ] — tracemalloc: рост и крупнейшие места аллокаций\n"
+    "/prof_stop — завершить профилирование досрочно\n"
+    "/slow — последние медленные апдейты со спанами\n"
+    "/slow <мс> — порог медленного апдейта (0 — выключить)\n"
+)
+
+def _args(command: CommandObject, seconds: int = 30, top: int = 30) -> tuple[int, int]:
+    parts = (command.args or "").split()
+    if len(parts) > 0:
+        seconds = int(parts[0])
+    if len(parts) > 1:
+        top = int(parts[1])
+    return max(1, min(seconds, MAX_SECONDS)), max(1, min(top, 200))
+
+def _document(text: str, name: str) -> BufferedInputFile:
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    return BufferedInputFile(text.encode("utf-8"), filename=f"{name}_{stamp}.txt")
+
+@router.message(Command("admin"))
+async def cmd_admin(message: Message):
+    await message.answer(ADMIN_HELP)
+
+@router.message(Command("prof_cpu", "prof_mem"))
+async def cmd_profile(message: Message, command: CommandObject):
+    profiler: Profiler = message.bot.get("profiler")
+    if profiler.busy:
+        await message.answer(f"⏳ Уже идёт профилирование ({profiler.kind}). /prof_stop — остановить.")
+        return
+    try:
+        seconds, top = _args(command)
+    except ValueError:
+        await message.answer("❌ Формат: /prof_cpu [секунды] [топ]")
+        return
+
+    kind = "cpu" if command.command == "prof_cpu" else "memory"
+    ignore_current()
+    await message.answer(f"⏱ Профилирую ({kind}) {seconds} с… /prof_stop — остановить раньше.")
+    report = await (profiler.cpu if kind == "cpu" else profiler.memory)(seconds, top)
+    await message.answer_document(_document(report, f"profile_{kind}"), caption=f"Профиль {kind}")
+
+@router.message(Command("prof_stop"))
+async def cmd_profile_stop(message: Message):
+    profiler: Profiler = message.bot.get("profiler")
+    if not profiler.stop():
+        await message.answer("Профилирование не запущено.")
+
+@router.message(Command("slow"))
+async def cmd_slow(message: Message, command: CommandObject):
+    tracer: TraceMiddleware = message.bot.get("tracer")
+    if command.args:
+        try:
+            tracer.slow_ms = max(0.0, float(command.args.strip()))
+        except ValueError:
+            await message.answer("❌ Формат: /slow <миллисекунды>")
+            return
+        await message.answer(f"✅ Порог медленного апдейта: {tracer.slow_ms:.0f} мс")
+        return
+    if not tracer.slow:
+        await message.answer(f"Медленных апдейтов (≥ {tracer.slow_ms:.0f} мс) пока не было.")
+        return
+    text = "\n\n".join(f"{at.isoformat()} {trace}" for at, trace in reversed(tracer.slow))
+    await message.answer_document(_document(text, "slow_updates"), caption=f"Медленные апдейты: {len(tracer.slow)}")
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import asyncio
+import io
+
+from aiogram import Router, F
+from aiogram.filters import Command
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import StatesGroup, State
+from aiogram.types import CallbackQuery, Message
+
+from app.infra import repo
+from app.services.importer import ImportResult, decode_upload, parse_import
+from app.ui.keyboards import kb_back_main
+from app.ui.texts import IMPORT_TEXT
+
+router = Router()
+
+# Telegram lets bots download files up to 20 MB; a text log that size is far past max_lines anyway
+MAX_FILE_BYTES = 5 * 1024 * 1024
+
+class ImportFSM(StatesGroup):
+    waiting = State()
+
+async def _start(message: Message, state: FSMContext, edit: bool = False) -> None:
+    await state.set_state(ImportFSM.waiting)
+    if edit:
+        await message.edit_text(IMPORT_TEXT, reply_markup=kb_back_main())
+    else:
+        await message.answer(IMPORT_TEXT, reply_markup=kb_back_main())
+
+@router.message(Command("import"))
+async def cmd_import(message: Message, state: FSMContext):
+    await _start(message, state)
+
+@router.callback_query(F.data == "menu:import")
+async def cb_import(callback: CallbackQuery, state: FSMContext):
+    await _start(callback.message, state, edit=True)
+    await callback.answer()
+
+def _summary(result: ImportResult, inserted: int, duplicates: int, max_lines: int) -> str:
+    sugar = sum(1 for r in result.rows if r.kind == "sugar")
+    lines = [
+        f"✅ Загружено записей: {inserted}",
+        f"Строк разобрано: {result.lines - result.rejected_count} из {result.lines} "
+        f"(сахар: {sugar}, давление: {len(result.rows) - sugar})",
+    ]
+    if duplicates:
+        lines.append(f"Пропущено дубликатов (уже были в журнале): {duplicates}")
+    if result.truncated:
+        lines.append(f"⚠️ Больше {max_lines} строк — остальное не загружено")
+    if result.rejected_count:
+        lines.append(f"❌ Не удалось разобрать строк: {result.rejected_count}")
+        lines += [f"  строка {n}: {reason}" for n, reason in result.rejected]
+        if result.rejected_count > len(result.rejected):
+            lines.append("  …")
+    return "\n".join(lines)
+
+# a command is never import data: let it reach its own handler (or fall through) instead
+@router.message(ImportFSM.waiting, F.document | (F.text & ~F.text.startswith("/")))
+async def msg_import(message: Message, state: FSMContext):
+    if message.document is not None:
+        if (message.document.file_size or 0) > MAX_FILE_BYTES:
+            await message.answer(f"❌ Файл больше {MAX_FILE_BYTES // (1024 * 1024)} МБ. Раздели его на части.")
+            return
+        buf = io.BytesIO()
+        await message.bot.download(message.document, destination=buf)
+        try:
+            text = decode_upload(buf.getvalue())
+        except ValueError as e:
+            await message.answer(f"❌ {e}")
+            return
+    else:
+        text = message.text or ""
+
+    user_id = message.from_user.id
+    user_tz = (await message.bot.get("profiles").ensure_registered(user_id)).timezone
+    max_lines = message.bot.get("import_max_lines") or 50_000
+    result = await asyncio.to_thread(parse_import, text, user_tz, max_lines)
+    inserted, duplicates = await repo.insert_measurements_bulk(
+        message.bot.get("db"), user_id, ((r.measured_at_utc, r.value) for r in result.rows)
+    )
+    await state.clear()
+    await message.answer(_summary(result, inserted, duplicates, max_lines), reply_markup=kb_back_main())
@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import os
+
+from aiogram import Router, F
+from aiogram.filters import Command
+from aiogram.types import CallbackQuery, FSInputFile, Message
+
+from app.services.export import export_measurements
+from app.ui.keyboards import kb_export_format, kb_back_main
+
+router = Router()
+
+@router.message(Command("export"))
+async def cmd_export(message: Message):
+    await message.answer("В каком формате выгрузить данные?", reply_markup=kb_export_format())
+
+@router.callback_query(F.data == "menu:export")
+async def cb_export_menu(callback: CallbackQuery):
+    await callback.message.edit_text("В каком формате выгрузить данные?", reply_markup=kb_export_format())
+    await callback.answer()
+
+@router.callback_query(F.data.in_(["export:csv", "export:jsonl"]))
+async def cb_export(callback: CallbackQuery):
+    fmt = callback.data.split(":", 1)[1]
+    db = callback.bot.get("db")
+    user_id = callback.from_user.id
+    data_dir = callback.bot.get("data_dir")
+
+    await callback.answer()
+    await callback.message.edit_text("📤 Готовлю выгрузку…", reply_markup=kb_back_main())
+
+    user_tz = await callback.bot.get("profiles").timezone(user_id)
+    path = await export_measurements(db, user_id, user_tz, fmt, os.path.join(data_dir, "exports"))
+    try:
+        await callback.message.answer_document(
+            FSInputFile(path, filename=f"healthbot_{user_id}.{fmt}.gz"),
+            caption="Ваши данные",
+        )
+    finally:
+        os.remove(path)
+    await callback.message.answer("⬅️ В меню", reply_markup=kb_back_main())
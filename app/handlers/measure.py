@@ -8,7 +8,6 @@ from aiogram.types import CallbackQuery, Message
 from app.ui.keyboards import kb_measure_choice, kb_skip_back
 from app.domain.parsing import parse_sugar, parse_bp
 from app.services.measurements import add_sugar, add_bp
-from app.infra import repo
 
 router = Router()
 
@@ -34,8 +33,8 @@ async def cb_measure_choice(callback: CallbackQuery, state: FSMContext):
         return
 
     user_id = callback.from_user.id
-    conn = callback.bot.get("db")
-    user_tz = await repo.get_user_timezone(conn, user_id) or callback.bot.get("default_tz")
+    # users who started the bot before /start registered them have no users row yet
+    user_tz = (await callback.bot.get("profiles").ensure_registered(user_id)).timezone
 
     await state.update_data(user_tz=user_tz)
 
@@ -89,7 +88,7 @@ async def cb_skip_both_bp(callback: CallbackQuery, state: FSMContext):
 async def msg_sugar(message: Message, state: FSMContext):
     data = await state.get_data()
     user_tz = data["user_tz"]
-    conn = message.bot.get("db")
+    db = message.bot.get("db")
 
     try:
         val = parse_sugar(message.text or "")
@@ -97,7 +96,7 @@ async def msg_sugar(message: Message, state: FSMContext):
         await message.answer(f"❌ {e}")
         return
 
-    await add_sugar(conn, message.from_user.id, user_tz, val)
+    await add_sugar(db, message.from_user.id, user_tz, val)
     await state.clear()
     await message.answer("✅ Сахар сохранён.", reply_markup=kb_measure_choice())
 
@@ -105,7 +104,7 @@ async def msg_sugar(message: Message, state: FSMContext):
 async def msg_bp(message: Message, state: FSMContext):
     data = await state.get_data()
     user_tz = data["user_tz"]
-    conn = message.bot.get("db")
+    db = message.bot.get("db")
 
     try:
         bp = parse_bp(message.text or "")
@@ -113,7 +112,7 @@ async def msg_bp(message: Message, state: FSMContext):
         await message.answer(f"❌ {e}")
         return
 
-    await add_bp(conn, message.from_user.id, user_tz, bp)
+    await add_bp(db, message.from_user.id, user_tz, bp)
     await state.clear()
     await message.answer("✅ Давление сохранено.", reply_markup=kb_measure_choice())
 
@@ -121,7 +120,7 @@ async def msg_bp(message: Message, state: FSMContext):
 async def msg_both_sugar(message: Message, state: FSMContext):
     data = await state.get_data()
     user_tz = data["user_tz"]
-    conn = message.bot.get("db")
+    db = message.bot.get("db")
 
     try:
         val = parse_sugar(message.text or "")
@@ -129,7 +128,7 @@ async def msg_both_sugar(message: Message, state: FSMContext):
         await message.answer(f"❌ {e}")
         return
 
-    await add_sugar(conn, message.from_user.id, user_tz, val)
+    await add_sugar(db, message.from_user.id, user_tz, val)
     await state.set_state(MeasureFSM.both_bp)
     await message.answer(
         "✅ Сахар сохранён. Теперь давление: 120 80 60 или 120/80 (пульс опционально)",
@@ -140,7 +139,7 @@ async def msg_both_sugar(message: Message, state: FSMContext):
 async def msg_both_bp(message: Message, state: FSMContext):
     data = await state.get_data()
     user_tz = data["user_tz"]
-    conn = message.bot.get("db")
+    db = message.bot.get("db")
 
     try:
         bp = parse_bp(message.text or "")
@@ -148,6 +147,6 @@ async def msg_both_bp(message: Message, state: FSMContext):
         await message.answer(f"❌ {e}")
         return
 
-    await add_bp(conn, message.from_user.id, user_tz, bp)
+    await add_bp(db, message.from_user.id, user_tz, bp)
     await state.clear()
     await message.answer("✅ Давление сохранено. Готово.", reply_markup=kb_measure_choice())
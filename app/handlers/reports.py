@@ -1,15 +1,36 @@
 from __future__ import annotations
 
-import asyncio
+import logging
+
 from aiogram import Router, F
 from aiogram.types import CallbackQuery, FSInputFile
 
 from app.infra import repo
-from app.services.reports import since_iso, build_report_pdf_from_rows
+from app.infra.metrics import stage
+from app.services.reports import (
+    since_ms,
+    build_report_pdf_from_columns,
+    build_report_pdf_from_rollup,
+    report_cache_key,
+    ReportCache,
+    CachedReport,
+)
+from app.services.render_pool import RenderEngine, QueueFull
 from app.ui.keyboards import kb_back_main
 
+log = logging.getLogger(__name__)
+
 router = Router()
 
+async def _send_report(callback: CallbackQuery, cache: ReportCache, cache_key: str, entry: CachedReport) -> None:
+    # a known file_id makes Telegram reuse the upload instead of receiving the bytes again
+    document = entry.file_id or FSInputFile(entry.path)
+    with stage("upload" if entry.file_id is None else "resend"):
+        msg = await callback.message.answer_document(document, caption="Ваш отчёт")
+    if entry.file_id is None and msg.document is not None:
+        cache.set_file_id(cache_key, msg.document.file_id)
+    await callback.message.answer("⬅️ В меню", reply_markup=kb_back_main())
+
 @router.callback_query(F.data.startswith("menu:report:"))
 async def cb_report(callback: CallbackQuery):
     kind = callback.data.split(":", 2)[2]
@@ -17,22 +38,75 @@ async def cb_report(callback: CallbackQuery):
     if kind in ("7", "30"):
         days = int(kind)
 
-    conn = callback.bot.get("db")
+    db = callback.bot.get("db")
+    engine: RenderEngine = callback.bot.get("renderer")
+    cache: ReportCache = callback.bot.get("report_cache")
     user_id = callback.from_user.id
     data_dir = callback.bot.get("data_dir")
 
-    await callback.answer()
-    await callback.message.edit_text("📄 Готовлю отчёт…", reply_markup=kb_back_main())
+    job_key = (user_id, kind)
+    if engine.in_flight(job_key):
+        await callback.answer("Отчёт уже готовится…")
+        return
 
-    rows = await repo.get_measurements(conn, user_id, since_utc_iso=since_iso(days))
+    # the callback is answered once the outcome is known: a second tap that slips past
+    # the in_flight check above (during the awaits below) still gets the same notice
+    user_tz = await callback.bot.get("profiles").timezone(user_id)
+    watermark = await repo.get_measurement_watermark(db, user_id)
+    style = "raster" if kind in (callback.bot.get("report_raster_kinds") or ()) else "vector"
+    max_points = callback.bot.get("report_max_points") or 0
+    cache_key = report_cache_key(user_id, kind, watermark, user_tz, style, max_points)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        await callback.answer()
+        await _send_report(callback, cache, cache_key, cached)
+        return
 
-    path = await asyncio.to_thread(
-        build_report_pdf_from_rows,
-        rows=rows,
-        user_id=user_id,
-        data_dir=data_dir,
-        days=days,
+    with stage("query"):
+        if days is None:
+            # all-time: one pre-aggregated row per day instead of the whole history
+            rollup = await repo.get_daily_rollup(db, user_id)
+            render, render_kwargs = build_report_pdf_from_rollup, {"rollup": rollup}
+        else:
+            cols = await repo.get_measurement_columns(db, user_id, since_ms=since_ms(days))
+            render, render_kwargs = build_report_pdf_from_columns, {"cols": cols, "days": days}
+
+    try:
+        fut, position, created = engine.submit(
+            job_key,
+            render,
+            user_id=user_id,
+            data_dir=data_dir,
+            style=style,
+            max_points=max_points,
+            **render_kwargs,
+        )
+    except QueueFull:
+        await callback.answer()
+        await callback.message.edit_text(
+            "⏳ Сейчас много запросов на отчёты. Попробуй через минуту.",
+            reply_markup=kb_back_main(),
+        )
+        return
+    if not created:
+        await callback.answer("Отчёт уже готовится…")
+        return
+    await callback.answer()
+    # only the tap that created the job edits the message (a repeat edit with the same text is an API error)
+    await callback.message.edit_text(
+        f"📄 Готовлю отчёт… Ты #{position} в очереди." if position else "📄 Готовлю отчёт…",
+        reply_markup=kb_back_main(),
     )
 
-    await callback.message.answer_document(FSInputFile(path), caption="Ваш отчёт")
-    await callback.message.answer("⬅️ В меню", reply_markup=kb_back_main())
+    try:
+        path = await fut
+    except Exception:
+        log.exception("Report render failed user=%s kind=%s", user_id, kind)
+        await callback.message.edit_text(
+            "❌ Не удалось подготовить отчёт. Попробуй ещё раз.",
+            reply_markup=kb_back_main(),
+        )
+        return
+    entry = cache.put(cache_key, user_id, path)
+
+    await _send_report(callback, cache, cache_key, entry)
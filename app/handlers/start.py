@@ -2,6 +2,7 @@ from __future__ import annotations
 
 from aiogram import Router
 from aiogram.filters import Command
+from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, CallbackQuery
 
 from app.ui.texts import START_TEXT, HELP_TEXT
@@ -10,14 +11,19 @@ from app.ui.keyboards import kb_main
 router = Router()
 
 @router.message(Command("start"))
-async def cmd_start(message: Message):
+async def cmd_start(message: Message, state: FSMContext):
+    # leaving the main menu abandons any unfinished input flow (e.g. /import waiting for a file)
+    await state.clear()
+    await message.bot.get("profiles").ensure_registered(message.from_user.id)
     await message.answer(START_TEXT, reply_markup=kb_main())
 
 @router.message(Command("help"))
-async def cmd_help(message: Message):
+async def cmd_help(message: Message, state: FSMContext):
+    await state.clear()
     await message.answer(HELP_TEXT, reply_markup=kb_main())
 
 @router.callback_query(lambda c: c.data == "menu:main")
-async def cb_main(callback: CallbackQuery):
+async def cb_main(callback: CallbackQuery, state: FSMContext):
+    await state.clear()
     await callback.message.edit_text(START_TEXT, reply_markup=kb_main())
     await callback.answer()
@@ -32,7 +32,9 @@ async def msg_tz(message: Message, state: FSMContext):
         await message.answer("❌ Не похоже на валидный TZ. Пример: Europe/Prague")
         return
 
-    conn = message.bot.get("db")
-    await repo.upsert_user(conn, message.from_user.id, tz)
+    db = message.bot.get("db")
+    await repo.upsert_user(db, message.from_user.id, tz)
+    # already scheduled slots follow the new zone
+    message.bot.get("reminders").set_user_timezone(message.from_user.id, tz)
     await state.clear()
     await message.answer(f"✅ Часовой пояс сохранён: {tz}", reply_markup=kb_back_main())
@@ -1,11 +1,23 @@
 from __future__ import annotations
 
+import asyncio
+import logging
 import os
+import time
 import aiosqlite
-from typing import Optional
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import TYPE_CHECKING, AsyncIterator, Awaitable, Callable, Optional, Sequence, Union
 
-SCHEMA_VERSION = 1
+from app.domain.units import epoch_ms_from_iso, sugar_to_cmmol
 
+if TYPE_CHECKING:
+    from app.infra.ingest import WriteBatcher
+
+log = logging.getLogger(__name__)
+
+# Baseline schema (version 1). Never edit a shipped table here: add a Migration below.
 DDL = [
     """CREATE TABLE IF NOT EXISTS schema_meta (
         key TEXT PRIMARY KEY,
@@ -43,6 +55,108 @@ DDL = [
     );""",
 ]
 
+MigrationStep = Union[str, Callable[[aiosqlite.Connection], Awaitable[None]]]
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    steps: Sequence[MigrationStep]
+
+async def _backfill_daily_rollup(conn: aiosqlite.Connection) -> None:
+    from app.infra import repo  # repo imports this module
+
+    await repo.rebuild_daily_rollup_on(conn)
+
+async def _backfill_numeric_columns(conn: aiosqlite.Connection, batch_size: int = 2000) -> None:
+    cur = await conn.execute(
+        "SELECT id, measured_at_utc, sugar_value FROM measurements WHERE measured_at_ms IS NULL"
+    )
+    while True:
+        chunk = await cur.fetchmany(batch_size)
+        if not chunk:
+            break
+        await conn.executemany(
+            "UPDATE measurements SET measured_at_ms=?, sugar_cmmol=? WHERE id=?",
+            [
+                (epoch_ms_from_iso(iso), sugar_to_cmmol(Decimal(sv)) if sv is not None else None, mid)
+                for mid, iso, sv in chunk
+            ],
+        )
+
+# Ordered; each runs once, in its own transaction, when schema_meta.schema_version < version.
+MIGRATIONS: list[Migration] = [
+    Migration(2, "measurement and reminder_log indexes", [
+        "CREATE INDEX IF NOT EXISTS ix_measurements_user_time ON measurements(user_id, measured_at_utc)",
+        "CREATE INDEX IF NOT EXISTS ix_measurements_user_kind_time ON measurements(user_id, kind, measured_at_utc)",
+        # retention purges by date across all users
+        "CREATE INDEX IF NOT EXISTS ix_reminder_log_slot_date ON reminder_log(slot_date)",
+    ]),
+    # numeric mirrors of measured_at_utc / sugar_value so reports never parse strings
+    Migration(3, "epoch-ms timestamp and centi-mmol sugar columns", [
+        "ALTER TABLE measurements ADD COLUMN measured_at_ms INTEGER",  # UTC epoch milliseconds
+        "ALTER TABLE measurements ADD COLUMN sugar_cmmol INTEGER",     # sugar in 0.01 mmol/L
+        _backfill_numeric_columns,
+        "DROP INDEX IF EXISTS ix_measurements_user_time",
+        "DROP INDEX IF EXISTS ix_measurements_user_kind_time",
+        "CREATE INDEX IF NOT EXISTS ix_measurements_user_ms ON measurements(user_id, measured_at_ms)",
+        "CREATE INDEX IF NOT EXISTS ix_measurements_user_kind_ms ON measurements(user_id, kind, measured_at_ms)",
+    ]),
+    # a reminder wave looks up one (date, slot); the prefix still serves the retention purge
+    Migration(4, "reminder_log (slot_date, time_hm) index", [
+        "CREATE INDEX IF NOT EXISTS ix_reminder_log_slot ON reminder_log(slot_date, time_hm)",
+        "DROP INDEX IF EXISTS ix_reminder_log_slot_date",
+    ]),
+    # aiogram FSM state/data, written by app.infra.fsm_storage.SqliteStorage
+    Migration(5, "fsm_state table", [
+        """CREATE TABLE IF NOT EXISTS fsm_state (
+            key TEXT PRIMARY KEY,           -- bot:chat:user:thread:business:destiny
+            state TEXT,
+            data TEXT NOT NULL DEFAULT '{}', -- JSON
+            updated_at_ms INTEGER NOT NULL
+        )""",
+        "CREATE INDEX IF NOT EXISTS ix_fsm_state_updated ON fsm_state(updated_at_ms)",
+    ]),
+    # multi-instance: reminder shard (user_id % shards) leases, renewed by app.services.leases
+    Migration(6, "reminder shard leases", [
+        """CREATE TABLE IF NOT EXISTS reminder_instances (
+            instance_id TEXT PRIMARY KEY,
+            expires_at_ms INTEGER NOT NULL
+        )""",
+        """CREATE TABLE IF NOT EXISTS reminder_leases (
+            shard INTEGER PRIMARY KEY,
+            owner TEXT,                     -- instance_id, NULL when free
+            expires_at_ms INTEGER NOT NULL DEFAULT 0
+        )""",
+    ]),
+    # per-user, per-UTC-day aggregates; maintained by repo on insert, rebuilt by app.maintenance
+    Migration(7, "daily_rollup table", [
+        """CREATE TABLE IF NOT EXISTS daily_rollup (
+            user_id INTEGER NOT NULL,
+            day TEXT NOT NULL,              -- YYYY-MM-DD (UTC)
+            sugar_count INTEGER NOT NULL DEFAULT 0,
+            sugar_median REAL,
+            sugar_min REAL,
+            sugar_max REAL,
+            bp_count INTEGER NOT NULL DEFAULT 0,
+            sys_median REAL,
+            sys_min INTEGER,
+            sys_max INTEGER,
+            dia_median REAL,
+            dia_min INTEGER,
+            dia_max INTEGER,
+            pulse_count INTEGER NOT NULL DEFAULT 0,
+            pulse_median REAL,
+            pulse_min INTEGER,
+            pulse_max INTEGER,
+            PRIMARY KEY (user_id, day)
+        )""",
+        _backfill_daily_rollup,
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1].version if MIGRATIONS else 1
+
 async def connect(db_path: str) -> aiosqlite.Connection:
     os.makedirs(os.path.dirname(db_path), exist_ok=True)
     conn = await aiosqlite.connect(db_path)
@@ -54,6 +168,134 @@ async def connect(db_path: str) -> aiosqlite.Connection:
 async def init_db(conn: aiosqlite.Connection) -> None:
     for stmt in DDL:
         await conn.execute(stmt)
-    # schema version
-    await conn.execute("INSERT OR IGNORE INTO schema_meta(key, value) VALUES('schema_version', ?)", (str(SCHEMA_VERSION),))
+    # a fresh database starts at the baseline and is brought up to date by migrate()
+    await conn.execute("INSERT OR IGNORE INTO schema_meta(key, value) VALUES('schema_version', '1')")
     await conn.commit()
+    await migrate(conn)
+
+async def get_schema_version(conn: aiosqlite.Connection) -> int:
+    cur = await conn.execute("SELECT value FROM schema_meta WHERE key='schema_version'")
+    row = await cur.fetchone()
+    return int(row[0]) if row else 0
+
+async def migrate(conn: aiosqlite.Connection, migrations: Sequence[Migration] = MIGRATIONS) -> int:
+    """Apply pending migrations in version order. Returns the resulting schema version."""
+    current = await get_schema_version(conn)
+    for m in sorted(migrations, key=lambda m: m.version):
+        if m.version <= current:
+            continue
+        log.info("Applying migration %s: %s", m.version, m.name)
+        await conn.execute("BEGIN")
+        try:
+            for step in m.steps:
+                if isinstance(step, str):
+                    await conn.execute(step)
+                else:
+                    await step(conn)
+            await conn.execute(
+                "UPDATE schema_meta SET value=? WHERE key='schema_version'", (str(m.version),)
+            )
+            await conn.commit()
+        except Exception:
+            await conn.rollback()
+            log.exception("Migration %s failed", m.version)
+            raise
+        current = m.version
+    return current
+
+async def explain_query_plan(conn: aiosqlite.Connection, sql: str, params: Sequence = ()) -> list[str]:
+    """Detail lines of EXPLAIN QUERY PLAN, e.g. 'SEARCH measurements USING INDEX ...'."""
+    cur = await conn.execute(f"EXPLAIN QUERY PLAN {sql}", tuple(params))
+    rows = await cur.fetchall()
+    return [str(r[-1]) for r in rows]
+
+async def connect_reader(db_path: str) -> aiosqlite.Connection:
+    # read-only handle: in WAL mode readers never block the writer or each other
+    conn = await aiosqlite.connect(f"file:{db_path}?mode=ro", uri=True)
+    await conn.execute("PRAGMA query_only=ON;")
+    return conn
+
+class Database:
+    """One writer connection plus a pool of read-only WAL reader connections.
+
+    Reads take any idle reader (waiting when all are busy); writes are serialized
+    on the writer, normally through the attached WriteBatcher.
+    """
+
+    def __init__(self, db_path: str, readers: int = 4):
+        self.db_path = db_path
+        self.readers = max(1, readers)
+        self.batcher: Optional["WriteBatcher"] = None
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._writer_lock = asyncio.Lock()
+        self._idle: asyncio.Queue[aiosqlite.Connection] = asyncio.Queue()
+        self._all_readers: list[aiosqlite.Connection] = []
+        self._read_waiting = 0
+        self._write_waiting = 0
+        self._read_acquires = 0
+        self._read_wait_total = 0.0
+        self._read_wait_max = 0.0
+
+    async def open(self) -> None:
+        self._writer = await connect(self.db_path)
+        await init_db(self._writer)
+        for _ in range(self.readers):
+            conn = await connect_reader(self.db_path)
+            self._all_readers.append(conn)
+            self._idle.put_nowait(conn)
+
+    async def close(self) -> None:
+        for conn in self._all_readers:
+            await conn.close()
+        self._all_readers.clear()
+        if self._writer is not None:
+            await self._writer.close()
+            self._writer = None
+
+    async def acquire_reader(self) -> aiosqlite.Connection:
+        started = time.perf_counter()
+        self._read_waiting += 1
+        try:
+            conn = await self._idle.get()
+        finally:
+            self._read_waiting -= 1
+        waited = time.perf_counter() - started
+        self._read_acquires += 1
+        self._read_wait_total += waited
+        self._read_wait_max = max(self._read_wait_max, waited)
+        return conn
+
+    def release_reader(self, conn: aiosqlite.Connection) -> None:
+        self._idle.put_nowait(conn)
+
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        conn = await self.acquire_reader()
+        try:
+            yield conn
+        finally:
+            self.release_reader(conn)
+
+    @asynccontextmanager
+    async def writer(self) -> AsyncIterator[aiosqlite.Connection]:
+        self._write_waiting += 1
+        try:
+            await self._writer_lock.acquire()
+        finally:
+            self._write_waiting -= 1
+        try:
+            yield self._writer
+        finally:
+            self._writer_lock.release()
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "readers": self.readers,
+            "readers_idle": self._idle.qsize(),
+            "read_waiting": self._read_waiting,
+            "read_acquires": self._read_acquires,
+            "read_wait_seconds_total": self._read_wait_total,
+            "read_wait_seconds_max": self._read_wait_max,
+            "write_waiting": self._write_waiting,
+            "write_queue": self.batcher.pending() if self.batcher is not None else 0,
+        }
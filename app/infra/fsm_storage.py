@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from app.infra import repo
+from app.infra.db import Database
+
+log = logging.getLogger(__name__)
+
+class _Record:
+    __slots__ = ("state", "data", "touched")
+
+    def __init__(self, state: Optional[str], data: Dict[str, Any]):
+        self.state = state
+        self.data = data
+        self.touched = time.monotonic()
+
+class SqliteStorage(BaseStorage):
+    """aiogram FSM storage persisted in the fsm_state table.
+
+    Reads are served from an in-process LRU; a miss loads the row once. Changes
+    land in the cache immediately and are flushed to SQLite every flush_interval
+    in a single transaction. Entries idle for longer than idle_ttl are dropped
+    from memory (never before their flush); rows idle for days are purged from
+    the table by purge_idle.
+
+    With write_through (several instances sharing the database, where a user's
+    next update may land on another process) there is no cache: every read
+    goes to the table and every change is written before the call returns.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        max_entries: int = 10_000,
+        idle_ttl: float = 1800.0,
+        flush_interval: float = 0.5,
+        write_through: bool = False,
+    ):
+        self.db = db
+        self.write_through = write_through
+        self.max_entries = max(1, max_entries)
+        self.idle_ttl = idle_ttl
+        self.flush_interval = flush_interval
+        self._cache: OrderedDict[str, _Record] = OrderedDict()
+        self._dirty: set[str] = set()
+        # keys taken out of _dirty by a flush still in progress; pinned in the cache like dirty ones
+        self._flushing: set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = asyncio.Event()
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return ":".join(str(p) for p in (
+            key.bot_id, key.chat_id, key.user_id, key.thread_id or "", key.business_connection_id or "", key.destiny,
+        ))
+
+    async def _record(self, key: StorageKey) -> tuple[str, _Record]:
+        k = self._key(key)
+        if self.write_through:
+            self._misses += 1
+            row = await repo.get_fsm_record(self.db, k)
+            return k, _Record(None, {}) if row is None else _Record(row[0], json.loads(row[1]))
+        rec = self._cache.get(k)
+        if rec is None:
+            row = await repo.get_fsm_record(self.db, k)
+            rec = self._cache.get(k)  # another update for this user may have filled it meanwhile
+            if rec is None:
+                self._misses += 1
+                rec = _Record(None, {}) if row is None else _Record(row[0], json.loads(row[1]))
+                self._cache[k] = rec
+                self._evict()
+        else:
+            self._hits += 1
+        self._cache.move_to_end(k)
+        rec.touched = time.monotonic()
+        return k, rec
+
+    async def _changed(self, k: str, rec: _Record) -> None:
+        if self.write_through:
+            await repo.save_fsm_records(self.db, *self._rows([(k, rec)]))
+            return
+        self._dirty.add(k)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    @staticmethod
+    def _rows(records: Iterable[tuple[str, _Record]]) -> tuple[list[tuple], list[str]]:
+        """(upserts, deletes) for save_fsm_records; an empty record deletes its row."""
+        now_ms = int(time.time() * 1000)
+        upserts, deletes = [], []
+        for k, rec in records:
+            if rec.state is None and not rec.data:
+                deletes.append(k)
+            else:
+                upserts.append((k, rec.state, json.dumps(rec.data, ensure_ascii=False), now_ms))
+        return upserts, deletes
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        k, rec = await self._record(key)
+        rec.state = state.state if isinstance(state, State) else state
+        await self._changed(k, rec)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        _, rec = await self._record(key)
+        return rec.state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        k, rec = await self._record(key)
+        rec.data = data.copy()
+        await self._changed(k, rec)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, rec = await self._record(key)
+        return rec.data.copy()
+
+    async def flush(self) -> None:
+        if not self._dirty:
+            return
+        keys, self._dirty = self._dirty, set()
+        self._flushing = keys
+        upserts, deletes = self._rows((k, self._cache[k]) for k in keys)
+        try:
+            await repo.save_fsm_records(self.db, upserts, deletes)
+        except Exception:
+            log.exception("FSM flush of %s keys failed; will retry", len(keys))
+            self._dirty |= keys
+        except BaseException:
+            # cancelled mid-write: the keys may not be in the table, keep them for the final flush
+            self._dirty |= keys
+            raise
+        finally:
+            self._flushing = set()
+
+    def _evict(self) -> None:
+        # dirty entries stay until flushed; they are evicted on a later pass
+        while len(self._cache) > self.max_entries:
+            k = next(iter(self._cache))
+            if k in self._dirty or k in self._flushing:
+                break
+            self._cache.popitem(last=False)
+
+    def _sweep(self) -> None:
+        cutoff = time.monotonic() - self.idle_ttl
+        for k in list(self._cache):
+            if self._cache[k].touched >= cutoff:
+                break  # LRU order: everything after this is newer
+            if k not in self._dirty and k not in self._flushing:
+                del self._cache[k]
+        self._evict()
+
+    async def _run(self) -> None:
+        while not self._closing.is_set():
+            try:
+                await asyncio.wait_for(self._closing.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+                self._sweep()
+            except Exception:
+                # a dead loop would silently stop persisting state: log and go on
+                log.exception("FSM flush loop iteration failed")
+
+    async def purge_idle(self, max_idle_days: int) -> None:
+        """Scheduled job: delete persisted states of flows abandoned more than max_idle_days ago."""
+        before_ms = int((time.time() - max_idle_days * 86400) * 1000)
+        removed = await repo.purge_fsm_records(self.db, before_ms)
+        log.info("Purged %s idle FSM states", removed)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self._cache),
+            "dirty": len(self._dirty),
+            "hits": self._hits,
+            "misses": self._misses,
+        }
+
+    async def close(self) -> None:
+        # let the loop finish its current flush (and run one more) rather than cancelling it mid-write
+        self._closing.set()
+        if self._task is not None:
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
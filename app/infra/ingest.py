@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Optional
+
+import aiosqlite
+
+from app.infra.db import Database
+
+log = logging.getLogger(__name__)
+
+WriteOp = Callable[[aiosqlite.Connection], Awaitable[Any]]
+
+class WriteBatcher:
+    """Group commit on the database's writer connection.
+
+    Write ops queued by any handler within max_delay (or until max_batch ops) run
+    in a single transaction; each submitter is released only after the shared
+    COMMIT, so '✅ сохранён' still means the row is durable.
+    """
+
+    def __init__(self, db: Database, max_batch: int = 64, max_delay: float = 0.005):
+        self.db = db
+        self.max_batch = max(1, max_batch)
+        self.max_delay = max_delay
+        self._queue: asyncio.Queue[tuple[WriteOp, asyncio.Future]] = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    async def start(self) -> None:
+        self.db.batcher = self
+        self._task = asyncio.create_task(self._run())
+
+    async def submit(self, op: WriteOp) -> Any:
+        if self._closing:
+            raise RuntimeError("WriteBatcher is closed")
+        fut = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((op, fut))
+        return await fut
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    async def close(self) -> None:
+        """Stop accepting writes and flush everything already queued."""
+        self._closing = True
+        await self._queue.join()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.db.batcher is self:
+            self.db.batcher = None
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            if self._queue.qsize() < self.max_batch - 1:
+                await asyncio.sleep(self.max_delay)
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                await self._flush(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # e.g. rollback itself failed: fail this batch, keep the batcher alive for the next one
+                log.exception("Write batch of %s ops failed", len(batch))
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _flush(self, batch: list[tuple[WriteOp, asyncio.Future]]) -> None:
+        async with self.db.writer() as conn:
+            await self._flush_on(conn, batch)
+
+    async def _flush_on(self, conn: aiosqlite.Connection, batch: list[tuple[WriteOp, asyncio.Future]]) -> None:
+        results = []
+        try:
+            for op, _ in batch:
+                results.append(await op(conn))
+            await conn.commit()
+        except Exception:
+            await conn.rollback()
+            if len(batch) > 1:
+                log.warning("Batched write of %s ops failed; retrying one by one", len(batch), exc_info=True)
+            # isolate the failing op so the rest of the batch still lands
+            for op, fut in batch:
+                try:
+                    result = await op(conn)
+                    await conn.commit()
+                except Exception as e:
+                    await conn.rollback()
+                    if not fut.done():
+                        fut.set_exception(e)
+                else:
+                    if not fut.done():
+                        fut.set_result(result)
+            return
+        for (_, fut), result in zip(batch, results):
+            if not fut.done():
+                fut.set_result(result)
@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import bisect
+import functools
+import logging
+import math
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Iterator, Optional
+
+from app.infra.tracing import add_span, span
+
+log = logging.getLogger(__name__)
+
+# Prometheus text exposition (format 0.0.4) without the client library: the bot
+# only needs counters, histograms and gauges read from the components' stats().
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = tuple[str, ...]
+
+def _fmt(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) and not v.is_integer() else str(int(v))
+
+def _labels(names: tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+class Counter:
+    def __init__(self, name: str, doc: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.doc = doc
+        self.label_names = labels
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> list[str]:
+        out = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} counter"]
+        for lv, v in sorted(self._values.items()):
+            out.append(f"{self.name}{_labels(self.label_names, lv)} {_fmt(v)}")
+        return out
+
+class Histogram:
+    def __init__(self, name: str, doc: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.doc = doc
+        self.label_names = labels
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [bucket counts..., +Inf count], sum
+        self._values: dict[LabelValues, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1][0] += value
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t, *labels)
+
+    def render(self) -> list[str]:
+        out = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} histogram"]
+        for lv, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for le, n in zip(self.buckets + (math.inf,), counts):
+                cumulative += n
+                le_label = 'le="%s"' % _fmt(le)
+                out.append(f"{self.name}_bucket{_labels(self.label_names, lv, le_label)} {cumulative}")
+            out.append(f"{self.name}_sum{_labels(self.label_names, lv)} {_fmt(total[0])}")
+            out.append(f"{self.name}_count{_labels(self.label_names, lv)} {cumulative}")
+        return out
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, Counter | Histogram] = {}
+        self._stats: dict[str, Callable[[], Optional[dict[str, float]]]] = {}
+
+    def counter(self, name: str, doc: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self._metrics.setdefault(name, Counter(name, doc, labels))  # type: ignore[return-value]
+
+    def histogram(self, name: str, doc: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(name, doc, labels, buckets))  # type: ignore[return-value]
+
+    def register_stats(self, component: str, fn: Callable[[], Optional[dict[str, float]]]) -> None:
+        """Expose fn()'s numbers as gauges healthbot_<component>_<key>; fn may return None while not running."""
+        self._stats[component] = fn
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics.values():
+            lines += metric.render()
+        for component, fn in self._stats.items():
+            try:
+                values = fn()
+            except Exception:
+                log.exception("Stats for %s failed", component)
+                continue
+            for key, v in (values or {}).items():
+                name = f"healthbot_{component}_{key}"
+                lines += [f"# TYPE {name} gauge", f"{name} {_fmt(v)}"]
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+HANDLER_SECONDS = REGISTRY.histogram("healthbot_handler_seconds", "Handler run time.", ("handler",))
+HANDLER_ERRORS = REGISTRY.counter("healthbot_handler_errors_total", "Handlers that raised.", ("handler",))
+QUERY_SECONDS = REGISTRY.histogram("healthbot_repo_seconds", "repo.* call time, including waits for a reader or a group commit.", ("query",))
+QUERY_ERRORS = REGISTRY.counter("healthbot_repo_errors_total", "repo.* calls that raised.", ("query",))
+REPORT_STAGE_SECONDS = REGISTRY.histogram("healthbot_report_stage_seconds", "Report build time by stage.", ("stage",))
+REMINDER_LAG_SECONDS = REGISTRY.histogram(
+    "healthbot_reminder_lag_seconds",
+    "Delay between a reminder's scheduled time and the dispatcher picking it up.",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 600.0),
+)
+REMINDER_WAVE_SECONDS = REGISTRY.histogram(
+    "healthbot_reminder_wave_seconds",
+    "Time to deliver one reminder wave.",
+    buckets=(0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 1800.0),
+)
+
+def timed_query(name: str, fn: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+    @functools.wraps(fn)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        t = time.perf_counter()
+        try:
+            with span(f"repo:{name}"):
+                return await fn(*args, **kwargs)
+        except BaseException:
+            QUERY_ERRORS.inc(name)
+            raise
+        finally:
+            QUERY_SECONDS.observe(time.perf_counter() - t, name)
+    return wrapper
+
+# Report stages run in render worker processes, whose registry is never scraped:
+# there the timings are collected and shipped back with the result.
+_collected: Optional[dict[str, float]] = None
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    if _collected is None:
+        with span(f"stage:{name}"), REPORT_STAGE_SECONDS.time(name):
+            yield
+        return
+    t = time.perf_counter()
+    try:
+        yield
+    finally:
+        _collected[name] = _collected.get(name, 0.0) + time.perf_counter() - t
+
+def run_collecting_stages(call: Callable[[], Any]) -> tuple[Any, dict[str, float]]:
+    """Worker side: run call() and return its result with the stage timings it recorded."""
+    global _collected
+    _collected = {}
+    try:
+        return call(), _collected
+    finally:
+        _collected = None
+
+def observe_stages(stages: dict[str, float]) -> None:
+    """Record stages that just finished one after another (in dict order)."""
+    start = time.perf_counter() - sum(stages.values())
+    for name, elapsed in stages.items():
+        REPORT_STAGE_SECONDS.observe(elapsed, name)
+        add_span(f"stage:{name}", elapsed, start)
+        start += elapsed
+
+class HandlerMetricsMiddleware:
+    """aiogram inner middleware: time and count every handler by its function name."""
+
+    async def __call__(self, handler: Callable[..., Awaitable[Any]], event: Any, data: dict[str, Any]) -> Any:
+        obj = data.get("handler")
+        name = getattr(getattr(obj, "callback", None), "__name__", "unknown")
+        t = time.perf_counter()
+        try:
+            with span(f"handler:{name}"):
+                return await handler(event, data)
+        except BaseException:
+            HANDLER_ERRORS.inc(name)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - t, name)
+
+async def start_metrics_server(host: str, port: int):
+    """Serve GET /metrics on host:port; returns the aiohttp runner to clean up on shutdown."""
+    from aiohttp import web
+
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(
+            body=REGISTRY.render().encode(),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    log.info("Metrics on http://%s:%s/metrics", host, port)
+    return runner
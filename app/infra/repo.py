@@ -1,108 +1,556 @@
 from __future__ import annotations
 
+import inspect
+
 import aiosqlite
-from typing import Iterable, Optional, Sequence
+from typing import AsyncIterator, Callable, Iterable, Optional, Sequence
 from datetime import datetime, timezone
 from decimal import Decimal
 
-from app.domain.models import BP
+import numpy as np
 
-async def upsert_user(conn: aiosqlite.Connection, user_id: int, timezone_str: str) -> None:
-    await conn.execute(
-        "INSERT INTO users(user_id, timezone) VALUES(?, ?) "
-        "ON CONFLICT(user_id) DO UPDATE SET timezone=excluded.timezone",
-        (user_id, timezone_str),
-    )
-    await conn.commit()
+from app.domain.models import BP, MeasurementColumns
+from app.domain.stats import median
+from app.domain.units import (
+    MS_PER_DAY,
+    cmmol_to_float,
+    epoch_ms_from_iso,
+    sugar_to_cmmol,
+    utc_day_from_epoch_ms,
+)
+from app.infra import metrics
+from app.infra.db import Database
+from app.infra.ingest import WriteOp
+
+# Write listeners: fn(event, user_id), called after the write commits.
+# Used by in-process caches that must drop state when a user's rows change.
+EVENT_USER = "user"                  # users row created or time zone changed
+EVENT_SLOTS = "slots"                # reminder slots replaced or disabled
+EVENT_MEASUREMENTS = "measurements"  # measurements inserted (single or bulk)
+
+_listeners: list[Callable[[str, int], None]] = []
+
+def add_listener(fn: Callable[[str, int], None]) -> None:
+    _listeners.append(fn)
+
+def _notify(event: str, user_id: int) -> None:
+    for fn in _listeners:
+        fn(event, user_id)
 
-async def get_user_timezone(conn: aiosqlite.Connection, user_id: int) -> Optional[str]:
-    cur = await conn.execute("SELECT timezone FROM users WHERE user_id=?", (user_id,))
-    row = await cur.fetchone()
-    return row[0] if row else None
+async def _write(db: Database, op: WriteOp):
+    """Run a write op and commit; group-committed with other writers when a WriteBatcher is attached."""
+    if db.batcher is not None:
+        return await db.batcher.submit(op)
+    async with db.writer() as conn:
+        result = await op(conn)
+        await conn.commit()
+    return result
 
-async def set_reminder_slots(conn: aiosqlite.Connection, user_id: int, times_hm: Sequence[str]) -> None:
+async def upsert_user(db: Database, user_id: int, timezone_str: str) -> None:
+    async def op(c: aiosqlite.Connection) -> None:
+        await c.execute(
+            "INSERT INTO users(user_id, timezone) VALUES(?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET timezone=excluded.timezone",
+            (user_id, timezone_str),
+        )
+    await _write(db, op)
+    _notify(EVENT_USER, user_id)
+
+async def get_user_timezone(db: Database, user_id: int) -> Optional[str]:
+    async with db.reader() as conn:
+        cur = await conn.execute("SELECT timezone FROM users WHERE user_id=?", (user_id,))
+        row = await cur.fetchone()
+        return row[0] if row else None
+
+async def get_user_profile(db: Database, user_id: int) -> tuple[Optional[str], list[str]]:
+    """(timezone or None if the user is unknown, enabled slots) in one reader checkout."""
+    async with db.reader() as conn:
+        cur = await conn.execute("SELECT timezone FROM users WHERE user_id=?", (user_id,))
+        row = await cur.fetchone()
+        cur = await conn.execute("SELECT time_hm FROM reminder_slots WHERE user_id=? AND enabled=1 ORDER BY time_hm", (user_id,))
+        slots = [r[0] for r in await cur.fetchall()]
+        return (row[0] if row else None), slots
+
+async def set_reminder_slots(db: Database, user_id: int, times_hm: Sequence[str]) -> None:
     # upsert user assumed
-    await conn.execute("DELETE FROM reminder_slots WHERE user_id=?", (user_id,))
-    await conn.executemany(
-        "INSERT INTO reminder_slots(user_id, time_hm, enabled) VALUES(?, ?, 1)",
-        [(user_id, t) for t in times_hm],
-    )
-    await conn.commit()
+    async def op(c: aiosqlite.Connection) -> None:
+        await c.execute("DELETE FROM reminder_slots WHERE user_id=?", (user_id,))
+        await c.executemany(
+            "INSERT INTO reminder_slots(user_id, time_hm, enabled) VALUES(?, ?, 1)",
+            [(user_id, t) for t in times_hm],
+        )
+    await _write(db, op)
+    _notify(EVENT_SLOTS, user_id)
 
-async def list_reminder_slots(conn: aiosqlite.Connection, user_id: int) -> list[str]:
-    cur = await conn.execute("SELECT time_hm FROM reminder_slots WHERE user_id=? AND enabled=1 ORDER BY time_hm", (user_id,))
-    rows = await cur.fetchall()
-    return [r[0] for r in rows]
+async def list_reminder_slots(db: Database, user_id: int) -> list[str]:
+    async with db.reader() as conn:
+        cur = await conn.execute("SELECT time_hm FROM reminder_slots WHERE user_id=? AND enabled=1 ORDER BY time_hm", (user_id,))
+        rows = await cur.fetchall()
+        return [r[0] for r in rows]
 
-async def list_all_enabled_slots(conn: aiosqlite.Connection) -> list[tuple[int, str, str]]:
+async def list_all_enabled_slots(db: Database) -> list[tuple[int, str, str]]:
     """Returns (user_id, timezone, time_hm) for enabled slots."""
-    cur = await conn.execute(
-        "SELECT u.user_id, u.timezone, s.time_hm "
-        "FROM users u JOIN reminder_slots s ON u.user_id = s.user_id "
-        "WHERE s.enabled=1"
-    )
-    rows = await cur.fetchall()
-    return [(int(r[0]), str(r[1]), str(r[2])) for r in rows]
+    async with db.reader() as conn:
+        cur = await conn.execute(
+            "SELECT u.user_id, u.timezone, s.time_hm "
+            "FROM users u JOIN reminder_slots s ON u.user_id = s.user_id "
+            "WHERE s.enabled=1"
+        )
+        rows = await cur.fetchall()
+        return [(int(r[0]), str(r[1]), str(r[2])) for r in rows]
 
-async def disable_all_slots(conn: aiosqlite.Connection, user_id: int) -> None:
-    await conn.execute("UPDATE reminder_slots SET enabled=0 WHERE user_id=?", (user_id,))
-    await conn.commit()
+async def list_enabled_slots_for_shards(db: Database, shards: Iterable[int], n_shards: int) -> list[tuple[int, str, str]]:
+    """Like list_all_enabled_slots, restricted to users with user_id % n_shards in shards."""
+    shards = sorted(shards)
+    if not shards:
+        return []
+    async with db.reader() as conn:
+        cur = await conn.execute(
+            "SELECT u.user_id, u.timezone, s.time_hm "
+            "FROM users u JOIN reminder_slots s ON u.user_id = s.user_id "
+            f"WHERE s.enabled=1 AND (u.user_id % ?) IN ({','.join('?' * len(shards))})",
+            (n_shards, *shards),
+        )
+        rows = await cur.fetchall()
+        return [(int(r[0]), str(r[1]), str(r[2])) for r in rows]
 
-async def insert_sugar(conn: aiosqlite.Connection, user_id: int, value: Decimal, measured_at_utc: str) -> None:
+async def disable_all_slots(db: Database, user_id: int) -> None:
+    async def op(c: aiosqlite.Connection) -> None:
+        await c.execute("UPDATE reminder_slots SET enabled=0 WHERE user_id=?", (user_id,))
+    await _write(db, op)
+    _notify(EVENT_SLOTS, user_id)
+
+async def insert_sugar(db: Database, user_id: int, value: Decimal, measured_at_utc: str) -> None:
     now = datetime.now(timezone.utc).isoformat()
-    await conn.execute(
-        "INSERT INTO measurements(user_id, kind, sugar_value, measured_at_utc, created_at_utc) VALUES(?, 'sugar', ?, ?, ?)",
-        (user_id, str(value), measured_at_utc, now),
-    )
-    await conn.commit()
+    measured_at_ms = epoch_ms_from_iso(measured_at_utc)
+    async def op(c: aiosqlite.Connection) -> None:
+        await c.execute(
+            "INSERT INTO measurements(user_id, kind, sugar_value, sugar_cmmol, measured_at_utc, measured_at_ms, created_at_utc) "
+            "VALUES(?, 'sugar', ?, ?, ?, ?, ?)",
+            (user_id, str(value), sugar_to_cmmol(value), measured_at_utc, measured_at_ms, now),
+        )
+        await _refresh_rollup_day(c, user_id, measured_at_ms)
+    await _write(db, op)
+    _notify(EVENT_MEASUREMENTS, user_id)
 
-async def insert_bp(conn: aiosqlite.Connection, user_id: int, bp: BP, measured_at_utc: str) -> None:
+async def insert_bp(db: Database, user_id: int, bp: BP, measured_at_utc: str) -> None:
     now = datetime.now(timezone.utc).isoformat()
-    await conn.execute(
-        "INSERT INTO measurements(user_id, kind, sys, dia, pulse, measured_at_utc, created_at_utc) "
-        "VALUES(?, 'bp', ?, ?, ?, ?, ?)",
-        (user_id, bp.sys, bp.dia, bp.pulse, measured_at_utc, now),
-    )
-    await conn.commit()
+    measured_at_ms = epoch_ms_from_iso(measured_at_utc)
+    async def op(c: aiosqlite.Connection) -> None:
+        await c.execute(
+            "INSERT INTO measurements(user_id, kind, sys, dia, pulse, measured_at_utc, measured_at_ms, created_at_utc) "
+            "VALUES(?, 'bp', ?, ?, ?, ?, ?, ?)",
+            (user_id, bp.sys, bp.dia, bp.pulse, measured_at_utc, measured_at_ms, now),
+        )
+        await _refresh_rollup_day(c, user_id, measured_at_ms)
+    await _write(db, op)
+    _notify(EVENT_MEASUREMENTS, user_id)
 
-async def get_measurements(conn: aiosqlite.Connection, user_id: int, since_utc_iso: str | None = None) -> list[dict]:
-    if since_utc_iso:
+_SQL_INSERT_MEASUREMENT = (
+    "INSERT INTO measurements(user_id, kind, sugar_value, sugar_cmmol, sys, dia, pulse, "
+    "measured_at_utc, measured_at_ms, created_at_utc) VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+async def insert_measurements_bulk(
+    db: Database,
+    user_id: int,
+    rows: Iterable[tuple[str, Decimal | BP]],
+    chunk_size: int = 5000,
+) -> tuple[int, int]:
+    """Insert many (measured_at_utc, sugar or BP) rows; returns (inserted, duplicates).
+
+    Rows identical to a stored one (same kind, instant and values) or to an earlier
+    row of the batch are skipped, so re-importing a file is harmless. Each chunk is
+    one executemany transaction that also refreshes the rollup of the UTC days it touches.
+    """
+    now = datetime.now(timezone.utc).isoformat()
+    # key = (kind, measured_at_ms, sugar_cmmol, sys, dia, pulse), the shape of a stored row
+    records: list[tuple[tuple, tuple]] = []
+    for measured_at_utc, value in rows:
+        ms = epoch_ms_from_iso(measured_at_utc)
+        if isinstance(value, BP):
+            key = ("bp", ms, None, value.sys, value.dia, value.pulse)
+            sugar_value = None
+        else:
+            key = ("sugar", ms, sugar_to_cmmol(value), None, None, None)
+            sugar_value = str(value)
+        records.append((key, (user_id, key[0], sugar_value, *key[2:], measured_at_utc, ms, now)))
+    if not records:
+        return 0, 0
+    records.sort(key=lambda r: r[0][1])
+
+    async with db.reader() as conn:
         cur = await conn.execute(
-            "SELECT kind, sugar_value, sys, dia, pulse, measured_at_utc FROM measurements "
-            "WHERE user_id=? AND measured_at_utc >= ? "
-            "ORDER BY measured_at_utc",
-            (user_id, since_utc_iso),
+            "SELECT kind, measured_at_ms, sugar_cmmol, sys, dia, pulse FROM measurements "
+            "WHERE user_id=? AND measured_at_ms BETWEEN ? AND ?",
+            (user_id, records[0][0][1], records[-1][0][1]),
         )
-    else:
+        seen = {tuple(r) for r in await cur.fetchall()}
+    fresh = []
+    for key, params in records:
+        if key not in seen:
+            seen.add(key)
+            fresh.append(params)
+
+    for i in range(0, len(fresh), chunk_size):
+        chunk = fresh[i:i + chunk_size]
+        days = sorted({p[8] - p[8] % MS_PER_DAY for p in chunk})
+
+        async def op(c: aiosqlite.Connection, chunk: list[tuple] = chunk, days: list[int] = days) -> None:
+            await c.executemany(_SQL_INSERT_MEASUREMENT, chunk)
+            for day_start in days:
+                await _refresh_rollup_day(c, user_id, day_start)
+        await _write(db, op)
+    if fresh:
+        _notify(EVENT_MEASUREMENTS, user_id)
+    return len(fresh), len(records) - len(fresh)
+
+async def get_measurement_watermark(db: Database, user_id: int) -> Optional[tuple[int, str]]:
+    """(id, created_at_utc) of the user's newest row; changes on every insert."""
+    async with db.reader() as conn:
         cur = await conn.execute(
-            "SELECT kind, sugar_value, sys, dia, pulse, measured_at_utc FROM measurements "
-            "WHERE user_id=? ORDER BY measured_at_utc",
+            "SELECT id, created_at_utc FROM measurements WHERE user_id=? ORDER BY id DESC LIMIT 1",
             (user_id,),
         )
-    rows = await cur.fetchall()
+        row = await cur.fetchone()
+        return (int(row[0]), str(row[1])) if row else None
+
+# Report queries; app.maintenance check-indexes EXPLAINs these to verify index use.
+SQL_MEASUREMENTS_SINCE = (
+    "SELECT kind, sugar_cmmol, sys, dia, pulse, measured_at_ms FROM measurements "
+    "WHERE user_id=? AND measured_at_ms >= ? "
+    "ORDER BY measured_at_ms"
+)
+SQL_MEASUREMENTS_ALL = (
+    "SELECT kind, sugar_cmmol, sys, dia, pulse, measured_at_ms FROM measurements "
+    "WHERE user_id=? ORDER BY measured_at_ms"
+)
+
+async def get_measurements(db: Database, user_id: int, since_ms: int | None = None) -> list[dict]:
+    """Rows with numeric columns only: sugar_cmmol (0.01 mmol/L) and measured_at_ms (UTC epoch ms)."""
+    async with db.reader() as conn:
+        if since_ms is not None:
+            cur = await conn.execute(SQL_MEASUREMENTS_SINCE, (user_id, since_ms))
+        else:
+            cur = await conn.execute(SQL_MEASUREMENTS_ALL, (user_id,))
+        rows = await cur.fetchall()
     out = []
     for r in rows:
         out.append({
             "kind": r[0],
-            "sugar_value": r[1],
+            "sugar_cmmol": r[1],
             "sys": r[2],
             "dia": r[3],
             "pulse": r[4],
-            "measured_at_utc": r[5],
+            "measured_at_ms": r[5],
         })
     return out
 
-async def reminder_already_sent(conn: aiosqlite.Connection, user_id: int, slot_date: str, time_hm: str) -> bool:
-    cur = await conn.execute(
-        "SELECT 1 FROM reminder_log WHERE user_id=? AND slot_date=? AND time_hm=?",
-        (user_id, slot_date, time_hm),
+EXPORT_FIELDS = ("id", "measured_at_ms", "measured_at_utc", "kind", "sugar_value", "sys", "dia", "pulse")
+
+async def iter_measurements(
+    db: Database,
+    user_id: int,
+    since_ms: int | None = None,
+    chunk_size: int = 1000,
+) -> AsyncIterator[list[tuple]]:
+    """Stream a user's rows (EXPORT_FIELDS order) in chunks, oldest first.
+
+    Keyset-paginated on (measured_at_ms, id): a reader is borrowed per chunk only,
+    so a long export never pins a pool connection or the whole history in memory.
+    """
+    last_ms = since_ms - 1 if since_ms is not None else -(2**62)
+    last_id = 2**62
+    while True:
+        async with db.reader() as conn:
+            cur = await conn.execute(
+                f"SELECT {', '.join(EXPORT_FIELDS)} FROM measurements "
+                "WHERE user_id=? AND (measured_at_ms > ? OR (measured_at_ms = ? AND id > ?)) "
+                "ORDER BY measured_at_ms, id LIMIT ?",
+                (user_id, last_ms, last_ms, last_id, chunk_size),
+            )
+            chunk = await cur.fetchall()
+        if not chunk:
+            return
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+        last_id, last_ms = chunk[-1][0], chunk[-1][1]
+
+SQL_MEASUREMENT_COLUMNS = (
+    "SELECT measured_at_ms, kind='sugar', COALESCE(sugar_cmmol, -1), "
+    "COALESCE(sys, -1), COALESCE(dia, -1), COALESCE(pulse, -1) "
+    "FROM measurements WHERE user_id=? AND measured_at_ms >= ? ORDER BY measured_at_ms"
+)
+
+async def get_measurement_columns(db: Database, user_id: int, since_ms: int | None = None) -> MeasurementColumns:
+    """Columnar variant of get_measurements: all-integer rows straight into one ndarray."""
+    async with db.reader() as conn:
+        cur = await conn.execute(SQL_MEASUREMENT_COLUMNS, (user_id, since_ms if since_ms is not None else -(2**62)))
+        rows = await cur.fetchall()
+    table = np.array(rows, dtype=np.int64).reshape(-1, 6)
+    return MeasurementColumns(
+        ts_ms=table[:, 0].copy(),
+        is_sugar=table[:, 1].astype(bool),
+        sugar_cmmol=table[:, 2].astype(np.int32),
+        sys=table[:, 3].astype(np.int32),
+        dia=table[:, 4].astype(np.int32),
+        pulse=table[:, 5].astype(np.int32),
     )
-    row = await cur.fetchone()
-    return row is not None
 
-async def mark_reminder_sent(conn: aiosqlite.Connection, user_id: int, slot_date: str, time_hm: str, sent_at_utc: str) -> None:
-    await conn.execute(
-        "INSERT OR REPLACE INTO reminder_log(user_id, slot_date, time_hm, sent_at_utc) VALUES(?, ?, ?, ?)",
-        (user_id, slot_date, time_hm, sent_at_utc),
+ROLLUP_COLUMNS = (
+    "sugar_count", "sugar_median", "sugar_min", "sugar_max",
+    "bp_count", "sys_median", "sys_min", "sys_max",
+    "dia_median", "dia_min", "dia_max",
+    "pulse_count", "pulse_median", "pulse_min", "pulse_max",
+)
+
+def _rollup_values(rows: Iterable[tuple]) -> tuple:
+    """rows: (kind, sugar_cmmol, sys, dia, pulse) of one user-day -> ROLLUP_COLUMNS values."""
+    sugar: list[float] = []
+    sys_: list[int] = []
+    dia: list[int] = []
+    pulse: list[int] = []
+    for kind, sugar_cmmol, s, d, p in rows:
+        if kind == "sugar" and sugar_cmmol is not None:
+            sugar.append(cmmol_to_float(sugar_cmmol))
+        elif kind == "bp" and s is not None and d is not None:
+            sys_.append(int(s))
+            dia.append(int(d))
+            if p is not None:
+                pulse.append(int(p))
+
+    def stats(vals):
+        return (median(vals), min(vals), max(vals)) if vals else (None, None, None)
+
+    return (
+        len(sugar), *stats(sugar),
+        len(sys_), *stats(sys_), *stats(dia),
+        len(pulse), *stats(pulse),
     )
-    await conn.commit()
+
+_ROLLUP_UPSERT = (
+    f"INSERT OR REPLACE INTO daily_rollup(user_id, day, {', '.join(ROLLUP_COLUMNS)}) "
+    f"VALUES(?, ?, {', '.join('?' for _ in ROLLUP_COLUMNS)})"
+)
+
+async def _refresh_rollup_day(conn: aiosqlite.Connection, user_id: int, measured_at_ms: int) -> None:
+    """Recompute the UTC day containing measured_at_ms from its raw rows.
+
+    No commit: runs inside the insert's transaction.
+    """
+    day_start = measured_at_ms - measured_at_ms % MS_PER_DAY
+    day = utc_day_from_epoch_ms(day_start)
+    cur = await conn.execute(
+        "SELECT kind, sugar_cmmol, sys, dia, pulse FROM measurements "
+        "WHERE user_id=? AND measured_at_ms >= ? AND measured_at_ms < ?",
+        (user_id, day_start, day_start + MS_PER_DAY),
+    )
+    rows = await cur.fetchall()
+    if not rows:
+        await conn.execute("DELETE FROM daily_rollup WHERE user_id=? AND day=?", (user_id, day))
+        return
+    await conn.execute(_ROLLUP_UPSERT, (user_id, day, *_rollup_values(rows)))
+
+async def rebuild_daily_rollup(db: Database, user_id: int | None = None, batch_size: int = 1000) -> int:
+    """Backfill daily_rollup from measurements (all users or one). Returns number of user-days written."""
+    async with db.writer() as conn:
+        written = await rebuild_daily_rollup_on(conn, user_id, batch_size)
+        await conn.commit()
+        return written
+
+async def rebuild_daily_rollup_on(conn: aiosqlite.Connection, user_id: int | None = None, batch_size: int = 1000) -> int:
+    """rebuild_daily_rollup on an open connection, without commit (also run by the schema migration)."""
+    if user_id is None:
+        await conn.execute("DELETE FROM daily_rollup")
+        cur = await conn.execute(
+            "SELECT user_id, measured_at_ms, kind, sugar_cmmol, sys, dia, pulse FROM measurements "
+            "ORDER BY user_id, measured_at_ms"
+        )
+    else:
+        await conn.execute("DELETE FROM daily_rollup WHERE user_id=?", (user_id,))
+        cur = await conn.execute(
+            "SELECT user_id, measured_at_ms, kind, sugar_cmmol, sys, dia, pulse FROM measurements "
+            "WHERE user_id=? ORDER BY measured_at_ms",
+            (user_id,),
+        )
+
+    written = 0
+    pending: list[tuple] = []
+    group_key: tuple[int, str] | None = None
+    group_rows: list[tuple] = []
+
+    def close_group():
+        if group_key is not None and group_rows:
+            pending.append((*group_key, *_rollup_values(group_rows)))
+
+    while True:
+        chunk = await cur.fetchmany(batch_size)
+        if not chunk:
+            break
+        for uid, measured_at_ms, kind, sugar_cmmol, s, d, p in chunk:
+            key = (int(uid), utc_day_from_epoch_ms(measured_at_ms))
+            if key != group_key:
+                close_group()
+                group_key, group_rows = key, []
+            group_rows.append((kind, sugar_cmmol, s, d, p))
+        if len(pending) >= batch_size:
+            await conn.executemany(_ROLLUP_UPSERT, pending)
+            written += len(pending)
+            pending.clear()
+    close_group()
+    if pending:
+        await conn.executemany(_ROLLUP_UPSERT, pending)
+        written += len(pending)
+    return written
+
+async def list_active_users(db: Database, since_day: str) -> list[tuple[int, str]]:
+    """(user_id, timezone) of users with a measurement on or after the UTC day since_day ('YYYY-MM-DD').
+
+    Probes the rollup's (user_id, day) key per user instead of scanning measurements.
+    """
+    async with db.reader() as conn:
+        cur = await conn.execute(
+            "SELECT u.user_id, u.timezone FROM users u WHERE EXISTS "
+            "(SELECT 1 FROM daily_rollup r WHERE r.user_id = u.user_id AND r.day >= ?)",
+            (since_day,),
+        )
+        return [(int(r[0]), str(r[1])) for r in await cur.fetchall()]
+
+async def get_daily_rollup(db: Database, user_id: int) -> list[dict]:
+    async with db.reader() as conn:
+        cur = await conn.execute(
+            f"SELECT day, {', '.join(ROLLUP_COLUMNS)} FROM daily_rollup WHERE user_id=? ORDER BY day",
+            (user_id,),
+        )
+        rows = await cur.fetchall()
+        return [dict(zip(("day", *ROLLUP_COLUMNS), r)) for r in rows]
+
+SQL_REMINDERS_SENT_FOR_SLOT = "SELECT user_id FROM reminder_log WHERE slot_date=? AND time_hm=?"
+SQL_PURGE_REMINDER_LOG = "DELETE FROM reminder_log WHERE slot_date < ?"
+
+async def reminders_sent_for_slot(db: Database, slot_date: str, time_hm: str) -> set[int]:
+    """User ids already reminded for one local date + slot (one query per reminder wave)."""
+    async with db.reader() as conn:
+        cur = await conn.execute(SQL_REMINDERS_SENT_FOR_SLOT, (slot_date, time_hm))
+        return {int(r[0]) for r in await cur.fetchall()}
+
+async def mark_reminders_sent(db: Database, rows: list[tuple[int, str, str, str]]) -> None:
+    """Record (user_id, slot_date, time_hm, sent_at_utc) deliveries in one transaction."""
+    if not rows:
+        return
+    async def op(c: aiosqlite.Connection) -> None:
+        await c.executemany(
+            "INSERT OR REPLACE INTO reminder_log(user_id, slot_date, time_hm, sent_at_utc) VALUES(?, ?, ?, ?)",
+            rows,
+        )
+    await _write(db, op)
+
+async def purge_reminder_log(db: Database, before_date: str) -> int:
+    """Delete idempotency markers older than before_date (YYYY-MM-DD); returns rows removed."""
+    async def op(c: aiosqlite.Connection) -> int:
+        cur = await c.execute(SQL_PURGE_REMINDER_LOG, (before_date,))
+        return cur.rowcount
+    return await _write(db, op)
+
+async def get_fsm_record(db: Database, key: str) -> Optional[tuple[Optional[str], str]]:
+    """(state, data_json) for an FSM key, or None when nothing is stored."""
+    async with db.reader() as conn:
+        cur = await conn.execute("SELECT state, data FROM fsm_state WHERE key=?", (key,))
+        row = await cur.fetchone()
+        return None if row is None else (row[0], row[1])
+
+async def save_fsm_records(db: Database, upserts: list[tuple[str, Optional[str], str, int]], deletes: list[str]) -> None:
+    """Flush FSM changes in one transaction: upserts are (key, state, data_json, updated_at_ms)."""
+    if not upserts and not deletes:
+        return
+    async def op(c: aiosqlite.Connection) -> None:
+        if upserts:
+            await c.executemany(
+                "INSERT INTO fsm_state(key, state, data, updated_at_ms) VALUES(?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET state=excluded.state, data=excluded.data, "
+                "updated_at_ms=excluded.updated_at_ms",
+                upserts,
+            )
+        if deletes:
+            await c.executemany("DELETE FROM fsm_state WHERE key=?", [(k,) for k in deletes])
+    await _write(db, op)
+
+async def purge_fsm_records(db: Database, before_ms: int) -> int:
+    """Delete FSM states untouched since before_ms (abandoned flows); returns rows removed."""
+    async def op(c: aiosqlite.Connection) -> int:
+        cur = await c.execute("DELETE FROM fsm_state WHERE updated_at_ms < ?", (before_ms,))
+        return cur.rowcount
+    return await _write(db, op)
+
+async def heartbeat_leases(db: Database, instance_id: str, n_shards: int, ttl_ms: int) -> set[int]:
+    """One lease round for this instance; returns the shards it owns afterwards.
+
+    Registers the instance as alive, renews its unexpired leases, then gives back
+    shards above its fair share (ceil(shards / live instances)) or claims free /
+    expired ones up to it. Runs as one write transaction, so concurrent instances
+    never both claim a shard.
+    """
+    async def op(c: aiosqlite.Connection) -> set[int]:
+        now_ms = int(datetime.now(timezone.utc).timestamp() * 1000)
+        expires = now_ms + ttl_ms
+        await c.execute(
+            "INSERT INTO reminder_instances(instance_id, expires_at_ms) VALUES(?, ?) "
+            "ON CONFLICT(instance_id) DO UPDATE SET expires_at_ms=excluded.expires_at_ms",
+            (instance_id, expires),
+        )
+        await c.execute("DELETE FROM reminder_instances WHERE expires_at_ms <= ?", (now_ms,))
+        await c.executemany(
+            "INSERT OR IGNORE INTO reminder_leases(shard, owner, expires_at_ms) VALUES(?, NULL, 0)",
+            [(s,) for s in range(n_shards)],
+        )
+        cur = await c.execute("SELECT COUNT(*) FROM reminder_instances")
+        live = max(1, int((await cur.fetchone())[0]))
+        fair = -(-n_shards // live)
+
+        await c.execute(
+            "UPDATE reminder_leases SET expires_at_ms=? WHERE owner=? AND expires_at_ms > ?",
+            (expires, instance_id, now_ms),
+        )
+        cur = await c.execute(
+            "SELECT shard FROM reminder_leases WHERE owner=? AND expires_at_ms > ? AND shard < ? ORDER BY shard",
+            (instance_id, now_ms, n_shards),
+        )
+        owned = [int(r[0]) for r in await cur.fetchall()]
+        if len(owned) > fair:
+            await c.executemany(
+                "UPDATE reminder_leases SET owner=NULL, expires_at_ms=0 WHERE shard=? AND owner=?",
+                [(s, instance_id) for s in owned[fair:]],
+            )
+            owned = owned[:fair]
+        elif len(owned) < fair:
+            cur = await c.execute(
+                "SELECT shard FROM reminder_leases WHERE (owner IS NULL OR expires_at_ms <= ?) AND shard < ? "
+                "ORDER BY shard LIMIT ?",
+                (now_ms, n_shards, fair - len(owned)),
+            )
+            claimed = [int(r[0]) for r in await cur.fetchall()]
+            await c.executemany(
+                "UPDATE reminder_leases SET owner=?, expires_at_ms=? WHERE shard=?",
+                [(instance_id, expires, s) for s in claimed],
+            )
+            owned += claimed
+        return set(owned)
+    return await _write(db, op)
+
+async def release_leases(db: Database, instance_id: str) -> None:
+    """Graceful shutdown: free this instance's shards right away instead of waiting for expiry."""
+    async def op(c: aiosqlite.Connection) -> None:
+        await c.execute("UPDATE reminder_leases SET owner=NULL, expires_at_ms=0 WHERE owner=?", (instance_id,))
+        await c.execute("DELETE FROM reminder_instances WHERE instance_id=?", (instance_id,))
+    await _write(db, op)
+
+def _instrument() -> None:
+    # every public query is timed under its own name (healthbot_repo_seconds{query=...});
+    # callers go through the module attribute, so rebinding here covers them all
+    g = globals()
+    for name, fn in list(g.items()):
+        if not name.startswith("_") and inspect.iscoroutinefunction(fn) and fn.__module__ == __name__:
+            g[name] = metrics.timed_query(name, fn)
+
+_instrument()
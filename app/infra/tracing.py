@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Iterator, Optional
+
+log = logging.getLogger(__name__)
+
+class Trace:
+    """Spans of one update: (start offset, duration, depth, name), in seconds."""
+
+    __slots__ = ("label", "started", "spans", "ignored", "_depth")
+
+    def __init__(self, label: str):
+        self.label = label
+        self.started = time.perf_counter()
+        self.spans: list[tuple[float, float, int, str]] = []
+        self.ignored = False
+        self._depth = 0
+
+    def add(self, name: str, start: float, duration: float) -> None:
+        self.spans.append((start - self.started, duration, self._depth, name))
+
+    def format(self, total: float) -> str:
+        lines = [f"{self.label} {total * 1000:.1f} ms"]
+        for offset, duration, depth, name in sorted(self.spans, key=lambda s: (s[0], s[2])):
+            lines.append(f"  {offset * 1000:8.1f} +{duration * 1000:8.1f} ms  {'  ' * depth}{name}")
+        return "\n".join(lines)
+
+current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    trace = current_trace.get()
+    if trace is None:
+        yield
+        return
+    t = time.perf_counter()
+    index = len(trace.spans)
+    trace._depth += 1
+    try:
+        yield
+    finally:
+        trace._depth -= 1
+        # recorded at its own depth, before the spans nested in it
+        trace.spans.insert(index, (t - trace.started, time.perf_counter() - t, trace._depth, name))
+
+def add_span(name: str, duration: float, start: Optional[float] = None) -> None:
+    """Record a span timed elsewhere (e.g. in a render worker); by default it is taken to have just ended."""
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add(name, time.perf_counter() - duration if start is None else start, duration)
+
+def ignore_current() -> None:
+    """Keep the current update out of the slow log (it is slow on purpose)."""
+    trace = current_trace.get()
+    if trace is not None:
+        trace.ignored = True
+
+class TraceMiddleware:
+    """Outer update middleware: collects the spans of every update and logs those slower than slow_ms.
+
+    The last `keep` slow traces are kept in memory for the admin /slow command.
+    """
+
+    def __init__(self, slow_ms: float = 1000.0, keep: int = 100):
+        self.slow_ms = slow_ms
+        self.slow: deque[tuple[datetime, str]] = deque(maxlen=keep)
+
+    async def __call__(self, handler: Callable[..., Awaitable[Any]], event: Any, data: dict[str, Any]) -> Any:
+        if self.slow_ms <= 0:
+            return await handler(event, data)
+        trace = Trace(_describe(event))
+        token = current_trace.set(trace)
+        try:
+            return await handler(event, data)
+        finally:
+            current_trace.reset(token)
+            total = time.perf_counter() - trace.started
+            if total * 1000 >= self.slow_ms and not trace.ignored:
+                text = trace.format(total)
+                self.slow.append((datetime.now(timezone.utc), text))
+                log.warning("Slow update: %s", text)
+
+def _describe(update: Any) -> str:
+    kind = getattr(update, "event_type", "update")
+    user = getattr(getattr(update, "event", None), "from_user", None)
+    return f"update {getattr(update, 'update_id', '?')} {kind} user={getattr(user, 'id', '?')}"
@@ -10,9 +10,20 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from app.settings import load_settings
 from app.logging_setup import setup_logging
 from app.bot import create_bot, create_dispatcher
-from app.infra.db import connect, init_db
-from app.infra import repo
-from app.services.reminders import schedule_all_from_db
+from app.infra.db import Database
+from app.infra.fsm_storage import SqliteStorage
+from app.infra.ingest import WriteBatcher
+from app.infra.tracing import TraceMiddleware
+from app.infra import metrics, repo
+from app.services.leases import ShardLeases
+from app.services.pregen import ReportPregenerator
+from app.services.profiles import ProfileCache
+from app.services.profiling import Profiler
+from app.services.reminders import ReminderDispatcher, purge_reminder_log, schedule_all_from_db
+from app.services.render_pool import RenderEngine
+from app.services.sender import OutboundSender
+from app.services.reports import ReportCache
+from app.webhook import run_webhook
 
 log = logging.getLogger(__name__)
 
@@ -24,30 +35,175 @@ async def main():
     Path(data_dir).mkdir(parents=True, exist_ok=True)
     db_path = os.path.join(data_dir, "healthbot.sqlite3")
 
-    conn = await connect(db_path)
-    await init_db(conn)
+    db = Database(db_path, readers=settings.db_readers)
+    # migrations (including the daily rollup backfill) run here
+    await db.open()
 
-    bot = create_bot(settings.bot_token)
-    dp = create_dispatcher()
+    # all repo writes from here on are group-committed
+    ingest = WriteBatcher(db, max_batch=settings.ingest_max_batch, max_delay=settings.ingest_max_delay_ms / 1000)
+    await ingest.start()
+
+    bot = create_bot(settings.bot_token, api_url=settings.bot_api_url)
+    # FSM state survives restarts; pending changes are flushed on close
+    fsm_storage = SqliteStorage(
+        db,
+        max_entries=settings.fsm_cache_max_entries,
+        idle_ttl=settings.fsm_cache_ttl_s,
+        # several instances: a user's next update may reach another process, so no per-process cache
+        write_through=bool(settings.reminder_shards),
+    )
+    dp = create_dispatcher(fsm_storage)
+    sender = OutboundSender(
+        rate=settings.send_rate,
+        chat_rate=settings.send_chat_rate,
+        concurrency=settings.send_concurrency,
+    )
+    bot.session.middleware(sender)
 
     # attach shared objects
-    bot["db"] = conn
+    bot["db"] = db
     bot["data_dir"] = data_dir
     bot["default_tz"] = settings.default_timezone
+    bot["sender"] = sender
+    bot["admin_ids"] = settings.admin_ids
+    bot["profiler"] = Profiler()
+
+    # spans of every update; slower than SLOW_UPDATE_MS are logged and kept for /slow
+    tracer = TraceMiddleware(slow_ms=settings.slow_update_ms)
+    dp.update.outer_middleware(tracer)
+    bot["tracer"] = tracer
+
+    profiles = ProfileCache(
+        db,
+        settings.default_timezone,
+        max_entries=settings.profile_cache_max_entries,
+        ttl=settings.profile_cache_ttl_s,
+    )
+    repo.add_listener(profiles.on_repo_event)
+    bot["profiles"] = profiles
+
+    renderer = RenderEngine(
+        workers=settings.report_workers,
+        max_queue=settings.report_queue_size,
+        warm_raster=bool(settings.report_raster_kinds),
+    )
+    await renderer.start()
+    bot["renderer"] = renderer
+    bot["report_raster_kinds"] = settings.report_raster_kinds
+    bot["report_max_points"] = settings.report_max_points
+    bot["import_max_lines"] = settings.import_max_lines
+
+    report_cache = ReportCache(
+        os.path.join(data_dir, "reports", "cache"),
+        max_entries=settings.report_cache_max_entries,
+        max_bytes=settings.report_cache_max_mb * 1024 * 1024,
+    )
+    repo.add_listener(report_cache.on_repo_event)
+    bot["report_cache"] = report_cache
 
     scheduler = AsyncIOScheduler()
     scheduler.start()
     bot["scheduler"] = scheduler
+    scheduler.add_job(
+        purge_reminder_log,
+        "cron",
+        hour=3,
+        minute=30,
+        id="reminder_log:purge",
+        kwargs={"db": db, "retention_days": settings.reminder_log_retention_days},
+    )
+    scheduler.add_job(
+        fsm_storage.purge_idle,
+        "cron",
+        hour=3,
+        minute=45,
+        id="fsm_state:purge",
+        kwargs={"max_idle_days": settings.fsm_idle_days},
+    )
+
+    reminders = ReminderDispatcher(bot, db)
+    if settings.reminder_shards:
+        # several instances: each schedules only the shards it holds a lease on
+        reminders.enable_sharding(settings.reminder_shards)
+    # warm-up: ensure any known users are scheduled; the same rows prime the profile cache
+    rows = await schedule_all_from_db(reminders, db)
+    profiles.warm(rows)
+    await reminders.start()
+    bot["reminders"] = reminders
+
+    leases = None
+    if settings.reminder_shards:
+        leases = ShardLeases(
+            db,
+            settings.instance_id,
+            settings.reminder_shards,
+            reminders.on_shards_changed,
+            ttl=settings.lease_ttl_s,
+            interval=settings.lease_heartbeat_s,
+        )
+        await leases.start()
+        bot["leases"] = leases
+        scheduler.add_job(reminders.resync, "interval", seconds=settings.reminder_resync_s, id="reminders:resync")
+
+    # render tomorrow morning's 7/30-day reports during each user's local night
+    pregen = ReportPregenerator(
+        db,
+        renderer,
+        report_cache,
+        data_dir,
+        active_days=settings.pregen_active_days,
+        local_hour=settings.pregen_local_hour,
+        concurrency=settings.pregen_concurrency,
+        cpu_budget_s=settings.pregen_cpu_budget_s,
+        raster_kinds=settings.report_raster_kinds,
+        max_points=settings.report_max_points,
+        owns=reminders.owns,
+    )
+    if settings.pregen_active_days > 0:
+        scheduler.add_job(pregen.run, "cron", minute=5, id="reports:pregen")
 
-    # warm-up: ensure any known users are scheduled
-    await schedule_all_from_db(scheduler, bot, conn)
+    # queue depths and cache sizes are read from the components at scrape time
+    for component, source in (
+        ("db", db), ("renderer", renderer), ("sender", sender), ("fsm", fsm_storage),
+        ("profiles", profiles), ("report_cache", report_cache), ("reminders", reminders), ("pregen", pregen),
+    ):
+        metrics.REGISTRY.register_stats(component, source.stats)
+    if leases is not None:
+        metrics.REGISTRY.register_stats("leases", leases.stats)
+    metrics.REGISTRY.register_stats("webhook", lambda: bot["webhook"].stats() if bot.get("webhook") else None)
+    metrics_runner = None
+    if settings.metrics_port:
+        metrics_runner = await metrics.start_metrics_server(settings.metrics_host, settings.metrics_port)
 
-    log.info("Bot started")
+    log.info("Bot started mode=%s", settings.bot_mode)
     try:
-        await dp.start_polling(bot)
+        if settings.bot_mode == "webhook":
+            await run_webhook(
+                bot,
+                dp,
+                base_url=settings.webhook_url,
+                path=settings.webhook_path,
+                host=settings.webhook_host,
+                port=settings.webhook_port,
+                secret=settings.webhook_secret,
+                max_concurrency=settings.webhook_max_concurrency,
+                max_body_bytes=settings.webhook_max_body_kb * 1024,
+            )
+        else:
+            # a webhook left over from webhook mode would make getUpdates fail
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
     finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        if leases is not None:
+            await leases.stop()
+        await reminders.stop()
         scheduler.shutdown(wait=False)
-        await conn.close()
+        await renderer.stop()
+        await fsm_storage.close()
+        await ingest.close()
+        await db.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+
+from app.logging_setup import setup_logging
+from app.infra.db import Database, explain_query_plan
+from app.infra import repo
+
+log = logging.getLogger(__name__)
+
+async def _rebuild_rollup(db_path: str, user_id: int | None) -> None:
+    db = Database(db_path, readers=1)
+    await db.open()
+    try:
+        written = await repo.rebuild_daily_rollup(db, user_id=user_id)
+        log.info("Daily rollup rebuilt: %s user-days", written)
+    finally:
+        await db.close()
+
+# (label, sql, sample params) of hot queries that must not full-scan measurements/reminder_log
+def _index_checks() -> list[tuple[str, str, tuple]]:
+    return [
+        ("measurements since", repo.SQL_MEASUREMENTS_SINCE, (1, 1704067200000)),
+        ("measurements all", repo.SQL_MEASUREMENTS_ALL, (1,)),
+        ("reminder_log wave markers", repo.SQL_REMINDERS_SENT_FOR_SLOT, ("2024-01-01", "08:00")),
+        ("reminder_log retention", repo.SQL_PURGE_REMINDER_LOG, ("2024-01-01",)),
+    ]
+
+async def _check_indexes(db_path: str) -> bool:
+    db = Database(db_path, readers=1)
+    await db.open()
+    ok = True
+    try:
+        async with db.writer() as conn:
+            for label, sql, params in _index_checks():
+                plan = await explain_query_plan(conn, sql, params)
+                full_scan = any(line.startswith("SCAN ") and "USING" not in line for line in plan)
+                status = "FULL SCAN" if full_scan else "ok"
+                log.info("%-26s %-9s %s", label, status, " | ".join(plan))
+                ok = ok and not full_scan
+    finally:
+        await db.close()
+    return ok
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.maintenance")
+    parser.add_argument("--db", default=None, help="SQLite path (default: $DATA_DIR/healthbot.sqlite3)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_rollup = sub.add_parser("rebuild-rollup", help="recompute daily_rollup from measurements")
+    p_rollup.add_argument("--user-id", type=int, default=None, help="only this user")
+    sub.add_parser("check-indexes", help="EXPLAIN hot queries; exit 1 if any full-scans its table")
+    args = parser.parse_args()
+
+    setup_logging(os.environ.get("LOG_LEVEL", "INFO"))
+    db_path = args.db or os.path.join(os.environ.get("DATA_DIR", "/data"), "healthbot.sqlite3")
+
+    if args.command == "rebuild-rollup":
+        asyncio.run(_rebuild_rollup(db_path, args.user_id))
+    elif args.command == "check-indexes":
+        if not asyncio.run(_check_indexes(db_path)):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
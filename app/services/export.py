@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import asyncio
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+
+from app.domain.units import utc_from_epoch_ms
+from app.infra import repo
+from app.services.timeutils import get_zone
+
+FORMATS = ("csv", "jsonl")
+HEADER = ("measured_at_utc", "measured_at_local", "kind", "sugar_mmol_l", "sys", "dia", "pulse")
+
+def _records(chunk: list[tuple], tz) -> list[tuple]:
+    out = []
+    for _id, measured_at_ms, measured_at_utc, kind, sugar_value, sys_, dia, pulse in chunk:
+        local = utc_from_epoch_ms(measured_at_ms).astimezone(tz).replace(microsecond=0).isoformat()
+        out.append((measured_at_utc, local, kind, sugar_value, sys_, dia, pulse))
+    return out
+
+def _encode_csv(records: list[tuple], with_header: bool) -> str:
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    if with_header:
+        w.writerow(HEADER)
+    w.writerows(records)
+    return buf.getvalue()
+
+def _encode_jsonl(records: list[tuple]) -> str:
+    return "".join(json.dumps(dict(zip(HEADER, r)), ensure_ascii=False) + "\n" for r in records)
+
+async def export_measurements(db, user_id: int, user_tz: str, fmt: str, out_dir: str) -> str:
+    """Stream the user's history into a gzip'ed CSV/JSONL temp file; returns its path.
+
+    Memory is bounded by one repo chunk; encoding+compression of each chunk runs
+    off the event loop.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown export format: {fmt}")
+    os.makedirs(out_dir, exist_ok=True)
+    tz = get_zone(user_tz)
+    fd, path = tempfile.mkstemp(prefix=f"export_{user_id}_", suffix=f".{fmt}.gz", dir=out_dir)
+    os.close(fd)
+    try:
+        fh = await asyncio.to_thread(gzip.open, path, "wt", encoding="utf-8", newline="")
+        try:
+            first = True
+            async for chunk in repo.iter_measurements(db, user_id):
+                records = _records(chunk, tz)
+                text = _encode_csv(records, with_header=first) if fmt == "csv" else _encode_jsonl(records)
+                await asyncio.to_thread(fh.write, text)
+                first = False
+            if first and fmt == "csv":
+                await asyncio.to_thread(fh.write, _encode_csv([], with_header=True))
+        finally:
+            await asyncio.to_thread(fh.close)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import csv
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Iterable, Iterator, Optional, Union
+
+from app.domain.models import BP
+from app.domain.parsing import parse_bp, parse_sugar
+from app.domain.units import epoch_ms_from_iso
+from app.services.timeutils import utc_iso_from_local_datetime
+
+# Bulk history import: one measurement (or a sugar + BP pair) per line,
+#   2024-03-05 08:30 5.6
+#   05.03.2024 21:10 135/85 72
+#   05.03.2024 21:10 6,1 135/85/72
+# or a CSV with a header (our own export, or date/time/sugar/sys/dia/pulse columns).
+# Local times are in the user's zone; values go through the same parse_sugar /
+# parse_bp rules as single entries.
+
+MAX_REJECTS_SHOWN = 10
+
+_DATE_TIME = re.compile(
+    r"^\s*(?:(\d{4})-(\d{1,2})-(\d{1,2})|(\d{1,2})[./](\d{1,2})[./](\d{2}|\d{4}))"
+    r"[\sT,;]+(\d{1,2}):(\d{2})(?::(\d{2})(?:\.(\d{1,6})\d*)?)?\s*(Z|([+-])(\d{2}):?(\d{2}))?"
+)
+_VALUE = re.compile(r"\d+(?:[.,]\d+)?(?:\s*[/:]\s*\d+){0,2}")
+
+Value = Union[Decimal, BP]
+
+@dataclass(frozen=True)
+class ImportRow:
+    measured_at_utc: str
+    measured_at_ms: int
+    value: Value
+
+    @property
+    def kind(self) -> str:
+        return "sugar" if isinstance(self.value, Decimal) else "bp"
+
+@dataclass
+class ImportResult:
+    rows: list[ImportRow] = field(default_factory=list)
+    lines: int = 0
+    # (line number, reason); only the first MAX_REJECTS_SHOWN keep their text
+    rejected: list[tuple[int, str]] = field(default_factory=list)
+    rejected_count: int = 0
+    # input had more than max_lines records; the rest was not read (not a rejection)
+    truncated: bool = False
+
+    def reject(self, line_no: int, reason: str) -> None:
+        self.rejected_count += 1
+        if len(self.rejected) < MAX_REJECTS_SHOWN:
+            self.rejected.append((line_no, reason))
+
+def _timestamp(m: re.Match, user_tz: str) -> str:
+    y, mo, d, d2, mo2, y2, hh, mm, ss, frac, offset, sign, off_h, off_m = m.groups()
+    if y is None:
+        y, mo, d = (y2 if len(y2) == 4 else "20" + y2), mo2, d2
+    try:
+        dt = datetime(int(y), int(mo), int(d), int(hh), int(mm), int(ss or 0), int((frac or "0").ljust(6, "0")))
+    except ValueError:
+        raise ValueError("Некорректная дата или время")
+    if offset:
+        # explicit offset (e.g. measured_at_utc from /export): not the user's local time
+        delta = timedelta(hours=int(off_h), minutes=int(off_m)) if sign else timedelta(0)
+        tz = timezone(-delta if sign == "-" else delta)
+        return dt.replace(tzinfo=tz).astimezone(timezone.utc).isoformat()
+    return utc_iso_from_local_datetime(user_tz, dt)
+
+def _values(text: str) -> list[Value]:
+    """'5.6' -> sugar, '120/80[/60]' or '120 80 [60]' -> BP, '5.6 120/80 60' -> both."""
+    tokens = _VALUE.findall(text)
+    if not tokens:
+        raise ValueError("Нет значений после даты и времени")
+    if any("/" in t or ":" in t for t in tokens):
+        bp_at = next(i for i, t in enumerate(tokens) if "/" in t or ":" in t)
+        sugar_tokens, bp_tokens = tokens[:bp_at], tokens[bp_at:]
+    elif len(tokens) == 1:
+        sugar_tokens, bp_tokens = tokens, []
+    elif len(tokens) in (2, 3) and all(t.isdigit() for t in tokens):
+        sugar_tokens, bp_tokens = [], tokens
+    else:
+        sugar_tokens, bp_tokens = tokens[:1], tokens[1:]
+    if len(sugar_tokens) > 1:
+        raise ValueError("Не понимаю значения. Пример: 5.6 или 120/80 60 или 5.6 120/80")
+    out: list[Value] = []
+    if sugar_tokens:
+        out.append(parse_sugar(sugar_tokens[0]))
+    if bp_tokens:
+        out.append(parse_bp(" ".join(bp_tokens)))
+    return out
+
+def parse_line(line: str, user_tz: str) -> list[ImportRow]:
+    m = _DATE_TIME.match(line)
+    if not m:
+        raise ValueError("Нужны дата и время в начале строки, например 2024-03-05 08:30")
+    measured_at_utc = _timestamp(m, user_tz)
+    ms = epoch_ms_from_iso(measured_at_utc)
+    return [ImportRow(measured_at_utc, ms, v) for v in _values(line[m.end():])]
+
+_COLUMNS = {
+    "datetime": ("measured_at_utc", "measured_at_local", "datetime", "дата и время", "timestamp"),
+    "date": ("date", "дата"),
+    "time": ("time", "время"),
+    "sugar": ("sugar_mmol_l", "sugar", "сахар", "glucose", "глюкоза"),
+    "sys": ("sys", "сад", "systolic"),
+    "dia": ("dia", "дад", "diastolic"),
+    "pulse": ("pulse", "пульс", "hr"),
+}
+
+def _header_map(cells: list[str]) -> Optional[dict[str, int]]:
+    names = [c.strip().lower() for c in cells]
+    found: dict[str, int] = {}
+    for key, aliases in _COLUMNS.items():
+        # the first alias present wins: measured_at_utc over measured_at_local
+        for alias in aliases:
+            if alias in names:
+                found[key] = names.index(alias)
+                break
+    has_time = "datetime" in found or ("date" in found and "time" in found)
+    has_value = "sugar" in found or ("sys" in found and "dia" in found)
+    return found if has_time and has_value else None
+
+def _csv_line(cells: list[str], cols: dict[str, int]) -> str:
+    """Rebuild one CSV record as a pasted line, so both go through parse_line."""
+    def cell(key: str) -> str:
+        i = cols.get(key)
+        return cells[i].strip() if i is not None and i < len(cells) else ""
+
+    when = cell("datetime") or f"{cell('date')} {cell('time')}"
+    parts = [when]
+    if cell("sugar"):
+        parts.append(cell("sugar"))
+    if cell("sys") and cell("dia"):
+        parts.append("/".join(x for x in (cell("sys"), cell("dia"), cell("pulse")) if x))
+    return " ".join(parts)
+
+def _records(lines: Iterable[str]) -> Iterator[tuple[int, str]]:
+    """(line number, text) per non-empty record; a recognised CSV header maps the columns of what follows."""
+    it = iter(enumerate(lines, start=1))
+    for line_no, line in it:
+        if not line.strip():
+            continue
+        delimiter = next((d for d in (",", ";", "\t") if d in line), None)
+        cols = _header_map(next(csv.reader([line], delimiter=delimiter))) if delimiter else None
+        if cols is None:
+            yield line_no, line
+            break
+        rest = (ln for _, ln in it)
+        for n, cells in enumerate(csv.reader(rest, delimiter=delimiter), start=line_no + 1):
+            if any(c.strip() for c in cells):
+                yield n, _csv_line(cells, cols)
+        return
+    for line_no, line in it:
+        if line.strip():
+            yield line_no, line
+
+def parse_import(text: str, user_tz: str, max_lines: int) -> ImportResult:
+    """Parse pasted lines or CSV text; sync and CPU-bound (run it in a thread)."""
+    result = ImportResult()
+    for line_no, line in _records(text.splitlines()):
+        if result.lines >= max_lines:
+            result.truncated = True
+            break
+        result.lines += 1
+        try:
+            result.rows.extend(parse_line(line, user_tz))
+        except ValueError as e:
+            result.reject(line_no, str(e))
+    return result
+
+def decode_upload(data: bytes) -> str:
+    for encoding in ("utf-8-sig", "cp1251"):
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    raise ValueError("Не удалось прочитать файл: ожидается текст в UTF-8 или Windows-1251")
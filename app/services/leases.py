@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Optional
+
+from app.infra import repo
+
+log = logging.getLogger(__name__)
+
+# (acquired, released) shard sets
+OnShardsChanged = Callable[[set[int], set[int]], Awaitable[None]]
+
+class ShardLeases:
+    """Keeps this instance's share of reminder shards leased in the database.
+
+    Every `interval` seconds one heartbeat renews the held leases (valid for
+    `ttl`) and rebalances toward a fair share; shards of an instance that stopped
+    heartbeating expire and are taken over. If heartbeats keep failing for
+    longer than the lease is valid, all shards are dropped locally so two
+    instances never send the same reminders.
+    """
+
+    def __init__(self, db, instance_id: str, shards: int, on_change: OnShardsChanged, ttl: float = 30.0, interval: float = 10.0):
+        self.db = db
+        self.instance_id = instance_id
+        self.shards = shards
+        self.on_change = on_change
+        self.ttl = ttl
+        self.interval = interval
+        self.owned: set[int] = set()
+        self._last_ok = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        await self._beat()
+        self._task = asyncio.create_task(self._run())
+        log.info("Shard leases started instance=%s owned=%s/%s", self.instance_id, len(self.owned), self.shards)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self._apply(set())
+        try:
+            await repo.release_leases(self.db, self.instance_id)
+        except Exception:
+            log.exception("Failed to release shard leases; they will expire in %ss", self.ttl)
+
+    def stats(self) -> dict[str, int]:
+        return {"shards": self.shards, "owned": len(self.owned)}
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self._beat()
+
+    async def _beat(self) -> None:
+        # leases renewed by this beat expire ttl after it started, not after it returned
+        started = time.monotonic()
+        try:
+            owned = await repo.heartbeat_leases(self.db, self.instance_id, self.shards, int(self.ttl * 1000))
+        except Exception:
+            log.exception("Lease heartbeat failed")
+            # the next check is up to one interval away and leases must be gone before they expire
+            # for the other instances, so drop while a whole interval of margin is still left
+            if self.owned and time.monotonic() - self._last_ok > self.ttl - 2 * self.interval:
+                log.error("Lease heartbeats failing for %.0fs; dropping all shards", time.monotonic() - self._last_ok)
+                await self._apply(set())
+            return
+        self._last_ok = started
+        await self._apply(owned)
+
+    async def _apply(self, owned: set[int]) -> None:
+        acquired, released = owned - self.owned, self.owned - owned
+        self.owned = owned
+        if acquired or released:
+            log.info("Shards changed instance=%s +%s -%s owned=%s", self.instance_id, len(acquired), len(released), len(owned))
+            await self.on_change(acquired, released)
@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import functools
+import importlib.util
+import math
+import os
+from datetime import datetime, timezone
+from typing import Optional
+
+import numpy as np
+
+from app.domain.models import BPSeries, SugarSeries
+from app.domain.units import MS_PER_DAY
+
+# Charts drawn straight onto a reportlab canvas as vector paths: no matplotlib,
+# no PNG encode, and the PDF stays small and sharp at any zoom. The look follows
+# plotting.py (same colours, grid, "%d.%m" UTC day ticks) so both styles read alike.
+
+BLUE = (0x1F / 255, 0x77 / 255, 0xB4 / 255)    # matplotlib C0
+ORANGE = (0xFF / 255, 0x7F / 255, 0x0E / 255)  # matplotlib C1
+
+# more points than this and the markers only thicken the line
+MAX_MARKERS = 400
+
+Line = tuple[np.ndarray, np.ndarray, tuple[float, float, float], Optional[str]]  # ts_ms, values, colour, legend label
+
+def _font_paths() -> list[str]:
+    paths = []
+    spec = importlib.util.find_spec("matplotlib")  # locates the package without importing it
+    if spec is not None and spec.origin:
+        paths.append(os.path.join(os.path.dirname(spec.origin), "mpl-data", "fonts", "ttf", "DejaVuSans.ttf"))
+    paths.append("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf")
+    return paths
+
+@functools.lru_cache(maxsize=None)
+def chart_font() -> str:
+    """A registered font with Cyrillic glyphs (the standard PDF fonts have none); Helvetica if none is found."""
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    for path in _font_paths():
+        if os.path.exists(path):
+            pdfmetrics.registerFont(TTFont("DejaVuSans", path))
+            return "DejaVuSans"
+    return "Helvetica"
+
+def _nice_step(span: float, target: int = 5) -> float:
+    raw = span / target
+    mag = 10 ** math.floor(math.log10(raw))
+    for m in (1, 2, 2.5, 5, 10):
+        if raw <= m * mag:
+            return m * mag
+    return 10 * mag
+
+def _y_range(lines: list[Line]) -> tuple[float, float, list[float]]:
+    values = np.concatenate([v[np.isfinite(v)] for _, v, _, _ in lines]) if lines else np.empty(0)
+    if len(values) == 0:
+        return 0.0, 1.0, [0.0, 1.0]
+    lo, hi = float(values.min()), float(values.max())
+    if hi - lo < 1e-9:
+        lo, hi = lo - 1, hi + 1
+    pad = (hi - lo) * 0.05
+    lo, hi = lo - pad, hi + pad
+    step = _nice_step(hi - lo)
+    ticks = [t * step for t in range(math.ceil(lo / step), math.floor(hi / step) + 1)]
+    return lo, hi, ticks
+
+def _x_range(ts_ms: np.ndarray) -> tuple[float, float, list[int]]:
+    lo, hi = float(ts_ms.min()), float(ts_ms.max())
+    if hi - lo < MS_PER_DAY:
+        # show the whole day(s) the readings fall on, so there is a date to label
+        lo = float(int(lo) // MS_PER_DAY * MS_PER_DAY)
+        hi = max(hi, lo + MS_PER_DAY)
+    else:
+        pad = (hi - lo) * 0.02
+        lo, hi = lo - pad, hi + pad
+    interval = max(1, math.ceil((hi - lo) / MS_PER_DAY / 10))
+    first = math.ceil(lo / MS_PER_DAY)
+    ticks = [d * MS_PER_DAY for d in range(first, int(hi // MS_PER_DAY) + 1, interval)]
+    return lo, hi, ticks
+
+def _fmt_tick(v: float) -> str:
+    return f"{v:.2f}".rstrip("0").rstrip(".")
+
+def _panel(
+    c,
+    x: float, y: float, w: float, h: float,
+    x_range: tuple[float, float, list[int]],
+    lines: list[Line],
+    *,
+    ylabel: str,
+    title: Optional[str] = None,
+    x_labels: bool = True,
+) -> None:
+    """One axes box at (x, y) of size w x h in points, labels included."""
+    font = chart_font()
+    left, right = 42.0, 8.0
+    bottom = 34.0 if x_labels else 6.0
+    top = 20.0 if title else 4.0
+    px, py, pw, ph = x + left, y + bottom, w - left - right, h - bottom - top
+    x_lo, x_hi, x_ticks = x_range
+    y_lo, y_hi, y_ticks = _y_range(lines)
+
+    def sx(t: np.ndarray) -> np.ndarray:
+        return px + (t - x_lo) / (x_hi - x_lo) * pw
+
+    def sy(v: np.ndarray) -> np.ndarray:
+        return py + (v - y_lo) / (y_hi - y_lo) * ph
+
+    if title:
+        c.setFont(font, 11)
+        c.setFillGray(0)
+        c.drawCentredString(px + pw / 2, py + ph + 6, title)
+
+    # grid and ticks
+    c.setLineWidth(0.5)
+    c.setStrokeGray(0.85)
+    c.setFont(font, 8)
+    c.setFillGray(0)
+    for v in y_ticks:
+        yy = float(sy(np.float64(v)))
+        c.line(px, yy, px + pw, yy)
+        c.drawRightString(px - 4, yy - 3, _fmt_tick(v))
+    for t in x_ticks:
+        xx = float(sx(np.float64(t)))
+        c.line(xx, py, xx, py + ph)
+        if x_labels:
+            c.saveState()
+            c.translate(xx, py - 6)
+            c.rotate(30)
+            c.drawRightString(0, -6, datetime.fromtimestamp(t / 1000, timezone.utc).strftime("%d.%m"))
+            c.restoreState()
+
+    c.saveState()
+    c.translate(x + 10, py + ph / 2)
+    c.rotate(90)
+    c.setFont(font, 9)
+    c.drawCentredString(0, 0, ylabel)
+    c.restoreState()
+
+    # series, clipped to the axes box
+    c.saveState()
+    clip = c.beginPath()
+    clip.rect(px, py, pw, ph)
+    c.clipPath(clip, stroke=0, fill=0)
+    c.setLineWidth(1)
+    c.setLineJoin(1)
+    for ts, values, colour, _ in lines:
+        xs, ys = sx(ts.astype(np.float64)), sy(values)
+        ok = np.isfinite(ys)
+        path = c.beginPath()
+        pen_down = False
+        for xv, yv, good in zip(xs.tolist(), ys.tolist(), ok.tolist()):
+            if not good:  # gaps break the line, as in matplotlib
+                pen_down = False
+            elif pen_down:
+                path.lineTo(xv, yv)
+            else:
+                path.moveTo(xv, yv)
+                pen_down = True
+        c.setStrokeColorRGB(*colour)
+        c.drawPath(path, stroke=1, fill=0)
+        if ok.sum() <= MAX_MARKERS:
+            # zero-length segments with round caps render as dots at a fraction of circle()'s path size
+            dots = c.beginPath()
+            for xv, yv in zip(xs[ok].tolist(), ys[ok].tolist()):
+                dots.moveTo(xv, yv)
+                dots.lineTo(xv, yv)
+            c.setLineCap(1)
+            c.setLineWidth(3.6)
+            c.drawPath(dots, stroke=1, fill=0)
+            c.setLineWidth(1)
+    c.restoreState()
+
+    c.setStrokeGray(0)
+    c.setLineWidth(0.8)
+    c.rect(px, py, pw, ph, stroke=1, fill=0)
+
+    labelled = [(colour, label) for _, _, colour, label in lines if label]
+    if labelled:
+        c.setFont(font, 8)
+        box_w = 30 + max(c.stringWidth(label, font, 8) for _, label in labelled)
+        box_h = 6 + 12 * len(labelled)
+        bx, by = px + pw - box_w - 6, py + ph - box_h - 6
+        c.setStrokeGray(0.8)
+        c.setFillGray(1)
+        c.setLineWidth(0.5)
+        c.rect(bx, by, box_w, box_h, stroke=1, fill=1)
+        for i, (colour, label) in enumerate(labelled):
+            ly = by + box_h - 9 - 12 * i
+            c.setStrokeColorRGB(*colour)
+            c.setLineWidth(1)
+            c.line(bx + 5, ly, bx + 21, ly)
+            c.setFillGray(0)
+            c.drawString(bx + 25, ly - 3, label)
+
+def draw_sugar_chart(c, series: SugarSeries, x: float, y: float, w: float, h: float, title: str) -> None:
+    _panel(c, x, y, w, h, _x_range(series.ts_ms), [(series.ts_ms, series.value, BLUE, None)], ylabel="mmol/L", title=title)
+
+def draw_bp_chart(c, series: BPSeries, x: float, y: float, w: float, h: float, title: str) -> None:
+    """SYS/DIA on top, pulse below on the same time axis (2:1 heights)."""
+    x_range = _x_range(series.ts_ms)
+    has_pulse = ~np.isnan(series.pulse)
+    pulse_h = h / 3
+    _panel(
+        c, x, y + pulse_h, w, h - pulse_h, x_range,
+        [(series.ts_ms, series.sys, BLUE, "SYS"), (series.ts_ms, series.dia, ORANGE, "DIA")],
+        ylabel="mmHg", title=title, x_labels=False,
+    )
+    _panel(c, x, y, w, pulse_h, x_range, [(series.ts_ms[has_pulse], series.pulse[has_pulse], BLUE, None)], ylabel="bpm")
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+
+from app.infra import repo
+from app.infra.db import Database
+from app.services.render_pool import QueueFull, RenderEngine
+from app.services.reports import ReportCache, build_report_pdf_from_columns, report_cache_key, since_ms
+from app.services.timeutils import get_zone
+
+log = logging.getLogger(__name__)
+
+# Windowed reports are keyed by the user's local date (report_cache_key), so the
+# first tap of the day always renders. Rendering them at a quiet local hour
+# turns that tap into a cache hit. "all" is not pre-generated: it reads the
+# rollup and is already cheap.
+KINDS = ("7", "30")
+
+class ReportPregenerator:
+    """Hourly job: renders the 7/30-day reports of recently active users whose local hour is `local_hour`.
+
+    Work per run is bounded by `concurrency` parallel renders and `cpu_budget_s`
+    seconds of render time; users past the budget wait for the next night.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        engine: RenderEngine,
+        cache: ReportCache,
+        data_dir: str,
+        *,
+        active_days: int,
+        local_hour: int,
+        concurrency: int = 1,
+        cpu_budget_s: float = 600.0,
+        raster_kinds: frozenset[str] = frozenset(),
+        max_points: int = 0,
+        owns: Callable[[int], bool] = lambda user_id: True,
+    ):
+        self.db = db
+        self.engine = engine
+        self.cache = cache
+        # own output dir: the temp PDF path must not collide with an interactive render of the same report
+        self.data_dir = os.path.join(data_dir, "pregen")
+        self.active_days = active_days
+        self.local_hour = local_hour
+        self.concurrency = max(1, concurrency)
+        self.cpu_budget_s = cpu_budget_s
+        self.raster_kinds = raster_kinds
+        self.max_points = max_points
+        self.owns = owns
+        self._counts = {"rendered": 0, "cached": 0, "deferred": 0, "failed": 0}
+        self._last_run_s = 0.0
+        self._last_users = 0
+
+    def _due(self, users: list[tuple[int, str]], now: datetime) -> list[tuple[int, str]]:
+        hours: dict[str, int] = {}
+        due = []
+        for user_id, tz in users:
+            if tz not in hours:
+                hours[tz] = now.astimezone(get_zone(tz)).hour
+            if hours[tz] == self.local_hour and self.owns(user_id):
+                due.append((user_id, tz))
+        return due
+
+    async def run(self) -> None:
+        if self.active_days <= 0:
+            return
+        started = time.perf_counter()
+        now = datetime.now(timezone.utc)
+        since_day = (now - timedelta(days=self.active_days)).date().isoformat()
+        due = self._due(await repo.list_active_users(self.db, since_day), now)
+        self._last_users = len(due)
+        if not due:
+            return
+
+        # a shared iterator: each worker takes the next user when it is free
+        pending = iter(due)
+        spent = 0.0
+        # the cache holds at most max_entries; rendering more would only evict this run's own output
+        room = self.cache.max_entries // 2
+
+        async def worker() -> None:
+            nonlocal spent, room
+            for user_id, tz in pending:
+                if spent >= self.cpu_budget_s or room < len(KINDS):
+                    self._counts["deferred"] += 1
+                    continue
+                room -= len(KINDS)
+                try:
+                    spent += await self._pregenerate(user_id, tz)
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    self._counts["failed"] += 1
+                    log.exception("Report pre-generation failed user=%s", user_id)
+
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        self._last_run_s = time.perf_counter() - started
+        log.info(
+            "Reports pre-generated users=%s render_s=%.1f run_s=%.1f counts=%s",
+            len(due), spent, self._last_run_s, self._counts,
+        )
+
+    async def _pregenerate(self, user_id: int, tz: str) -> float:
+        """Render the user's missing windowed reports into the cache; returns render seconds spent."""
+        watermark = await repo.get_measurement_watermark(self.db, user_id)
+        spent = 0.0
+        for kind in KINDS:
+            style = "raster" if kind in self.raster_kinds else "vector"
+            # same watermark and local date as the tap will use: a hit means the data has not changed
+            # since a copy made today (e.g. the user already looked), so there is nothing to do
+            key = report_cache_key(user_id, kind, watermark, tz, style, self.max_points)
+            if self.cache.get(key) is not None:
+                self._counts["cached"] += 1
+                continue
+            # interactive reports go first: wait until nobody is queued behind the workers
+            while self.engine.stats()["queued"]:
+                await asyncio.sleep(1)
+            days = int(kind)
+            cols = await repo.get_measurement_columns(self.db, user_id, since_ms=since_ms(days))
+            t = time.perf_counter()
+            try:
+                fut, _, _ = self.engine.submit(
+                    ("pregen", user_id, kind),
+                    build_report_pdf_from_columns,
+                    cols=cols,
+                    days=days,
+                    user_id=user_id,
+                    data_dir=self.data_dir,
+                    style=style,
+                    max_points=self.max_points,
+                )
+            except QueueFull:
+                self._counts["deferred"] += 1
+                return spent
+            path = await fut
+            spent += time.perf_counter() - t
+            self.cache.put(key, user_id, path)
+            self._counts["rendered"] += 1
+        return spent
+
+    def stats(self) -> dict[str, float]:
+        return {**self._counts, "last_run_users": self._last_users, "last_run_s": self._last_run_s}
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable, Optional
+from zoneinfo import ZoneInfo
+
+from app.infra import repo
+from app.services.timeutils import get_zone
+
+log = logging.getLogger(__name__)
+
+@dataclass(frozen=True, slots=True)
+class UserProfile:
+    user_id: int
+    timezone: str          # the user's zone, or the bot default for unknown users
+    zone: ZoneInfo
+    slots: tuple[str, ...]  # enabled reminder slots, sorted
+    known: bool            # a users row exists
+    loaded_at: float = 0.0  # time.monotonic() when read from the database
+
+class ProfileCache:
+    """Bounded LRU of user_id -> UserProfile in front of the users/reminder_slots tables.
+
+    Kept fresh through repo write events (EVENT_USER, EVENT_SLOTS); a load that raced an
+    invalidation is returned but not cached, so a stale row never sticks. Events
+    are per process, so with several instances a ttl bounds how long a change
+    made elsewhere can go unseen.
+    """
+
+    def __init__(self, db, default_tz: str, max_entries: int = 50_000, ttl: float = 0.0):
+        self.db = db
+        self.default_tz = default_tz
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self._entries: OrderedDict[int, UserProfile] = OrderedDict()
+        self._generation = 0
+        self._hits = 0
+        self._misses = 0
+
+    async def get(self, user_id: int) -> UserProfile:
+        profile = self._entries.get(user_id)
+        if profile is not None and self.ttl and time.monotonic() - profile.loaded_at > self.ttl:
+            profile = None
+        if profile is not None:
+            self._hits += 1
+            self._entries.move_to_end(user_id)
+            return profile
+        self._misses += 1
+        generation = self._generation
+        user_tz, slots = await repo.get_user_profile(self.db, user_id)
+        profile = self._make(user_id, user_tz, slots)
+        if self._generation == generation:
+            self._store(profile)
+        return profile
+
+    async def timezone(self, user_id: int) -> str:
+        return (await self.get(user_id)).timezone
+
+    async def ensure_registered(self, user_id: int) -> UserProfile:
+        """Profile of user_id, creating the users row (default zone) on first contact.
+
+        Measurements reference users(user_id), so every path that writes them calls this first.
+        """
+        profile = await self.get(user_id)
+        if not profile.known:
+            await repo.upsert_user(self.db, user_id, profile.timezone)
+        return profile
+
+    def warm(self, rows: Iterable[tuple[int, str, str]]) -> None:
+        """Prime from list_all_enabled_slots rows: (user_id, timezone, time_hm)."""
+        by_user: dict[int, tuple[str, list[str]]] = {}
+        for user_id, user_tz, time_hm in rows:
+            by_user.setdefault(user_id, (user_tz, []))[1].append(time_hm)
+        for user_id, (user_tz, slots) in by_user.items():
+            if len(self._entries) >= self.max_entries:
+                break
+            self._store(self._make(user_id, user_tz, sorted(slots)))
+        log.info("Profile cache warmed with %s users", len(self._entries))
+
+    def invalidate(self, user_id: int) -> None:
+        self._entries.pop(user_id, None)
+        self._generation += 1
+
+    def on_repo_event(self, event: str, user_id: int) -> None:
+        if event in (repo.EVENT_USER, repo.EVENT_SLOTS):
+            self.invalidate(user_id)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self._hits,
+            "misses": self._misses,
+        }
+
+    def _make(self, user_id: int, user_tz: Optional[str], slots: Iterable[str]) -> UserProfile:
+        effective = user_tz or self.default_tz
+        return UserProfile(user_id, effective, get_zone(effective), tuple(slots), user_tz is not None, time.monotonic())
+
+    def _store(self, profile: UserProfile) -> None:
+        self._entries[profile.user_id] = profile
+        self._entries.move_to_end(profile.user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
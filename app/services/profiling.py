@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import asyncio
+import linecache
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Optional
+
+MAX_SECONDS = 300
+
+Func = tuple[str, int, str]  # filename, first line, name
+
+def _where(filename: str, line: int, name: str) -> str:
+    # shorten paths under the project / site-packages for readability
+    for root in (os.getcwd(), *sys.path):
+        if root and filename.startswith(root + os.sep):
+            filename = filename[len(root) + 1:]
+            break
+    return f"{name} ({filename}:{line})" if name else f"{filename}:{line}"
+
+class SamplingProfiler:
+    """Samples one thread's stack from a helper thread every `interval` seconds.
+
+    Pointed at the event loop thread it shows where the loop spends its time
+    (including time blocked in select(), i.e. idle) at a cost of one stack walk
+    per sample, so it is safe to run on a live instance.
+    """
+
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = 0
+        self.self_lines: Counter[tuple[str, int, str]] = Counter()
+        self.inclusive: Counter[Func] = Counter()
+        self.stacks: Counter[tuple[str, ...]] = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.samples += 1
+            code = frame.f_code
+            self.self_lines[(code.co_filename, frame.f_lineno, code.co_name)] += 1
+            funcs: list[Func] = []
+            while frame is not None:
+                code = frame.f_code
+                funcs.append((code.co_filename, code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+            self.inclusive.update(set(funcs))
+            self.stacks[tuple(f[2] for f in reversed(funcs))] += 1
+
+    def report(self, top: int, elapsed: float) -> str:
+        n = max(1, self.samples)
+        out = [
+            f"CPU profile of the event loop thread: {self.samples} samples over {elapsed:.1f}s "
+            f"(every {self.interval * 1000:.0f} ms)",
+            "",
+            f"Top {top} lines (self):",
+        ]
+        for (filename, line, name), count in self.self_lines.most_common(top):
+            out.append(f"{count / n:7.1%} {count:7d}  {_where(filename, line, name)}")
+            src = linecache.getline(filename, line).strip()
+            if src:
+                out.append(f"{'':17}{src}")
+        out += ["", f"Top {top} functions (inclusive):"]
+        for (filename, line, name), count in self.inclusive.most_common(top):
+            out.append(f"{count / n:7.1%} {count:7d}  {_where(filename, line, name)}")
+        out += ["", "Folded stacks (flamegraph.pl / speedscope):"]
+        for stack, count in self.stacks.most_common():
+            out.append(f"{';'.join(stack)} {count}")
+        return "\n".join(out) + "\n"
+
+class Profiler:
+    """One on-demand profiling session at a time, started and stopped by admin commands."""
+
+    def __init__(self) -> None:
+        self.kind: Optional[str] = None
+        self._stop: Optional[asyncio.Event] = None
+
+    @property
+    def busy(self) -> bool:
+        return self.kind is not None
+
+    def stop(self) -> bool:
+        if self._stop is None:
+            return False
+        self._stop.set()
+        return True
+
+    async def _wait(self, seconds: float) -> float:
+        t = time.monotonic()
+        try:
+            await asyncio.wait_for(self._stop.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+        return time.monotonic() - t
+
+    async def cpu(self, seconds: float, top: int = 30) -> str:
+        """Sample the event loop thread for `seconds` (or until stop()); returns a text report."""
+        self._begin("cpu")
+        sampler = SamplingProfiler(threading.get_ident())
+        sampler.start()
+        try:
+            elapsed = await self._wait(seconds)
+        finally:
+            await asyncio.to_thread(sampler.stop)
+            self._end()
+        return sampler.report(top, elapsed)
+
+    async def memory(self, seconds: float, top: int = 30) -> str:
+        """tracemalloc over `seconds`: allocation sites that grew the most, then the largest live ones."""
+        self._begin("memory")
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start(10)
+        try:
+            before = tracemalloc.take_snapshot()
+            elapsed = await self._wait(seconds)
+            after = tracemalloc.take_snapshot()
+            traced, peak = tracemalloc.get_traced_memory()
+        finally:
+            if not was_tracing:
+                tracemalloc.stop()
+            self._end()
+
+        noise = (
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        )
+        before, after = before.filter_traces(noise), after.filter_traces(noise)
+        out = [
+            f"tracemalloc over {elapsed:.1f}s: traced {traced / 1e6:.1f} MB now, peak {peak / 1e6:.1f} MB",
+            "(only allocations made while tracing are seen)",
+            "",
+            f"Top {top} growth by line:",
+        ]
+        for stat in after.compare_to(before, "lineno")[:top]:
+            frame = stat.traceback[0]
+            out.append(
+                f"{stat.size_diff / 1024:+10.1f} KiB {stat.count_diff:+8d} blocks  "
+                f"{_where(frame.filename, frame.lineno, '')}"
+            )
+        out += ["", f"Top {top} live allocations by traceback:"]
+        for stat in after.statistics("traceback")[:top]:
+            out.append(f"{stat.size / 1024:10.1f} KiB {stat.count:8d} blocks")
+            for line in stat.traceback.format(limit=6):
+                out.append(f"    {line}")
+        return "\n".join(out) + "\n"
+
+    def _begin(self, kind: str) -> None:
+        if self.busy:
+            raise RuntimeError(f"{self.kind} profile already running")
+        self.kind = kind
+        self._stop = asyncio.Event()
+
+    def _end(self) -> None:
+        self.kind = None
+        self._stop = None
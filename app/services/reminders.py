@@ -1,85 +1,284 @@
 from __future__ import annotations
 
+import asyncio
+import heapq
+import itertools
 import logging
-from datetime import datetime, timezone
-from zoneinfo import ZoneInfo
-
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.date import DateTrigger
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional
 
 from aiogram import Bot
 
-from app.infra import repo
-from app.services.timeutils import next_fire_local, now_utc_iso
+from app.infra import metrics, repo
+from app.services.sender import PRIORITY_BULK, send_priority
+from app.services.timeutils import get_zone, next_fire_local, now_utc_iso
 from app.ui.keyboards import kb_measure_choice
 
 log = logging.getLogger(__name__)
 
-def _job_id(user_id: int, time_hm: str) -> str:
-    return f"reminder:{user_id}:{time_hm}"
+# upper bound on a single sleep, so wall-clock jumps (NTP, suspend) are noticed
+MAX_SLEEP = 60.0
+
+@dataclass(slots=True)
+class ReminderEntry:
+    user_id: int
+    user_tz: str
+    time_hm: str
+    fire_at: float  # UTC epoch seconds
+    cancelled: bool = False
+
+def next_fire_utc(user_tz: str, time_hm: str, after: Optional[datetime] = None) -> float:
+    """Epoch seconds of the next local time_hm strictly after `after` (default: now)."""
+    now_local = None if after is None else after.astimezone(get_zone(user_tz))
+    return next_fire_local(user_tz, time_hm, now_local).astimezone(timezone.utc).timestamp()
+
+class ReminderDispatcher:
+    """All reminder slots in one min-heap keyed by next UTC fire time, driven by a single timer task.
+
+    Cancel is lazy: the entry is flagged and dropped when it reaches the top of
+    the heap. A per-user index makes cancelling a user O(slots) rather than a
+    scan over every scheduled reminder.
+
+    With several instances (enable_sharding), only users whose shard
+    (user_id % n_shards) is leased by this instance are scheduled here.
+    """
+
+    def __init__(self, bot: Bot, db, misfire_grace: float = 600.0):
+        self.bot = bot
+        self.db = db
+        self.misfire_grace = misfire_grace
+        self._heap: list[tuple[float, int, ReminderEntry]] = []
+        self._seq = itertools.count()
+        self._by_user: dict[int, dict[str, ReminderEntry]] = {}
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._waves: set[asyncio.Task] = set()
+        self._cancelled = 0
+        self.n_shards = 0
+        self.owned_shards: Optional[set[int]] = None  # None: single instance, every user is ours
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        tasks = [t for t in (self._task, *self._waves) if t is not None]
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._waves.clear()
+
+    def __len__(self) -> int:
+        return len(self._heap) - self._cancelled
+
+    def enable_sharding(self, n_shards: int) -> None:
+        """Start owning no shards; ShardLeases hands them over via on_shards_changed."""
+        self.n_shards = n_shards
+        self.owned_shards = set()
+
+    def owns(self, user_id: int) -> bool:
+        return self.owned_shards is None or user_id % self.n_shards in self.owned_shards
+
+    def add(self, user_id: int, user_tz: str, time_hm: str) -> Optional[ReminderEntry]:
+        """Schedule (or reschedule) one slot; replaces an existing entry for the same slot."""
+        self.cancel(user_id, time_hm)
+        if not self.owns(user_id):
+            return None  # another instance's shard picks it up on resync
+        entry = ReminderEntry(user_id, user_tz, time_hm, next_fire_utc(user_tz, time_hm))
+        self._push(entry)
+        return entry
+
+    def load(self, rows: Iterable[tuple[int, str, str]], catch_up: bool = False) -> None:
+        """Bulk-schedule (user_id, user_tz, time_hm) rows with a single heapify.
+
+        catch_up also schedules slots that came due within misfire_grace (shards
+        taken over from another instance); reminder_log skips those it already sent.
+        """
+        now = datetime.now(timezone.utc)
+        if catch_up:
+            now -= timedelta(seconds=self.misfire_grace)
+        fire_times: dict[tuple[str, str], float] = {}  # users share a handful of (tz, slot) pairs
+        for user_id, user_tz, time_hm in rows:
+            self.cancel(user_id, time_hm)
+            if not self.owns(user_id):
+                continue
+            fire_at = fire_times.get((user_tz, time_hm))
+            if fire_at is None:
+                fire_at = fire_times[(user_tz, time_hm)] = next_fire_utc(user_tz, time_hm, now)
+            entry = ReminderEntry(user_id, user_tz, time_hm, fire_at)
+            self._by_user.setdefault(user_id, {})[time_hm] = entry
+            self._heap.append((entry.fire_at, next(self._seq), entry))
+        heapq.heapify(self._heap)
+        self._wake.set()
 
-async def schedule_one(scheduler: AsyncIOScheduler, bot: Bot, conn, user_id: int, user_tz: str, time_hm: str) -> None:
-    tz = ZoneInfo(user_tz)
-    dt_local = next_fire_local(user_tz, time_hm)
-    run_date_utc = dt_local.astimezone(timezone.utc)
+    def set_user_slots(self, user_id: int, user_tz: str, slots: Iterable[str]) -> None:
+        self.cancel_user(user_id)
+        for hm in slots:
+            self.add(user_id, user_tz, hm)
 
-    job_id = _job_id(user_id, time_hm)
+    def set_user_timezone(self, user_id: int, user_tz: str) -> None:
+        """Recompute a user's fire times after a timezone change."""
+        slots = list(self._by_user.get(user_id, {}))
+        if slots:
+            self.set_user_slots(user_id, user_tz, slots)
 
-    # Replace existing job idempotently
+    def cancel(self, user_id: int, time_hm: str) -> None:
+        slots = self._by_user.get(user_id)
+        if not slots:
+            return
+        entry = slots.pop(time_hm, None)
+        if entry is not None:
+            entry.cancelled = True
+            self._cancelled += 1
+        if not slots:
+            del self._by_user[user_id]
+
+    def cancel_user(self, user_id: int) -> None:
+        for entry in self._by_user.pop(user_id, {}).values():
+            entry.cancelled = True
+            self._cancelled += 1
+
+    async def on_shards_changed(self, acquired: set[int], released: set[int]) -> None:
+        self.owned_shards = (self.owned_shards - released) | acquired
+        if released:
+            for user_id in [u for u in self._by_user if u % self.n_shards in released]:
+                self.cancel_user(user_id)
+        if acquired:
+            self.load(await repo.list_enabled_slots_for_shards(self.db, acquired, self.n_shards), catch_up=True)
+
+    async def resync(self) -> None:
+        """Reconcile with the database: picks up slot/timezone changes made through other instances."""
+        if self.owned_shards is None:
+            rows = await repo.list_all_enabled_slots(self.db)
+        else:
+            rows = await repo.list_enabled_slots_for_shards(self.db, self.owned_shards, self.n_shards)
+        wanted: dict[int, tuple[str, set[str]]] = {}
+        for user_id, user_tz, time_hm in rows:
+            wanted.setdefault(user_id, (user_tz, set()))[1].add(time_hm)
+        changed = 0
+        for user_id, (user_tz, slots) in wanted.items():
+            current = self._by_user.get(user_id, {})
+            if set(current) != slots or any(e.user_tz != user_tz for e in current.values()):
+                self.set_user_slots(user_id, user_tz, sorted(slots))
+                changed += 1
+        for user_id in [u for u in self._by_user if u not in wanted]:
+            self.cancel_user(user_id)
+            changed += 1
+        if changed:
+            log.info("Reminder resync updated %s users", changed)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "scheduled": len(self),
+            "users": len(self._by_user),
+            "heap": len(self._heap),
+            "waves": len(self._waves),
+            "owned_shards": -1 if self.owned_shards is None else len(self.owned_shards),
+        }
+
+    def user_slots(self, user_id: int) -> list[str]:
+        return sorted(self._by_user.get(user_id, {}))
+
+    def next_fire_at(self) -> Optional[float]:
+        self._drop_cancelled()
+        return self._heap[0][0] if self._heap else None
+
+    def _push(self, entry: ReminderEntry) -> None:
+        self._by_user.setdefault(entry.user_id, {})[entry.time_hm] = entry
+        heapq.heappush(self._heap, (entry.fire_at, next(self._seq), entry))
+        if self._heap[0][2] is entry:
+            self._wake.set()
+
+    def _drop_cancelled(self) -> None:
+        while self._heap and self._heap[0][2].cancelled:
+            heapq.heappop(self._heap)
+            self._cancelled -= 1
+
+    def _pop_due(self, now: float) -> list[ReminderEntry]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, _, entry = heapq.heappop(self._heap)
+            if entry.cancelled:
+                self._cancelled -= 1
+                continue
+            due.append(entry)
+            # next occurrence is computed from this one, so a late wake never skips a day
+            fired = datetime.fromtimestamp(entry.fire_at, timezone.utc)
+            nxt = ReminderEntry(entry.user_id, entry.user_tz, entry.time_hm,
+                                next_fire_utc(entry.user_tz, entry.time_hm, fired))
+            self._push(nxt)
+        return due
+
+    async def _run(self) -> None:
+        while True:
+            self._wake.clear()
+            fire_at = self.next_fire_at()
+            now = time.time()
+            if fire_at is None or fire_at > now:
+                timeout = MAX_SLEEP if fire_at is None else min(fire_at - now, MAX_SLEEP)
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            due = self._pop_due(now)
+            for e in due:
+                metrics.REMINDER_LAG_SECONDS.observe(now - e.fire_at)
+            fresh = [e for e in due if now - e.fire_at <= self.misfire_grace]
+            if len(fresh) < len(due):
+                log.warning("Skipped %s reminders past misfire grace", len(due) - len(fresh))
+            if fresh:
+                task = asyncio.create_task(self._fire(fresh))
+                self._waves.add(task)
+                task.add_done_callback(self._waves.discard)
+
+    async def _fire(self, wave: list[ReminderEntry]) -> None:
+        # the sender paces this wave behind interactive replies
+        send_priority.set(PRIORITY_BULK)
+        groups: dict[tuple[str, str], list[ReminderEntry]] = defaultdict(list)
+        for e in wave:
+            slot_date = datetime.fromtimestamp(e.fire_at, get_zone(e.user_tz)).date().isoformat()
+            groups[(slot_date, e.time_hm)].append(e)
+        with metrics.REMINDER_WAVE_SECONDS.time():
+            for (slot_date, time_hm), entries in groups.items():
+                await self._fire_slot(slot_date, time_hm, entries)
+
+    async def _fire_slot(self, slot_date: str, time_hm: str, entries: list[ReminderEntry]) -> None:
+        # Idempotency: one marker query for the whole slot, one transaction for all deliveries
+        already = await repo.reminders_sent_for_slot(self.db, slot_date, time_hm)
+        # ownership is re-checked: a shard may have moved to another instance since the wave was popped
+        todo = [e for e in entries if e.user_id not in already and self.owns(e.user_id)]
+        if len(todo) < len(entries):
+            log.info("Reminders skipped (already sent or shard moved) slot=%s %s users=%s", slot_date, time_hm, len(entries) - len(todo))
+        results = await asyncio.gather(*(send_reminder(self.bot, e.user_id, time_hm) for e in todo))
+        sent_at = now_utc_iso()
+        delivered = [(e.user_id, slot_date, time_hm, sent_at) for e, ok in zip(todo, results) if ok]
+        await repo.mark_reminders_sent(self.db, delivered)
+        log.info("Reminder wave slot=%s %s sent=%s/%s", slot_date, time_hm, len(delivered), len(todo))
+
+async def send_reminder(bot: Bot, user_id: int, time_hm: str) -> bool:
     try:
-        scheduler.remove_job(job_id)
+        await bot.send_message(
+            chat_id=user_id,
+            text=f"⏰ Напоминание: замер в {time_hm}. Что внесём?",
+            reply_markup=kb_measure_choice(),
+        )
     except Exception:
-        pass
-
-    scheduler.add_job(
-        func=send_and_reschedule,
-        trigger=DateTrigger(run_date=run_date_utc),
-        id=job_id,
-        kwargs={
-            "scheduler": scheduler,
-            "bot": bot,
-            "conn": conn,
-            "user_id": user_id,
-            "user_tz": user_tz,
-            "time_hm": time_hm,
-        },
-        replace_existing=True,
-        misfire_grace_time=60 * 10,  # 10 minutes
-    )
-    log.info("Scheduled reminder user=%s time=%s at_utc=%s", user_id, time_hm, run_date_utc.isoformat())
-
-async def send_and_reschedule(*, scheduler: AsyncIOScheduler, bot: Bot, conn, user_id: int, user_tz: str, time_hm: str) -> None:
-    tz = ZoneInfo(user_tz)
-    local_now = datetime.now(tz)
-    slot_date = local_now.date().isoformat()
-
-    # Idempotency: ensure one send per day+slot
-    if await repo.reminder_already_sent(conn, user_id, slot_date, time_hm):
-        log.info("Reminder already sent user=%s slot=%s %s", user_id, slot_date, time_hm)
-    else:
-        try:
-            await bot.send_message(
-                chat_id=user_id,
-                text=f"⏰ Напоминание: замер в {time_hm}. Что внесём?",
-                reply_markup=kb_measure_choice(),
-            )
-            await repo.mark_reminder_sent(conn, user_id, slot_date, time_hm, now_utc_iso())
-        except Exception:
-            log.exception("Failed to send reminder to user=%s", user_id)
-
-    # Reschedule next occurrence
-    await schedule_one(scheduler, bot, conn, user_id, user_tz, time_hm)
-
-async def schedule_all_from_db(scheduler: AsyncIOScheduler, bot: Bot, conn) -> None:
-    rows = await repo.list_all_enabled_slots(conn)
-    for user_id, user_tz, time_hm in rows:
-        await schedule_one(scheduler, bot, conn, user_id, user_tz, time_hm)
-
-async def cancel_user_jobs(scheduler: AsyncIOScheduler, user_id: int) -> None:
-    # APScheduler doesn't support prefix remove directly; iterate
-    for job in scheduler.get_jobs():
-        if job.id.startswith(f"reminder:{user_id}:"):
-            try:
-                scheduler.remove_job(job.id)
-            except Exception:
-                pass
+        log.exception("Failed to send reminder to user=%s", user_id)
+        return False
+    return True
+
+async def schedule_all_from_db(dispatcher: ReminderDispatcher, db) -> list[tuple[int, str, str]]:
+    rows = await repo.list_all_enabled_slots(db)
+    dispatcher.load(rows)
+    log.info("Scheduled %s reminders", len(rows))
+    return rows
+
+async def purge_reminder_log(db, retention_days: int) -> None:
+    """Scheduled job: drop idempotency markers older than retention_days."""
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=retention_days)).date().isoformat()
+    removed = await repo.purge_reminder_log(db, cutoff)
+    log.info("Purged %s reminder_log rows before %s", removed, cutoff)
@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import logging
+import multiprocessing
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Hashable
+
+from app.infra import metrics
+
+log = logging.getLogger(__name__)
+
+class QueueFull(Exception):
+    """Render queue is at capacity; the caller should ask the user to retry later."""
+
+def _warm_up(raster: bool) -> None:
+    """Worker initializer: pay reportlab (and, if raster charts are used, matplotlib) imports + fonts once per process."""
+    import numpy as np
+    import reportlab.pdfgen.canvas  # noqa: F401
+    from app.services import pdf_charts, reports  # noqa: F401
+    pdf_charts.chart_font()
+    if raster:
+        from app.services import plotting
+        fig = plotting.sugar_figure(plotting.SugarSeries(np.array([0, 86_400_000]), np.array([5.0, 6.0])), title="warm-up")
+        plotting.fig_to_png_bytes(fig)
+
+def _ping() -> None:
+    return None
+
+class RenderEngine:
+    """Pool of warmed-up worker processes fed from a bounded, per-key deduplicated queue.
+
+    Each process has its own pyplot state, so concurrent reports neither share
+    figures nor contend for the bot's GIL.
+    """
+
+    def __init__(self, workers: int, max_queue: int, warm_raster: bool = True):
+        self.workers = max(1, workers)
+        self.max_queue = max(1, max_queue)
+        self.warm_raster = warm_raster
+        self._executor: ProcessPoolExecutor | None = None
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._waiting: OrderedDict[Hashable, None] = OrderedDict()
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+        self._tasks: list[asyncio.Task] = []
+        self._warming: asyncio.Task | None = None
+        self._busy = 0
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # spawn, not fork: children must not inherit the event loop / sqlite threads
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_warm_up,
+            initargs=(self.warm_raster,),
+        )
+
+    async def start(self) -> None:
+        self._executor = self._new_executor()
+        self._tasks = [asyncio.create_task(self._consume()) for _ in range(self.workers)]
+        # spawn + warm all workers in the background: polling must not wait for reportlab/matplotlib
+        # imports, yet the first report normally finds them ready
+        self._warming = asyncio.create_task(self._warm(self._executor))
+        log.info("Render engine started workers=%s max_queue=%s", self.workers, self.max_queue)
+
+    async def _warm(self, executor: ProcessPoolExecutor) -> None:
+        loop = asyncio.get_running_loop()
+        t = time.perf_counter()
+        try:
+            await asyncio.gather(*(loop.run_in_executor(executor, _ping) for _ in range(self.workers)))
+        except Exception:
+            log.exception("Render worker warm-up failed")
+            return
+        log.info("Render workers warmed up in %.1f s", time.perf_counter() - t)
+
+    async def stop(self) -> None:
+        tasks = self._tasks + ([self._warming] if self._warming is not None else [])
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        self._warming = None
+        for fut in self._inflight.values():
+            if not fut.done():
+                fut.cancel()
+        self._inflight.clear()
+        self._waiting.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def submit(self, key: Hashable, fn: Callable[..., Any], **kwargs) -> tuple[asyncio.Future, int, bool]:
+        """Queue fn(**kwargs) in a worker process.
+
+        Returns (future, position, created). position is the 1-based place in the
+        queue, 0 when a worker is free to take the job right away; created is False
+        when a job with the same key was already in flight and its future is
+        returned instead.
+        """
+        fut = self._inflight.get(key)
+        if fut is not None:
+            return fut, self.position(key), False
+        # jobs that idle workers are about to take are not queued, only those behind them
+        if len(self._waiting) - max(0, self.workers - self._busy) >= self.max_queue:
+            raise QueueFull()
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        self._waiting[key] = None
+        # the submitter's context goes along, so queue/stage timings land in its update trace
+        self._queue.put_nowait((key, functools.partial(fn, **kwargs), fut, time.monotonic(), contextvars.copy_context()))
+        return fut, self.position(key), True
+
+    def position(self, key: Hashable) -> int:
+        idle = self.workers - self._busy
+        for i, k in enumerate(self._waiting, start=1):
+            if k == key:
+                return max(0, i - idle)
+        return 0
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "workers": self.workers,
+            "queued": len(self._waiting),
+            "busy": self._busy,
+            "in_flight": len(self._inflight),
+            "max_queue": self.max_queue,
+        }
+
+    async def _consume(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            key, call, fut, queued_at, ctx = await self._queue.get()
+            self._waiting.pop(key, None)
+            self._busy += 1
+            try:
+                if fut.done():  # cancelled while waiting
+                    continue
+                ctx.run(metrics.observe_stages, {"queue": time.monotonic() - queued_at})
+                executor = self._executor
+                try:
+                    # stage timings recorded inside the worker come back with the result
+                    result, stages = await loop.run_in_executor(
+                        executor, functools.partial(metrics.run_collecting_stages, call)
+                    )
+                except BrokenProcessPool:
+                    if self._executor is executor:
+                        log.exception("Render worker died; restarting pool")
+                        executor.shutdown(wait=False, cancel_futures=True)
+                        self._executor = self._new_executor()
+                    raise
+                ctx.run(metrics.observe_stages, stages)
+                if not fut.done():
+                    fut.set_result(result)
+            except asyncio.CancelledError:
+                if not fut.done():
+                    fut.cancel()
+                raise
+            except Exception as e:
+                if not fut.done():
+                    fut.set_exception(e)
+            finally:
+                self._busy -= 1
+                self._inflight.pop(key, None)
+                self._queue.task_done()
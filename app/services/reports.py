@@ -1,53 +1,63 @@
 from __future__ import annotations
 
+import hashlib
+import io
+import logging
 import os
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from decimal import Decimal
 from typing import Optional
 
-from dateutil import parser as dtparser
-
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.utils import ImageReader
-
-from app.services.plotting import SugarPoint, BPPoint, sugar_figure, bp_figure, fig_to_png_bytes
-
-def _since_iso(days: int) -> str:
-    return (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
-
-def since_iso(days: Optional[int]) -> Optional[str]:
-    return None if days is None else _since_iso(days)
-
-def _aggregate_daily(points: list[tuple[datetime, float]]) -> list[tuple[datetime, float]]:
-    """Median per day in UTC."""
-    by_day: dict[str, list[float]] = {}
-    for dt, v in points:
-        key = dt.date().isoformat()
-        by_day.setdefault(key, []).append(v)
-    out = []
-    for day, vals in sorted(by_day.items()):
-        vals_sorted = sorted(vals)
-        mid = len(vals_sorted) // 2
-        if len(vals_sorted) % 2 == 1:
-            med = vals_sorted[mid]
-        else:
-            med = (vals_sorted[mid - 1] + vals_sorted[mid]) / 2
-        out.append((datetime.fromisoformat(day).replace(tzinfo=timezone.utc), med))
-    return out
+import numpy as np
+
+from app.domain.downsample import downsample_bp, downsample_sugar
+from app.domain.models import BPSeries, MeasurementColumns, SugarSeries
+from app.domain.units import MS_PER_DAY, SUGAR_SCALE
+from app.infra.metrics import stage
+from app.infra.repo import EVENT_MEASUREMENTS
+from app.services.timeutils import get_zone
+
+# matplotlib/reportlab are imported inside the build functions: they only run in
+# render workers (warmed up there), so the bot process never pays for them.
+
+log = logging.getLogger(__name__)
+
+# Bump whenever report output changes so cached PDFs from older code are not served.
+RENDERER_VERSION = 3
+
+def since_ms(days: Optional[int]) -> Optional[int]:
+    if days is None:
+        return None
+    return int((datetime.now(timezone.utc) - timedelta(days=days)).timestamp() * 1000)
+
+def _aggregate_daily(ts_ms: np.ndarray, values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Median per day in UTC -> (day_start_ms, median); even-length days average the two middle values."""
+    if len(ts_ms) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+    day = ts_ms // MS_PER_DAY
+    order = np.lexsort((values, day))  # by day, then value
+    day_sorted = day[order]
+    vals_sorted = values[order].astype(np.float64)
+    starts = np.flatnonzero(np.r_[True, day_sorted[1:] != day_sorted[:-1]])
+    counts = np.diff(np.r_[starts, len(day_sorted)])
+    lo = starts + (counts - 1) // 2
+    hi = starts + counts // 2
+    return day_sorted[starts] * MS_PER_DAY, (vals_sorted[lo] + vals_sorted[hi]) / 2
 
 def _build_pdf(path: str, pages: list[tuple[str, bytes]], title: str) -> None:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.utils import ImageReader
+    from reportlab.pdfgen import canvas
+
     os.makedirs(os.path.dirname(path), exist_ok=True)
     c = canvas.Canvas(path, pagesize=A4)
     w, h = A4
 
     for caption, png_bytes in pages:
-        c.setFont("Helvetica-Bold", 14)
-        c.drawString(40, h - 50, title)
-        c.setFont("Helvetica", 11)
-        c.drawString(40, h - 70, caption)
+        _page_header(c, h, title, caption)
 
-        img = ImageReader(png_bytes)
+        img = ImageReader(io.BytesIO(png_bytes))
         img_w = w - 80
         img_h = h - 140
         c.drawImage(img, 40, 60, width=img_w, height=img_h, preserveAspectRatio=True, anchor='c')
@@ -55,65 +65,290 @@ def _build_pdf(path: str, pages: list[tuple[str, bytes]], title: str) -> None:
 
     c.save()
 
-def build_report_pdf_from_rows(*, rows: list[dict], user_id: int, data_dir: str, days: Optional[int]) -> str:
-    """Pure sync function: rows already fetched. Heavy plotting/PDF happens here."""
-    period_label = "all" if days is None else f"{days}d"
+def _page_header(c, h: float, title: str, caption: str) -> None:
+    from app.services.pdf_charts import chart_font
+
+    c.setFont("Helvetica-Bold", 14)
+    c.drawString(40, h - 50, title)
+    c.setFont(chart_font(), 11)
+    c.drawString(40, h - 70, caption)
+
+def _build_vector_pdf(path: str, sugar: SugarSeries, bp: BPSeries, title: str, captions: tuple[str, str]) -> None:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+    from app.services.pdf_charts import draw_bp_chart, draw_sugar_chart
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    c = canvas.Canvas(path, pagesize=A4)
+    w, h = A4
+    chart_w = w - 80
 
-    sugar_points_raw: list[tuple[datetime, float]] = []
-    bp_points_raw: list[tuple[datetime, int, int, Optional[int]]] = []
+    # same figure proportions as the raster path (8.27 x 4.8 and 8.27 x 6.0 in), top-aligned
+    with stage("plot"):
+        if len(sugar):
+            _page_header(c, h, title, captions[0])
+            chart_h = chart_w * 4.8 / 8.27
+            draw_sugar_chart(c, sugar, 40, h - 85 - chart_h, chart_w, chart_h, title="Глюкоза (mmol/L)")
+            c.showPage()
+        if len(bp):
+            _page_header(c, h, title, captions[1])
+            chart_h = chart_w * 6.0 / 8.27
+            draw_bp_chart(c, bp, 40, h - 85 - chart_h, chart_w, chart_h, title="Давление (mmHg) и пульс (bpm)")
+            c.showPage()
+    with stage("pdf"):
+        c.save()
 
-    for r in rows:
-        dt = dtparser.isoparse(r["measured_at_utc"]).astimezone(timezone.utc)
-        if r["kind"] == "sugar" and r["sugar_value"] is not None:
-            sugar_points_raw.append((dt, float(Decimal(r["sugar_value"]))))
-        elif r["kind"] == "bp" and r["sys"] is not None and r["dia"] is not None:
-            bp_points_raw.append((dt, int(r["sys"]), int(r["dia"]), int(r["pulse"]) if r["pulse"] is not None else None))
+def build_report_pdf_from_columns(
+    *,
+    cols: MeasurementColumns,
+    user_id: int,
+    data_dir: str,
+    days: Optional[int],
+    style: str = "vector",
+    max_points: int = 0,
+) -> str:
+    """Pure sync function: columns already fetched. Heavy plotting/PDF happens here."""
+    period_label = "all" if days is None else f"{days}d"
+    with stage("aggregate"):
+        sugar, bp = _series_from_columns(cols, days)
+    return _render_report(
+        sugar, bp, user_id=user_id, data_dir=data_dir, period_label=period_label, style=style, max_points=max_points,
+    )
+
+def _series_from_columns(cols: MeasurementColumns, days: Optional[int]) -> tuple[SugarSeries, BPSeries]:
+    is_sugar = cols.is_sugar & (cols.sugar_cmmol >= 0)
+    is_bp = ~cols.is_sugar & (cols.sys >= 0) & (cols.dia >= 0)
+    sugar_ts = cols.ts_ms[is_sugar]
+    sugar_val = cols.sugar_cmmol[is_sugar] / SUGAR_SCALE
+    bp_ts = cols.ts_ms[is_bp]
+    sys_ = cols.sys[is_bp].astype(np.float64)
+    dia = cols.dia[is_bp].astype(np.float64)
+    pulse = cols.pulse[is_bp]
 
     if days is None:
-        sugar_agg = _aggregate_daily([(dt, v) for dt, v in sugar_points_raw])
-        sugar_points = [SugarPoint(dt=dt, value=Decimal(str(v))) for dt, v in sugar_agg]
-
-        sys_agg = _aggregate_daily([(dt, float(sys)) for dt, sys, _, _ in bp_points_raw])
-        dia_agg = _aggregate_daily([(dt, float(dia)) for dt, _, dia, _ in bp_points_raw])
-        pulse_agg = _aggregate_daily([(dt, float(p)) for dt, _, _, p in bp_points_raw if p is not None])
-
-        sys_map = {dt.date().isoformat(): int(round(v)) for dt, v in sys_agg}
-        dia_map = {dt.date().isoformat(): int(round(v)) for dt, v in dia_agg}
-        pulse_map = {dt.date().isoformat(): int(round(v)) for dt, v in pulse_agg}
-
-        days_sorted = sorted(set(sys_map.keys()) | set(dia_map.keys()))
-        bp_points = []
-        for day in days_sorted:
-            if day in sys_map and day in dia_map:
-                dt = datetime.fromisoformat(day).replace(tzinfo=timezone.utc)
-                bp_points.append(BPPoint(dt=dt, sys=sys_map[day], dia=dia_map[day], pulse=pulse_map.get(day)))
+        sugar = SugarSeries(*_aggregate_daily(sugar_ts, sugar_val))
+
+        days_ms, sys_med = _aggregate_daily(bp_ts, sys_)
+        _, dia_med = _aggregate_daily(bp_ts, dia)
+        has_pulse = pulse >= 0
+        pulse_days, pulse_med = _aggregate_daily(bp_ts[has_pulse], pulse[has_pulse])
+        pulse_by_day = np.full(len(days_ms), np.nan)
+        pulse_by_day[np.searchsorted(days_ms, pulse_days)] = np.round(pulse_med)
+        bp = BPSeries(days_ms, np.round(sys_med), np.round(dia_med), pulse_by_day)
     else:
-        sugar_points = [SugarPoint(dt=dt, value=Decimal(str(v))) for dt, v in sugar_points_raw]
-        bp_points = [BPPoint(dt=dt, sys=sys, dia=dia, pulse=pulse) for dt, sys, dia, pulse in bp_points_raw]
+        sugar = SugarSeries(sugar_ts, sugar_val)
+        bp = BPSeries(bp_ts, sys_, dia, np.where(pulse >= 0, pulse, np.nan))
+    return sugar, bp
 
-    pages: list[tuple[str, bytes]] = []
+def build_report_pdf_from_rollup(
+    *, rollup: list[dict], user_id: int, data_dir: str, style: str = "vector", max_points: int = 0,
+) -> str:
+    """All-time report from repo.get_daily_rollup rows: one point per day, no raw rows needed."""
+    with stage("aggregate"):
+        sugar, bp = _series_from_rollup(rollup)
+    return _render_report(
+        sugar, bp, user_id=user_id, data_dir=data_dir, period_label="all", style=style, max_points=max_points,
+    )
 
-    if sugar_points:
-        fig = sugar_figure(sugar_points, title="Глюкоза (mmol/L)")
-        pages.append(("Глюкоза", fig_to_png_bytes(fig)))
+def _series_from_rollup(rollup: list[dict]) -> tuple[SugarSeries, BPSeries]:
+    day_ms = np.array(
+        [int(datetime.fromisoformat(r["day"]).replace(tzinfo=timezone.utc).timestamp()) * 1000 for r in rollup],
+        dtype=np.int64,
+    )
+    has_sugar = np.array([bool(r["sugar_count"]) for r in rollup], dtype=bool)
+    has_bp = np.array([bool(r["bp_count"]) for r in rollup], dtype=bool)
 
-    if bp_points:
-        fig = bp_figure(bp_points, title="Давление (mmHg) и пульс (bpm)")
-        pages.append(("Давление", fig_to_png_bytes(fig)))
+    def col(name: str) -> np.ndarray:
+        return np.array([np.nan if r[name] is None else r[name] for r in rollup], dtype=np.float64)
 
+    sugar = SugarSeries(day_ms[has_sugar], col("sugar_median")[has_sugar])
+    bp = BPSeries(
+        day_ms[has_bp],
+        np.round(col("sys_median")[has_bp]),
+        np.round(col("dia_median")[has_bp]),
+        np.round(col("pulse_median")[has_bp]),
+    )
+    return sugar, bp
+
+def _caption(name: str, shown: int, total: int) -> str:
+    return name if shown == total else f"{name} — точек на графике: {shown} из {total} (минимумы и максимумы сохранены)"
+
+def _render_report(
+    sugar: SugarSeries,
+    bp: BPSeries,
+    *,
+    user_id: int,
+    data_dir: str,
+    period_label: str,
+    style: str,
+    max_points: int,
+) -> str:
     out_path = os.path.join(data_dir, "reports", f"report_{user_id}_{period_label}.pdf")
+    title = f"HealthBot report ({period_label})"
 
-    if not pages:
-        os.makedirs(os.path.dirname(out_path), exist_ok=True)
-        c = canvas.Canvas(out_path, pagesize=A4)
-        w, h = A4
-        c.setFont("Helvetica-Bold", 14)
-        c.drawString(40, h - 60, "Отчёт")
-        c.setFont("Helvetica", 12)
-        c.drawString(40, h - 90, "Нет данных за выбранный период.")
-        c.save()
+    if not len(sugar) and not len(bp):
+        with stage("pdf"):
+            _build_empty_pdf(out_path)
         return out_path
 
-    title = f"HealthBot report ({period_label})"
-    _build_pdf(out_path, pages, title=title)
+    # a page has room for a few hundred x positions; extra points only cost time and bytes
+    sugar_total, bp_total = len(sugar), len(bp)
+    with stage("downsample"):
+        sugar = downsample_sugar(sugar, max_points)
+        bp = downsample_bp(bp, max_points)
+    captions = (_caption("Глюкоза", len(sugar), sugar_total), _caption("Давление", len(bp), bp_total))
+
+    # "vector": charts drawn as PDF paths (pdf_charts); "raster": matplotlib PNGs embedded in the page
+    if style == "vector":
+        _build_vector_pdf(out_path, sugar, bp, title=title, captions=captions)
+        return out_path
+
+    from app.services.plotting import sugar_figure, bp_figure, fig_to_png_bytes
+
+    pages: list[tuple[str, bytes]] = []
+
+    if len(sugar):
+        with stage("plot"):
+            fig = sugar_figure(sugar, title="Глюкоза (mmol/L)")
+        with stage("encode"):
+            pages.append((captions[0], fig_to_png_bytes(fig)))
+
+    if len(bp):
+        with stage("plot"):
+            fig = bp_figure(bp, title="Давление (mmHg) и пульс (bpm)")
+        with stage("encode"):
+            pages.append((captions[1], fig_to_png_bytes(fig)))
+
+    with stage("pdf"):
+        _build_pdf(out_path, pages, title=title)
     return out_path
+
+def _build_empty_pdf(out_path: str) -> None:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+    from app.services.pdf_charts import chart_font
+
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    c = canvas.Canvas(out_path, pagesize=A4)
+    w, h = A4
+    c.setFont(chart_font(), 14)
+    c.drawString(40, h - 60, "Отчёт")
+    c.setFont(chart_font(), 12)
+    c.drawString(40, h - 90, "Нет данных за выбранный период.")
+    c.save()
+
+def report_cache_key(
+    user_id: int,
+    period: str,
+    watermark: Optional[tuple[int, str]],
+    user_tz: str,
+    style: str = "vector",
+    max_points: int = 0,
+) -> str:
+    """Content address of a report: same inputs -> same PDF.
+
+    Windowed periods (7/30 days) slide with time, so they also carry the user's
+    local date and are re-rendered at most once a day without new data.
+    """
+    parts = [str(user_id), period, repr(watermark), user_tz, str(RENDERER_VERSION), style, str(max_points)]
+    if period != "all":
+        parts.append(datetime.now(get_zone(user_tz)).date().isoformat())
+    return hashlib.sha256("|".join(parts).encode()).hexdigest()
+
+@dataclass
+class CachedReport:
+    user_id: int
+    path: str
+    size: int
+    file_id: Optional[str] = None
+
+class ReportCache:
+    """LRU of rendered PDFs on disk, bounded by entry count and total bytes.
+
+    Files are named '{user_id}_{key}.pdf' so the index can be rebuilt after a
+    restart; Telegram file_ids are kept in memory only.
+    """
+
+    def __init__(self, cache_dir: str, max_entries: int, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, CachedReport] = OrderedDict()
+        self._bytes = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load()
+
+    def _load(self) -> None:
+        found = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".pdf") or "_" not in name:
+                continue
+            user_part, key = name[:-4].split("_", 1)
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+                user_id = int(user_part)
+            except (OSError, ValueError):
+                continue
+            found.append((st.st_mtime, key, CachedReport(user_id=user_id, path=path, size=st.st_size)))
+        for _, key, entry in sorted(found, key=lambda t: t[0]):
+            self._entries[key] = entry
+            self._bytes += entry.size
+        self._evict()
+
+    def get(self, key: str) -> Optional[CachedReport]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if not os.path.exists(entry.path):
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, user_id: int, src_path: str) -> CachedReport:
+        """Move a freshly rendered PDF into the cache."""
+        path = os.path.join(self.cache_dir, f"{user_id}_{key}.pdf")
+        os.replace(src_path, path)
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key).size
+        entry = CachedReport(user_id=user_id, path=path, size=os.path.getsize(path))
+        self._entries[key] = entry
+        self._bytes += entry.size
+        self._evict(keep=key)
+        return entry
+
+    def set_file_id(self, key: str, file_id: str) -> None:
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.file_id = file_id
+
+    def invalidate_user(self, user_id: int) -> None:
+        for key in [k for k, e in self._entries.items() if e.user_id == user_id]:
+            self._drop(key)
+
+    def on_repo_event(self, event: str, user_id: int) -> None:
+        if event == EVENT_MEASUREMENTS:
+            self.invalidate_user(user_id)
+
+    def stats(self) -> dict[str, int]:
+        return {"entries": len(self._entries), "bytes": self._bytes}
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            key = next(iter(self._entries))
+            if key == keep:
+                break
+            self._drop(key)
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry.size
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            log.warning("Failed to remove cached report %s", entry.path)
@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextvars import ContextVar
+from typing import Any, Optional
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+from aiogram.methods import Response, TelegramMethod
+
+log = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+# reminder waves set PRIORITY_BULK for their task; handler replies keep the default
+send_priority: ContextVar[int] = ContextVar("send_priority", default=PRIORITY_INTERACTIVE)
+
+# calls that create a message: a 5xx or timeout may come after Telegram delivered it, so a retry could duplicate it
+NON_IDEMPOTENT_PREFIXES = ("send", "forward", "copy")
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "stamp")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = time.monotonic()
+
+    def delay(self) -> float:
+        """Seconds until a token is available (0 if one is available now)."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def reserve(self) -> float:
+        """Take a token now, possibly going into debt; returns how long to wait before using it."""
+        wait = self.delay()
+        self.tokens -= 1
+        return wait
+
+    def idle(self) -> bool:
+        return self.delay() == 0 and self.tokens >= self.burst
+
+class PriorityGate:
+    """Global token bucket handing out tokens to waiters in (priority, arrival) order."""
+
+    def __init__(self, rate: float, burst: float):
+        self.bucket = TokenBucket(rate, burst)
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._pump: Optional[asyncio.Task] = None
+        self._paused_until = 0.0
+
+    async def acquire(self, priority: int) -> None:
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.create_task(self._run())
+        await fut
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def _run(self) -> None:
+        while self._waiters:
+            delay = max(self.bucket.delay(), self._paused_until - time.monotonic())
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            _, _, fut = heapq.heappop(self._waiters)
+            if fut.done():  # caller was cancelled
+                continue
+            self.bucket.tokens -= 1
+            fut.set_result(None)
+
+class OutboundSender(BaseRequestMiddleware):
+    """Session middleware that paces every chat-bound Bot API call.
+
+    A global bucket (Bot API: ~30 msg/s) is shared with priority, so a reminder
+    wave queues behind interactive replies; a per-chat bucket keeps a single
+    chat under ~1 msg/s. Flood control (RetryAfter) pauses the whole gate for
+    retry_after and the call is retried: bulk sends retry for as long as it
+    takes, so a wave slows down instead of dropping reminders; interactive ones
+    give up after max_retries. Network and server errors are retried with
+    backoff, but only for calls that cannot create a duplicate message. Calls
+    without a chat_id (getUpdates, answerCallbackQuery) pass straight through.
+    """
+
+    def __init__(
+        self,
+        rate: float = 30.0,
+        chat_rate: float = 1.0,
+        chat_burst: float = 3.0,
+        concurrency: int = 32,
+        max_retries: int = 5,
+        max_chats: int = 10_000,
+    ):
+        self.gate = PriorityGate(rate, burst=rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+        self._chats: dict[Any, TokenBucket] = {}
+        self._sem = asyncio.Semaphore(max(1, concurrency))
+        self._in_flight = 0
+        self._sent = 0
+        self._retried = 0
+        self._failed = 0
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: Bot,
+        method: TelegramMethod,
+    ) -> Response:
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return await make_request(bot, method)
+
+        priority = send_priority.get()
+        # a 5xx or a timeout may come after Telegram delivered the message: only retry calls that cannot duplicate it
+        retry_errors = not method.__api_method__.startswith(NON_IDEMPOTENT_PREFIXES)
+        attempt = 0  # failed attempts that count against max_retries
+        while True:
+            backoff = 0.0
+            await self._chat_wait(chat_id)
+            await self.gate.acquire(priority)
+            async with self._sem:
+                self._in_flight += 1
+                try:
+                    response = await make_request(bot, method)
+                except TelegramRetryAfter as e:
+                    # flood control always ends; a reminder must wait it out, not be dropped
+                    if priority != PRIORITY_BULK:
+                        if attempt == self.max_retries:
+                            self._failed += 1
+                            raise
+                        attempt += 1
+                    self._retried += 1
+                    log.warning("Flood control on %s: retry in %ss", type(method).__name__, e.retry_after)
+                    # the limit is bot-wide, so hold every queued send, not just this one
+                    self.gate.pause(e.retry_after)
+                    continue
+                except (TelegramNetworkError, TelegramServerError):
+                    if attempt == self.max_retries or not retry_errors:
+                        self._failed += 1
+                        raise
+                    self._retried += 1
+                    backoff = min(2 ** attempt, 30)
+                    attempt += 1
+                else:
+                    self._sent += 1
+                    return response
+                finally:
+                    self._in_flight -= 1
+            # back off outside the semaphore, so a retrying call does not hold a concurrency slot
+            await asyncio.sleep(backoff)
+
+    async def _chat_wait(self, chat_id: Any) -> None:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self.max_chats:
+                self._prune()
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        wait = bucket.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def _prune(self) -> None:
+        for chat_id in [c for c, b in self._chats.items() if b.idle()]:
+            del self._chats[chat_id]
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "waiting": self.gate.waiting(),
+            "in_flight": self._in_flight,
+            "sent": self._sent,
+            "retried": self._retried,
+            "failed": self._failed,
+            "chats_tracked": len(self._chats),
+        }
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import os
+import socket
 from dataclasses import dataclass
 
 @dataclass(frozen=True)
@@ -9,6 +10,47 @@ class Settings:
     data_dir: str
     default_timezone: str
     log_level: str
+    report_workers: int
+    report_queue_size: int
+    report_cache_max_entries: int
+    report_cache_max_mb: int
+    report_raster_kinds: frozenset[str]
+    report_max_points: int
+    import_max_lines: int
+    pregen_active_days: int
+    pregen_local_hour: int
+    pregen_concurrency: int
+    pregen_cpu_budget_s: float
+    ingest_max_batch: int
+    ingest_max_delay_ms: float
+    db_readers: int
+    send_rate: float
+    send_chat_rate: float
+    send_concurrency: int
+    reminder_log_retention_days: int
+    fsm_cache_max_entries: int
+    fsm_cache_ttl_s: float
+    fsm_idle_days: int
+    profile_cache_max_entries: int
+    bot_mode: str
+    bot_api_url: str
+    webhook_url: str
+    webhook_path: str
+    webhook_host: str
+    webhook_port: int
+    webhook_secret: str
+    webhook_max_concurrency: int
+    webhook_max_body_kb: int
+    instance_id: str
+    reminder_shards: int
+    lease_ttl_s: float
+    lease_heartbeat_s: float
+    reminder_resync_s: float
+    profile_cache_ttl_s: float
+    metrics_host: str
+    metrics_port: int
+    admin_ids: frozenset[int]
+    slow_update_ms: float
 
 def load_settings() -> Settings:
     bot_token = os.environ.get("BOT_TOKEN", "").strip()
@@ -17,9 +59,105 @@ def load_settings() -> Settings:
     data_dir = os.environ.get("DATA_DIR", "/data").strip() or "/data"
     default_timezone = os.environ.get("DEFAULT_TIMEZONE", "Europe/Moscow").strip() or "Europe/Moscow"
     log_level = os.environ.get("LOG_LEVEL", "INFO").strip() or "INFO"
+    report_workers = int(os.environ.get("REPORT_WORKERS", "").strip() or min(4, os.cpu_count() or 1))
+    report_queue_size = int(os.environ.get("REPORT_QUEUE_SIZE", "100").strip() or "100")
+    report_cache_max_entries = int(os.environ.get("REPORT_CACHE_MAX_ENTRIES", "2000").strip() or "2000")
+    report_cache_max_mb = int(os.environ.get("REPORT_CACHE_MAX_MB", "500").strip() or "500")
+    # report kinds (7, 30, all) rendered as matplotlib PNGs instead of vector charts
+    report_raster_kinds = frozenset(x.strip() for x in os.environ.get("REPORT_RASTER_KINDS", "").split(",") if x.strip())
+    if not report_raster_kinds <= {"7", "30", "all"}:
+        raise RuntimeError("REPORT_RASTER_KINDS may only list 7, 30, all")
+    # per chart; longer series keep each time bucket's min and max (0 = plot every point)
+    report_max_points = int(os.environ.get("REPORT_MAX_POINTS", "600").strip() or "600")
+    if 0 < report_max_points < 20:
+        raise RuntimeError("REPORT_MAX_POINTS must be 0 or at least 20")
+    import_max_lines = int(os.environ.get("IMPORT_MAX_LINES", "50000").strip() or "50000")
+    pregen_active_days = int(os.environ.get("PREGEN_ACTIVE_DAYS", "14").strip() or "14")
+    pregen_local_hour = int(os.environ.get("PREGEN_LOCAL_HOUR", "4").strip() or "4")
+    if not 0 <= pregen_local_hour <= 23:
+        raise RuntimeError("PREGEN_LOCAL_HOUR must be between 0 and 23")
+    pregen_concurrency = int(os.environ.get("PREGEN_CONCURRENCY", "1").strip() or "1")
+    pregen_cpu_budget_s = float(os.environ.get("PREGEN_CPU_BUDGET_S", "600").strip() or "600")
+    ingest_max_batch = int(os.environ.get("INGEST_MAX_BATCH", "64").strip() or "64")
+    ingest_max_delay_ms = float(os.environ.get("INGEST_MAX_DELAY_MS", "5").strip() or "5")
+    db_readers = int(os.environ.get("DB_READERS", "4").strip() or "4")
+    send_rate = float(os.environ.get("SEND_RATE", "30").strip() or "30")
+    send_chat_rate = float(os.environ.get("SEND_CHAT_RATE", "1").strip() or "1")
+    send_concurrency = int(os.environ.get("SEND_CONCURRENCY", "32").strip() or "32")
+    reminder_log_retention_days = int(os.environ.get("REMINDER_LOG_RETENTION_DAYS", "7").strip() or "7")
+    fsm_cache_max_entries = int(os.environ.get("FSM_CACHE_MAX_ENTRIES", "10000").strip() or "10000")
+    fsm_cache_ttl_s = float(os.environ.get("FSM_CACHE_TTL_S", "1800").strip() or "1800")
+    fsm_idle_days = int(os.environ.get("FSM_IDLE_DAYS", "7").strip() or "7")
+    profile_cache_max_entries = int(os.environ.get("PROFILE_CACHE_MAX_ENTRIES", "50000").strip() or "50000")
+    bot_mode = (os.environ.get("BOT_MODE", "polling").strip() or "polling").lower()
+    if bot_mode not in ("polling", "webhook"):
+        raise RuntimeError("BOT_MODE must be 'polling' or 'webhook'")
+    bot_api_url = os.environ.get("BOT_API_URL", "").strip()
+    webhook_url = os.environ.get("WEBHOOK_URL", "").strip()
+    if bot_mode == "webhook" and not webhook_url:
+        raise RuntimeError("WEBHOOK_URL is required in webhook mode")
+    webhook_path = os.environ.get("WEBHOOK_PATH", "/webhook").strip() or "/webhook"
+    webhook_host = os.environ.get("WEBHOOK_HOST", "0.0.0.0").strip() or "0.0.0.0"
+    webhook_port = int(os.environ.get("WEBHOOK_PORT", "8080").strip() or "8080")
+    webhook_secret = os.environ.get("WEBHOOK_SECRET", "").strip()
+    webhook_max_concurrency = int(os.environ.get("WEBHOOK_MAX_CONCURRENCY", "100").strip() or "100")
+    webhook_max_body_kb = int(os.environ.get("WEBHOOK_MAX_BODY_KB", "1024").strip() or "1024")
+    instance_id = os.environ.get("INSTANCE_ID", "").strip() or f"{socket.gethostname()}-{os.getpid()}"
+    reminder_shards = int(os.environ.get("REMINDER_SHARDS", "0").strip() or "0")
+    lease_ttl_s = float(os.environ.get("LEASE_TTL_S", "30").strip() or "30")
+    lease_heartbeat_s = float(os.environ.get("LEASE_HEARTBEAT_S", "10").strip() or "10")
+    if reminder_shards and lease_heartbeat_s * 2 > lease_ttl_s:
+        raise RuntimeError("LEASE_TTL_S must be at least twice LEASE_HEARTBEAT_S")
+    reminder_resync_s = float(os.environ.get("REMINDER_RESYNC_S", "60").strip() or "60")
+    profile_cache_ttl_s = float(os.environ.get("PROFILE_CACHE_TTL_S", "0").strip() or "0")
+    metrics_host = os.environ.get("METRICS_HOST", "127.0.0.1").strip() or "127.0.0.1"
+    metrics_port = int(os.environ.get("METRICS_PORT", "0").strip() or "0")
+    admin_ids = frozenset(int(x) for x in os.environ.get("ADMIN_IDS", "").split(",") if x.strip())
+    slow_update_ms = float(os.environ.get("SLOW_UPDATE_MS", "2000").strip() or "2000")
     return Settings(
         bot_token=bot_token,
         data_dir=data_dir,
         default_timezone=default_timezone,
         log_level=log_level,
+        report_workers=report_workers,
+        report_queue_size=report_queue_size,
+        report_cache_max_entries=report_cache_max_entries,
+        report_cache_max_mb=report_cache_max_mb,
+        report_raster_kinds=report_raster_kinds,
+        report_max_points=report_max_points,
+        import_max_lines=import_max_lines,
+        pregen_active_days=pregen_active_days,
+        pregen_local_hour=pregen_local_hour,
+        pregen_concurrency=pregen_concurrency,
+        pregen_cpu_budget_s=pregen_cpu_budget_s,
+        ingest_max_batch=ingest_max_batch,
+        ingest_max_delay_ms=ingest_max_delay_ms,
+        db_readers=db_readers,
+        send_rate=send_rate,
+        send_chat_rate=send_chat_rate,
+        send_concurrency=send_concurrency,
+        reminder_log_retention_days=reminder_log_retention_days,
+        fsm_cache_max_entries=fsm_cache_max_entries,
+        fsm_cache_ttl_s=fsm_cache_ttl_s,
+        fsm_idle_days=fsm_idle_days,
+        profile_cache_max_entries=profile_cache_max_entries,
+        bot_mode=bot_mode,
+        bot_api_url=bot_api_url,
+        webhook_url=webhook_url,
+        webhook_path=webhook_path,
+        webhook_host=webhook_host,
+        webhook_port=webhook_port,
+        webhook_secret=webhook_secret,
+        webhook_max_concurrency=webhook_max_concurrency,
+        webhook_max_body_kb=webhook_max_body_kb,
+        instance_id=instance_id,
+        reminder_shards=reminder_shards,
+        lease_ttl_s=lease_ttl_s,
+        lease_heartbeat_s=lease_heartbeat_s,
+        reminder_resync_s=reminder_resync_s,
+        profile_cache_ttl_s=profile_cache_ttl_s,
+        metrics_host=metrics_host,
+        metrics_port=metrics_port,
+        admin_ids=admin_ids,
+        slow_update_ms=slow_update_ms,
     )
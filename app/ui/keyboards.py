@@ -10,6 +10,8 @@ def kb_main() -> InlineKeyboardMarkup:
         [InlineKeyboardButton(text="📄 Отчёт (7 дней)", callback_data="menu:report:7")],
         [InlineKeyboardButton(text="📄 Отчёт (30 дней)", callback_data="menu:report:30")],
         [InlineKeyboardButton(text="📄 Отчёт (всё время)", callback_data="menu:report:all")],
+        [InlineKeyboardButton(text="📤 Экспорт данных", callback_data="menu:export")],
+        [InlineKeyboardButton(text="📥 Импорт истории", callback_data="menu:import")],
         [InlineKeyboardButton(text="⏰ Напоминания", callback_data="menu:reminders")],
         [InlineKeyboardButton(text="🌍 Часовой пояс", callback_data="menu:tz")],
         [InlineKeyboardButton(text="🛑 Отключить напоминания", callback_data="menu:stop")],
@@ -43,3 +45,10 @@ def kb_slots(selected: set[str]) -> InlineKeyboardMarkup:
     rows.append([InlineKeyboardButton(text="💾 Сохранить", callback_data="slot:save")])
     rows.append([InlineKeyboardButton(text="⬅️ В меню", callback_data="menu:main")])
     return InlineKeyboardMarkup(inline_keyboard=rows)
+
+def kb_export_format() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="CSV", callback_data="export:csv")],
+        [InlineKeyboardButton(text="JSONL", callback_data="export:jsonl")],
+        [InlineKeyboardButton(text="⬅️ В меню", callback_data="menu:main")],
+    ])
@@ -6,7 +6,20 @@ START_TEXT = (
 HELP_TEXT = (
     "Команды:\n"
     "/start — меню\n"
-    "/help — помощь\n\n"
+    "/help — помощь\n"
+    "/export — выгрузка всех данных (CSV/JSONL)\n"
+    "/import — загрузка истории из текста или CSV\n\n"
     "Ввод сахара: 5.6 или 5,6\n"
     "Ввод давления: 120 80 60 или 120/80 или 120:80:60\n"
 )
+
+IMPORT_TEXT = (
+    "📥 Импорт истории.\n\n"
+    "Вставь записи сообщением (по одной на строку) или пришли файл .csv/.txt.\n"
+    "Время — местное, в твоём часовом поясе:\n"
+    "2024-03-05 08:30 5.6\n"
+    "05.03.2024 21:10 135/85 72\n"
+    "05.03.2024 21:10 6,1 135/85/72 — сахар и давление\n\n"
+    "CSV: с заголовком date,time,sugar,sys,dia,pulse (или дата;время;сахар;сад;дад;пульс) "
+    "либо файл из /export. Записи, которые уже есть в журнале, не дублируются.\n"
+)
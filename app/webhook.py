@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import asyncio
+import hmac
+import logging
+import signal
+from typing import Any
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+log = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+class WebhookIngress:
+    """aiohttp endpoint that acks each update immediately and handles it in a background task.
+
+    At most max_concurrency handler tasks run at once; when all are busy the
+    request is answered 503 straight away and Telegram redelivers the update
+    later, so the bot pushes back instead of piling up tasks or holding acks.
+    """
+
+    def __init__(self, bot: Bot, dp: Dispatcher, *, path: str, secret: str = "", max_concurrency: int = 100, **workflow_data: Any):
+        self.bot = bot
+        self.dp = dp
+        self.path = path
+        self.secret = secret
+        self.max_concurrency = max(1, max_concurrency)
+        self.workflow_data = workflow_data
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._tasks: set[asyncio.Task] = set()
+        self._handled = 0
+        self._rejected = 0
+        self._busy = 0
+
+    def setup(self, app: web.Application) -> None:
+        app.router.add_post(self.path, self.handle)
+        app.router.add_get("/healthz", self.health)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.secret and not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), self.secret):
+            self._rejected += 1
+            return web.Response(status=401)
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except web.HTTPRequestEntityTooLarge:
+            self._rejected += 1
+            raise
+        except Exception:
+            self._rejected += 1
+            log.warning("Malformed webhook update", exc_info=True)
+            return web.Response(status=400)
+        if self._slots.locked():
+            self._busy += 1
+            return web.Response(status=503, headers={"Retry-After": "1"})
+        await self._slots.acquire()  # free slot: returns without waiting
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response()
+
+    async def health(self, request: web.Request) -> web.Response:
+        return web.Response(text="ok")
+
+    async def _process(self, update: Update) -> None:
+        try:
+            await self.dp.feed_update(self.bot, update, **self.workflow_data)
+        except Exception:
+            log.exception("Update %s failed", update.update_id)
+        finally:
+            self._handled += 1
+            self._slots.release()
+
+    async def drain(self, timeout: float = 10.0) -> None:
+        """Wait for in-flight handlers (e.g. on shutdown)."""
+        if self._tasks:
+            await asyncio.wait(set(self._tasks), timeout=timeout)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "in_flight": len(self._tasks),
+            "max_concurrency": self.max_concurrency,
+            "handled": self._handled,
+            "rejected": self._rejected,
+            "busy": self._busy,
+        }
+
+async def run_webhook(
+    bot: Bot,
+    dp: Dispatcher,
+    *,
+    base_url: str,
+    path: str,
+    host: str,
+    port: int,
+    secret: str = "",
+    max_concurrency: int = 100,
+    max_body_bytes: int = 1024 * 1024,
+) -> None:
+    """Serve updates over a webhook until cancelled; mirrors dp.start_polling's lifecycle."""
+    workflow_data = {"dispatcher": dp, "bots": [bot], **dp.workflow_data}
+    # the same handler kwargs as polling passes to feed_update
+    ingress = WebhookIngress(bot, dp, path=path, secret=secret, max_concurrency=max_concurrency, **workflow_data)
+    bot["webhook"] = ingress
+
+    # oversized bodies are refused with 413 by aiohttp before they are read
+    app = web.Application(client_max_size=max_body_bytes)
+    ingress.setup(app)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+
+    await dp.emit_startup(bot=bot, **workflow_data)
+    await bot.set_webhook(
+        url=base_url.rstrip("/") + path,
+        secret_token=secret or None,
+        allowed_updates=dp.resolve_used_update_types(),
+        max_connections=min(max_concurrency, 100),
+    )
+    log.info("Webhook listening on %s:%s%s", host, port, path)
+    # like start_polling: SIGINT/SIGTERM (docker stop) end the loop gracefully
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.remove_signal_handler(sig)
+        await runner.cleanup()
+        await ingress.drain()
+        await dp.emit_shutdown(bot=bot, **workflow_data)
+        await bot.session.close()
@@ -0,0 +1,463 @@
+"""End-to-end load test against a local fake Telegram Bot API.
+
+    python -m bench.loadtest [--users 1000] [--flows 5] [--mode polling|webhook] [--history-days 90]
+                             [--out results.json] [--max-p95-ms N] [--max-error-rate F]
+
+Starts a fake Bot API server, runs the real bot (`python -m app.main`) against
+it through BOT_API_URL and drives simulated users through the start, measure,
+reminders and report flows. Each step is timed from handing the update to the
+bot (getUpdates response or webhook POST) until the bot's final API call for
+it, so the numbers include dispatcher, FSM storage, database, render pool and
+outbound pacing. Prints JSON with per-step p50/p95/p99, throughput and error
+rate; exits 1 if the --max-* thresholds are exceeded.
+
+With --no-spawn only the fake API is started on --api-port; point an already
+running bot at it with BOT_API_URL (one instance or several) and BOT_MODE=polling.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+import aiohttp
+from aiohttp import web
+
+from app.ui.keyboards import SLOTS
+from app.ui.texts import START_TEXT
+
+TOKEN = "123456:LOADTEST"
+# outgoing texts that mean the step did not do what the user asked
+ERROR_PREFIXES = ("❌",)
+REJECT_PREFIXES = ("⏳",)
+
+@dataclass(frozen=True)
+class Step:
+    name: str
+    text: Optional[str] = None       # a message the user types
+    data: Optional[str] = None       # or a button the user presses
+    expect: str = "answerCallbackQuery"
+    prefix: Optional[str] = None     # expected text prefix of the final call
+
+def _flows(rnd: random.Random) -> dict[str, list[Step]]:
+    sugar = f"{rnd.uniform(4.0, 12.0):.1f}".replace(".", rnd.choice(".,"))
+    bp = f"{rnd.randint(100, 160)} {rnd.randint(60, 100)} {rnd.randint(55, 100)}"
+    a, b = rnd.sample(SLOTS, 2)
+    return {
+        "measure_sugar": [
+            Step("menu:measure", data="menu:measure"),
+            Step("m:sugar", data="m:sugar", expect="editMessageText"),
+            Step("sugar:input", text=sugar, expect="sendMessage", prefix="✅"),
+        ],
+        "measure_bp": [
+            Step("menu:measure", data="menu:measure"),
+            Step("m:bp", data="m:bp", expect="editMessageText"),
+            Step("bp:input", text=bp, expect="sendMessage", prefix="✅"),
+        ],
+        "measure_both": [
+            Step("menu:measure", data="menu:measure"),
+            Step("m:both", data="m:both", expect="editMessageText"),
+            Step("sugar:input", text=sugar, expect="sendMessage", prefix="✅"),
+            Step("bp:input", text=bp, expect="sendMessage", prefix="✅"),
+        ],
+        "reminders": [
+            Step("menu:reminders", data="menu:reminders"),
+            Step("slot:toggle", data=f"slot:{a}"),
+            Step("slot:toggle", data=f"slot:{b}"),
+            Step("slot:save", data="slot:save"),
+        ],
+        # the report flow ends with the "back to menu" message sent after the document
+        "report_7": [Step("report:7", data="menu:report:7", expect="sendMessage", prefix="⬅️")],
+        "report_30": [Step("report:30", data="menu:report:30", expect="sendMessage", prefix="⬅️")],
+        "report_all": [Step("report:all", data="menu:report:all", expect="sendMessage", prefix="⬅️")],
+    }
+
+FLOW_WEIGHTS = {
+    "measure_sugar": 30, "measure_bp": 25, "measure_both": 15, "reminders": 10,
+    "report_7": 10, "report_30": 6, "report_all": 4,
+}
+
+class FakeBotAPI:
+    """Just enough of the Bot API for the bot: long-polled getUpdates or webhook delivery, and replies.
+
+    Every chat-bound call is matched against the step the simulated user is
+    waiting for; everything else is answered and counted.
+    """
+
+    def __init__(self) -> None:
+        self.updates: asyncio.Queue[dict] = asyncio.Queue()
+        self.calls: Counter[str] = Counter()
+        self.webhook_url = ""
+        self.webhook_secret = ""
+        self.ready = asyncio.Event()
+        self._waiters: dict[int, tuple[Step, asyncio.Future]] = {}
+        self._callback_chats: dict[str, int] = {}
+        self._ids = itertools.count(1)
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        return app
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        if request.content_type == "application/json":
+            data = await request.json()
+        else:
+            data = {k: v for k, v in (await request.post()).items() if isinstance(v, str)}
+
+        if method == "getUpdates":
+            self.ready.set()
+            return self._ok(await self._get_updates(data))
+        if method == "setWebhook":
+            self.webhook_url = data.get("url", "")
+            self.webhook_secret = data.get("secret_token", "")
+            self.ready.set()
+            return self._ok(True)
+        if method == "getMe":
+            return self._ok({"id": 123456, "is_bot": True, "first_name": "HealthBot", "username": "healthbot"})
+        if method == "answerCallbackQuery":
+            self._match(self._callback_chats.pop(data.get("callback_query_id", ""), None), method, "")
+            return self._ok(True)
+        if "chat_id" not in data:
+            return self._ok(True)
+
+        chat_id = int(data["chat_id"])
+        text = data.get("text") or data.get("caption") or ""
+        self._match(chat_id, method, text)
+        if method == "editMessageReplyMarkup":
+            return self._ok(True)
+        result: dict[str, Any] = {
+            "message_id": next(self._ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+        }
+        if method == "sendDocument":
+            n = next(self._ids)
+            result["document"] = {"file_id": f"doc{n}", "file_unique_id": f"u{n}"}
+        elif text:
+            result["text"] = text
+        return self._ok(result)
+
+    @staticmethod
+    def _ok(result: Any) -> web.Response:
+        return web.json_response({"ok": True, "result": result})
+
+    async def _get_updates(self, data: dict) -> list[dict]:
+        limit = int(data.get("limit") or 100)
+        try:
+            first = await asyncio.wait_for(self.updates.get(), float(data.get("timeout") or 0) or 0.01)
+        except asyncio.TimeoutError:
+            return []
+        batch = [first]
+        while len(batch) < limit and not self.updates.empty():
+            batch.append(self.updates.get_nowait())
+        now = time.perf_counter()
+        for u in batch:
+            u.pop("_picked").set_result(now)
+        return [{k: v for k, v in u.items() if not k.startswith("_")} for u in batch]
+
+    def _match(self, chat_id: Optional[int], method: str, text: str) -> None:
+        waiter = self._waiters.get(chat_id) if chat_id is not None else None
+        if waiter is None:
+            return
+        step, fut = waiter
+        if text.startswith(ERROR_PREFIXES):
+            outcome = "error"
+        elif text.startswith(REJECT_PREFIXES):
+            outcome = "rejected"
+        elif method == step.expect and (step.prefix is None or text.startswith(step.prefix)):
+            outcome = "ok"
+        else:
+            return
+        del self._waiters[chat_id]
+        if not fut.done():
+            fut.set_result(outcome)
+
+    def expect(self, chat_id: int, step: Step) -> asyncio.Future:
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters[chat_id] = (step, fut)
+        return fut
+
+    def forget(self, chat_id: int) -> None:
+        self._waiters.pop(chat_id, None)
+
+    def make_update(self, user_id: int, step: Step, message_id: int) -> dict:
+        update_id = next(self._ids)
+        user = {"id": user_id, "is_bot": False, "first_name": f"user{user_id}", "language_code": "ru"}
+        chat = {"id": user_id, "type": "private", "first_name": user["first_name"]}
+        now = int(time.time())
+        if step.data is not None:
+            query_id = str(update_id)
+            self._callback_chats[query_id] = user_id
+            return {"update_id": update_id, "callback_query": {
+                "id": query_id, "from": user, "chat_instance": str(user_id), "data": step.data,
+                "message": {"message_id": message_id, "date": now, "chat": chat, "text": "…"},
+            }}
+        entities = [{"type": "bot_command", "offset": 0, "length": len(step.text)}] if step.text.startswith("/") else None
+        message = {"message_id": next(self._ids), "date": now, "chat": chat, "from": user, "text": step.text}
+        if entities:
+            message["entities"] = entities
+        return {"update_id": update_id, "message": message}
+
+class Harness:
+    def __init__(self, api: FakeBotAPI, args: argparse.Namespace):
+        self.api = api
+        self.args = args
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.outcomes: dict[str, Counter[str]] = defaultdict(Counter)
+        self._http: Optional[aiohttp.ClientSession] = None
+
+    async def deliver(self, update: dict) -> float:
+        """Hand one update to the bot; returns the perf_counter stamp it counts from."""
+        if self.args.mode == "webhook":
+            headers = {"X-Telegram-Bot-Api-Secret-Token": self.api.webhook_secret} if self.api.webhook_secret else {}
+            t0 = time.perf_counter()
+            while True:
+                async with self._http.post(self.api.webhook_url, json=update, headers=headers) as resp:
+                    if resp.status == 200:
+                        return t0
+                    if resp.status != 503:
+                        raise RuntimeError(f"webhook HTTP {resp.status}")
+                # all handler slots busy: redeliver, as Telegram does (sooner, so waits show up in latency)
+                await asyncio.sleep(0.05)
+        picked = update["_picked"] = asyncio.get_running_loop().create_future()
+        await self.api.updates.put(update)
+        # timed from when the bot's getUpdates picks it up, like Telegram handing it over
+        return await picked
+
+    async def run_step(self, user_id: int, step: Step, message_id: int) -> str:
+        update = self.api.make_update(user_id, step, message_id)
+        fut = self.api.expect(user_id, step)
+        try:
+            t0 = await self.deliver(update)
+            outcome = await asyncio.wait_for(fut, self.args.step_timeout)
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+        except Exception:
+            outcome = "error"
+        finally:
+            self.api.forget(user_id)
+        if outcome == "ok":
+            self.latencies[step.name].append(time.perf_counter() - t0)
+        self.outcomes[step.name][outcome] += 1
+        return outcome
+
+    async def user(self, user_id: int, start_delay: float) -> None:
+        rnd = random.Random(self.args.seed * 1_000_003 + user_id)
+        await asyncio.sleep(start_delay)
+        think = self.args.think_ms / 1000
+        message_id = next(self.api._ids)
+        await self.run_step(user_id, Step("start", text="/start", expect="sendMessage", prefix=START_TEXT[:12]), message_id)
+        names, weights = zip(*FLOW_WEIGHTS.items())
+        for _ in range(self.args.flows):
+            flow = _flows(rnd)[rnd.choices(names, weights)[0]]
+            for step in flow:
+                if think:
+                    await asyncio.sleep(rnd.uniform(0.5, 1.5) * think)
+                if await self.run_step(user_id, step, message_id) != "ok":
+                    break  # the rest of the flow assumes this step worked
+
+    async def run(self) -> float:
+        self._http = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.args.webhook_connections))
+        try:
+            t = time.perf_counter()
+            ramp = self.args.ramp_s
+            await asyncio.gather(*(
+                self.user(uid, ramp * i / self.args.users) for i, uid in enumerate(range(1, self.args.users + 1))
+            ))
+            return time.perf_counter() - t
+        finally:
+            await self._http.close()
+
+def _percentiles(samples: list[float]) -> dict[str, Any]:
+    if not samples:
+        return {"n": 0}
+    s = sorted(samples)
+    pick = lambda q: s[min(len(s) - 1, int(q * len(s)))] * 1000
+    return {
+        "n": len(s),
+        "p50_ms": round(pick(0.50), 2),
+        "p95_ms": round(pick(0.95), 2),
+        "p99_ms": round(pick(0.99), 2),
+        "max_ms": round(s[-1] * 1000, 2),
+    }
+
+def _bot_env(args: argparse.Namespace, api_url: str, data_dir: str) -> dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        "BOT_TOKEN": TOKEN,
+        "BOT_API_URL": api_url,
+        "DATA_DIR": data_dir,
+        "BOT_MODE": args.mode,
+        "LOG_LEVEL": env.get("LOG_LEVEL", "WARNING"),
+        "PYTHONUNBUFFERED": "1",
+    })
+    if not args.real_limits:
+        # measure the bot, not Telegram's flood limits
+        env.update({"SEND_RATE": "100000", "SEND_CHAT_RATE": "1000"})
+    if args.mode == "webhook":
+        env.update({
+            "WEBHOOK_URL": f"http://127.0.0.1:{args.webhook_port}",
+            "WEBHOOK_HOST": "127.0.0.1",
+            "WEBHOOK_PORT": str(args.webhook_port),
+            "WEBHOOK_SECRET": "loadtest",
+        })
+    return env
+
+async def _populate(data_dir: str, users: int, days: int) -> dict[str, int]:
+    from app.infra.db import Database
+    from bench.population import populate
+
+    db = Database(os.path.join(data_dir, "healthbot.sqlite3"), readers=1)
+    await db.open()
+    try:
+        return await populate(db, users, days)
+    finally:
+        await db.close()
+
+async def run(args: argparse.Namespace, work_dir: str) -> dict[str, Any]:
+    api = FakeBotAPI()
+    runner = web.AppRunner(api.app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", args.api_port)
+    await site.start()
+    port = runner.addresses[0][1]
+    api_url = f"http://127.0.0.1:{port}"
+
+    meta: dict[str, Any] = {}
+    proc = None
+    log_path = os.path.join(work_dir, "bot.log")
+    try:
+        if args.no_spawn:
+            print(f"Fake Bot API on {api_url}; start the bot with BOT_API_URL={api_url} BOT_TOKEN={TOKEN}", file=sys.stderr)
+        else:
+            data_dir = os.path.join(work_dir, "data")
+            os.makedirs(data_dir)
+            if args.history_days:
+                meta["population"] = await _populate(data_dir, args.users, args.history_days)
+            with open(log_path, "wb") as log_file:
+                proc = await asyncio.create_subprocess_exec(
+                    sys.executable, "-m", "app.main",
+                    env=_bot_env(args, api_url, data_dir), stdout=log_file, stderr=asyncio.subprocess.STDOUT,
+                )
+        t = time.perf_counter()
+        ready = asyncio.create_task(api.ready.wait())
+        waits = {ready} | ({asyncio.create_task(proc.wait())} if proc else set())
+        done, _ = await asyncio.wait(waits, timeout=args.startup_timeout, return_when=asyncio.FIRST_COMPLETED)
+        if ready not in done:
+            raise RuntimeError(f"bot did not start (see log below)\n{_tail(log_path)}")
+        meta["bot_ready_s"] = round(time.perf_counter() - t, 3)
+
+        harness = Harness(api, args)
+        elapsed = await harness.run()
+    finally:
+        if proc is not None and proc.returncode is None:
+            proc.terminate()
+            try:
+                await asyncio.wait_for(proc.wait(), 20)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+        await runner.cleanup()
+
+    steps = {}
+    total = Counter()
+    all_latencies: list[float] = []
+    for name in sorted(harness.outcomes):
+        outcomes = harness.outcomes[name]
+        total.update(outcomes)
+        all_latencies += harness.latencies[name]
+        steps[name] = {**_percentiles(harness.latencies[name]), "outcomes": dict(outcomes)}
+    n_steps = sum(total.values())
+    return {
+        "meta": meta,
+        "summary": {
+            "elapsed_s": round(elapsed, 3),
+            "steps": n_steps,
+            "steps_per_s": round(n_steps / elapsed, 2) if elapsed else None,
+            "error_rate": round((n_steps - total["ok"]) / n_steps, 5) if n_steps else 0.0,
+            "outcomes": dict(total),
+            "latency": _percentiles(all_latencies),
+        },
+        "steps": steps,
+        "api_calls": dict(api.calls),
+        "bot_log_tail": _tail(log_path, 20) if proc is not None and proc.returncode not in (0, -15) else "",
+    }
+
+def _tail(path: str, lines: int = 40) -> str:
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            return "".join(f.readlines()[-lines:])
+    except OSError:
+        return ""
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m bench.loadtest")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--flows", type=int, default=5, help="flows per user after /start")
+    parser.add_argument("--mode", choices=("polling", "webhook"), default="polling")
+    parser.add_argument("--think-ms", type=float, default=200, help="mean pause between a user's steps")
+    parser.add_argument("--ramp-s", type=float, default=10, help="spread user arrivals over this many seconds")
+    parser.add_argument("--history-days", type=int, default=0, help="pre-populate this many days of measurements per user")
+    parser.add_argument("--step-timeout", type=float, default=60)
+    parser.add_argument("--startup-timeout", type=float, default=60)
+    parser.add_argument("--real-limits", action="store_true", help="keep the bot's default outbound rate limits")
+    parser.add_argument("--api-port", type=int, default=0)
+    parser.add_argument("--webhook-port", type=int, default=8181)
+    parser.add_argument("--webhook-connections", type=int, default=100, help="parallel webhook POSTs, like max_connections")
+    parser.add_argument("--no-spawn", action="store_true", help="only run the fake API; the bot is started separately")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--dir", default=None, help="where to put the bot's temp data dir (default: system tmp)")
+    parser.add_argument("--out", default=None, help="write JSON here instead of stdout")
+    parser.add_argument("--max-p95-ms", type=float, default=None, help="fail if overall p95 latency is above this")
+    parser.add_argument("--max-error-rate", type=float, default=None, help="fail if the share of non-ok steps is above this")
+    args = parser.parse_args()
+    if args.no_spawn and not args.api_port:
+        parser.error("--no-spawn needs a fixed --api-port")
+
+    work_dir = tempfile.mkdtemp(prefix="healthbot-load-", dir=args.dir)
+    try:
+        report = asyncio.run(run(args, work_dir))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report["meta"].update({
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("out", "dir")},
+    })
+    failures = []
+    summary = report["summary"]
+    if args.max_p95_ms is not None and summary["latency"].get("p95_ms", 0) > args.max_p95_ms:
+        failures.append(f"p95 {summary['latency']['p95_ms']}ms > {args.max_p95_ms}ms")
+    if args.max_error_rate is not None and summary["error_rate"] > args.max_error_rate:
+        failures.append(f"error rate {summary['error_rate']} > {args.max_error_rate}")
+    report["failures"] = failures
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    for f in failures:
+        print(f"FAIL {f}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
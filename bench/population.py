@@ -0,0 +1,116 @@
+"""Synthetic population for benchmarks: N users x M days of measurements plus reminder slots.
+
+Rows are bulk-inserted straight into the schema (numeric columns included) and
+the daily rollup is rebuilt afterwards, so the database looks like one the bot
+has filled itself.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+from datetime import datetime, timezone
+
+from app.domain.units import MS_PER_DAY
+from app.infra import repo
+from app.infra.db import Database
+from app.ui.keyboards import SLOTS
+
+# spread across offsets, half-hour/45-minute zones and both DST hemispheres
+ZONES = (
+    "Europe/Moscow", "Europe/Prague", "Europe/London", "Europe/Tallinn", "America/New_York",
+    "America/Los_Angeles", "America/Sao_Paulo", "America/St_Johns", "Asia/Tokyo", "Asia/Kolkata",
+    "Asia/Kathmandu", "Asia/Tehran", "Australia/Sydney", "Pacific/Auckland", "Africa/Cairo", "UTC",
+)
+
+CHUNK = 5000
+
+async def populate(
+    db: Database,
+    users: int,
+    days: int,
+    per_day: int = 4,
+    slots_per_user: int = 3,
+    seed: int = 1,
+    end: datetime | None = None,
+) -> dict[str, int]:
+    """Fill db with users 1..users; returns row counts."""
+    rnd = random.Random(seed)
+    end = end or datetime.now(timezone.utc)
+    end_ms = int(end.timestamp() * 1000)
+    created = end.isoformat()
+    n_measurements = n_slots = 0
+
+    async with db.writer() as conn:
+        await conn.executemany(
+            "INSERT OR REPLACE INTO users(user_id, timezone) VALUES(?, ?)",
+            [(u, rnd.choice(ZONES)) for u in range(1, users + 1)],
+        )
+        slot_rows = [
+            (u, hm)
+            for u in range(1, users + 1)
+            for hm in rnd.sample(SLOTS, min(slots_per_user, len(SLOTS)))
+        ]
+        await conn.executemany(
+            "INSERT OR REPLACE INTO reminder_slots(user_id, time_hm, enabled) VALUES(?, ?, 1)", slot_rows
+        )
+        n_slots = len(slot_rows)
+
+        batch: list[tuple] = []
+        for u in range(1, users + 1):
+            for d in range(days):
+                day_start = end_ms - (d + 1) * MS_PER_DAY
+                for i in range(per_day):
+                    ms = day_start + rnd.randrange(MS_PER_DAY)
+                    iso = datetime.fromtimestamp(ms / 1000, timezone.utc).isoformat()
+                    if i % 2 == 0:
+                        cmmol = max(250, min(2500, int(rnd.gauss(650, 150))))
+                        batch.append((u, "sugar", f"{cmmol / 100:.2f}", cmmol, None, None, None, iso, ms, created))
+                    else:
+                        sys_ = rnd.randint(95, 170)
+                        dia = rnd.randint(55, min(110, sys_ - 20))
+                        pulse = rnd.randint(50, 110) if rnd.random() < 0.8 else None
+                        batch.append((u, "bp", None, None, sys_, dia, pulse, iso, ms, created))
+                    if len(batch) >= CHUNK:
+                        n_measurements += await _insert(conn, batch)
+        if batch:
+            n_measurements += await _insert(conn, batch)
+        await conn.commit()
+
+    if n_measurements:
+        await repo.rebuild_daily_rollup(db)
+    return {"users": users, "measurements": n_measurements, "slots": n_slots}
+
+async def _insert(conn, batch: list[tuple]) -> int:
+    await conn.executemany(
+        "INSERT INTO measurements(user_id, kind, sugar_value, sugar_cmmol, sys, dia, pulse, "
+        "measured_at_utc, measured_at_ms, created_at_utc) VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        batch,
+    )
+    n = len(batch)
+    batch.clear()
+    return n
+
+def main() -> None:
+    """python -m bench.population DB_PATH [--users N] [--days M]: build a standalone test database."""
+    parser = argparse.ArgumentParser(prog="python -m bench.population")
+    parser.add_argument("db_path")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--per-day", type=int, default=4)
+    parser.add_argument("--slots-per-user", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    async def run() -> None:
+        db = Database(args.db_path, readers=1)
+        await db.open()
+        try:
+            print(await populate(db, args.users, args.days, args.per_day, args.slots_per_user, args.seed))
+        finally:
+            await db.close()
+
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+"""Benchmark suite over a synthetic population.
+
+    python -m bench.run [--users 200] [--days 365] [--only NAME ...] [--out results.json]
+                        [--compare baseline.json] [--tolerance 0.25]
+
+Builds temporary SQLite databases with bench.population, times the hot paths
+and prints JSON. With --compare, any benchmark whose median is more than
+`tolerance` slower than the baseline's is reported and the exit code is 1.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Any, Awaitable, Callable
+
+import numpy as np
+
+from app.domain.downsample import downsample_sugar
+from app.domain.models import MeasurementColumns, SugarSeries
+from app.domain.parsing import parse_bp, parse_sugar
+from app.infra import repo
+from app.infra.db import Database
+from app.infra.ingest import WriteBatcher
+from app.services import reports
+from app.services.importer import parse_import
+from app.services.reminders import ReminderDispatcher, schedule_all_from_db
+from bench.population import populate
+
+Result = dict[str, Any]
+
+MAX_POINTS = 600  # REPORT_MAX_POINTS default
+
+def _summary(samples: list[float], items: int = 0) -> Result:
+    samples = sorted(samples)
+    out: Result = {
+        "n": len(samples),
+        "min_s": samples[0],
+        "median_s": statistics.median(samples),
+        "p95_s": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+    }
+    if items:
+        out["items"] = items
+        out["items_per_s"] = items / out["median_s"] if out["median_s"] else None
+    return out
+
+def time_sync(fn: Callable[[], Any], repeat: int, warmup: int = 1, items: int = 0) -> Result:
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t)
+    return _summary(samples, items)
+
+async def time_async(fn: Callable[[], Awaitable[Any]], repeat: int, warmup: int = 1, items: int = 0) -> Result:
+    for _ in range(warmup):
+        await fn()
+    samples = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        await fn()
+        samples.append(time.perf_counter() - t)
+    return _summary(samples, items)
+
+SUGAR_INPUTS = ["5.6", "5,6", "сахар 7.2", "12", "  6,35 ммоль"] * 200
+BP_INPUTS = ["120 80 60", "120/80", "135:85:72", "118-76-64", "давление 140 90"] * 200
+
+def bench_parse_sugar(repeat: int) -> Result:
+    return time_sync(lambda: [parse_sugar(t) for t in SUGAR_INPUTS], repeat, items=len(SUGAR_INPUTS))
+
+def bench_parse_bp(repeat: int) -> Result:
+    return time_sync(lambda: [parse_bp(t) for t in BP_INPUTS], repeat, items=len(BP_INPUTS))
+
+def bench_aggregate_daily(repeat: int, days: int) -> Result:
+    rnd = np.random.default_rng(1)
+    n = days * 8
+    ts = np.sort(rnd.integers(0, days * 86_400_000, n)).astype(np.int64)
+    values = rnd.normal(6.5, 1.5, n)
+    return time_sync(lambda: reports._aggregate_daily(ts, values), repeat, items=n)
+
+def _dense_sugar(days: int, per_day: int = 96) -> tuple[np.ndarray, np.ndarray]:
+    """A sensor-like sugar trace: a reading every 24h/per_day, with noise and a few spikes."""
+    rnd = np.random.default_rng(1)
+    n = days * per_day
+    ts = np.arange(n, dtype=np.int64) * (86_400_000 // per_day)
+    values = np.clip(6.5 + 1.5 * np.sin(np.arange(n) / per_day * 2 * np.pi) + rnd.normal(0, 0.6, n), 2.0, 20.0)
+    values[rnd.integers(0, n, max(1, n // 500))] = rnd.choice([2.5, 16.0], max(1, n // 500))
+    return ts, values
+
+def bench_downsample(repeat: int, days: int) -> Result:
+    ts, values = _dense_sugar(days)
+    series = SugarSeries(ts, values)
+    return time_sync(lambda: downsample_sugar(series, MAX_POINTS), repeat, items=len(series))
+
+def bench_report_dense(repeat: int, out_dir: str, days: int = 30) -> dict[str, Result]:
+    """30 days of sensor-like readings: the case downsampling is for."""
+    ts, values = _dense_sugar(days)
+    n = len(ts)
+    missing = np.full(n, -1, dtype=np.int32)
+    cols = MeasurementColumns(
+        ts, np.ones(n, dtype=bool), np.round(values * 100).astype(np.int32), missing, missing, missing,
+    )
+    results = {}
+    for style in ("vector", "raster"):
+        suffix = "" if style == "vector" else "_raster"
+        for max_points, label in ((MAX_POINTS, ""), (0, "_all_points")):
+            results[f"report.dense_{days}d{label}{suffix}"] = time_sync(
+                lambda: reports.build_report_pdf_from_columns(
+                    cols=cols, user_id=1, data_dir=out_dir, days=days, style=style, max_points=max_points,
+                ),
+                repeat, items=n,
+            )
+    return results
+
+async def _with_db(path: str, fn: Callable[[Database], Awaitable[Result]]) -> Result:
+    db = Database(path, readers=2)
+    await db.open()
+    try:
+        return await fn(db)
+    finally:
+        await db.close()
+
+async def bench_queries(path: str, repeat: int) -> dict[str, Result]:
+    async def run(db: Database) -> dict[str, Result]:
+        since = reports.since_ms(30)
+        n_rows = len(await repo.get_measurements(db, 1, since_ms=since))
+        return {
+            "repo.get_measurements_30d": await time_async(
+                lambda: repo.get_measurements(db, 1, since_ms=since), repeat, items=n_rows
+            ),
+            "repo.get_measurements_all": await time_async(lambda: repo.get_measurements(db, 1), repeat),
+            "repo.get_measurement_columns_30d": await time_async(
+                lambda: repo.get_measurement_columns(db, 1, since_ms=since), repeat, items=n_rows
+            ),
+            "repo.get_daily_rollup": await time_async(lambda: repo.get_daily_rollup(db, 1), repeat),
+        }
+    return await _with_db(path, run)
+
+async def bench_reports(path: str, repeat: int, out_dir: str) -> dict[str, Result]:
+    async def run(db: Database) -> dict[str, Result]:
+        results = {}
+        rollup = await repo.get_daily_rollup(db, 1)
+        for style in ("vector", "raster"):
+            suffix = "" if style == "vector" else "_raster"
+            for days in (7, 30):
+                cols = await repo.get_measurement_columns(db, 1, since_ms=reports.since_ms(days))
+                results[f"report.columns_{days}d{suffix}"] = time_sync(
+                    lambda: reports.build_report_pdf_from_columns(
+                        cols=cols, user_id=1, data_dir=out_dir, days=days, style=style, max_points=MAX_POINTS,
+                    ),
+                    repeat, items=len(cols),
+                )
+            results[f"report.rollup_all{suffix}"] = time_sync(
+                lambda: reports.build_report_pdf_from_rollup(
+                    rollup=rollup, user_id=1, data_dir=out_dir, style=style, max_points=MAX_POINTS,
+                ),
+                repeat, items=len(rollup),
+            )
+        return results
+    return await _with_db(path, run)
+
+async def bench_schedule_all(path: str, repeat: int, slots: int) -> Result:
+    async def run(db: Database) -> Result:
+        async def once() -> None:
+            await schedule_all_from_db(ReminderDispatcher(None, db), db)
+        return await time_async(once, repeat, items=slots)
+    return await _with_db(path, run)
+
+async def bench_insert(path: str, inserts: int, concurrency: int, users: int) -> Result:
+    """Concurrent insert_sugar through the group-committing WriteBatcher, as handlers do."""
+    async def run(db: Database) -> Result:
+        batcher = WriteBatcher(db)
+        await batcher.start()
+        sem = asyncio.Semaphore(concurrency)
+        base = datetime.now(timezone.utc)
+
+        async def one(i: int) -> None:
+            async with sem:
+                at = (base - timedelta(minutes=i)).isoformat()
+                await repo.insert_sugar(db, 1 + i % users, Decimal("6.1"), at)
+
+        async def burst() -> None:
+            await asyncio.gather(*(one(i) for i in range(inserts)))
+        try:
+            return await time_async(burst, repeat=3, warmup=0, items=inserts)
+        finally:
+            await batcher.close()
+    return await _with_db(path, run)
+
+def _import_text(lines: int) -> str:
+    """A pasted paper log: alternating sugar and BP lines, 14 a day, local times."""
+    rnd = np.random.default_rng(1)
+    start = datetime(2000, 1, 1)
+    out = []
+    for i in range(lines):
+        at = (start + timedelta(days=i // 14, hours=6 + i % 14, minutes=int(rnd.integers(60)))).strftime("%d.%m.%Y %H:%M")
+        if i % 2:
+            out.append(f"{at} {rnd.uniform(3, 12):.1f}")
+        else:
+            out.append(f"{at} {rnd.integers(100, 160)}/{rnd.integers(60, 95)} {rnd.integers(55, 90)}")
+    return "\n".join(out)
+
+async def bench_import(path: str, lines: int, users: int) -> dict[str, Result]:
+    """/import of a pasted log: parse + dedupe + chunked executemany, then the same text again (all duplicates)."""
+    text = _import_text(lines)
+
+    async def run(db: Database) -> dict[str, Result]:
+        user_ids = iter(range(1, users + 1))
+
+        async def once(user_id: int) -> None:
+            result = parse_import(text, "Europe/Moscow", lines)
+            await repo.insert_measurements_bulk(db, user_id, ((r.measured_at_utc, r.value) for r in result.rows))
+
+        fresh = await time_async(lambda: once(next(user_ids)), repeat=max(1, min(3, users - 1)), items=lines)
+        again = await time_async(lambda: once(1), repeat=3, warmup=0, items=lines)
+        return {"import_bulk": fresh, "import_bulk_duplicates": again}
+    return await _with_db(path, run)
+
+async def run_all(args: argparse.Namespace, work_dir: str) -> dict[str, Result]:
+    results: dict[str, Result] = {}
+
+    def want(name: str) -> bool:
+        return not args.only or any(name.startswith(o) for o in args.only)
+
+    if want("parse"):
+        results["parse_sugar"] = bench_parse_sugar(args.repeat)
+        results["parse_bp"] = bench_parse_bp(args.repeat)
+    if want("aggregate"):
+        results["aggregate_daily"] = bench_aggregate_daily(args.repeat, args.days)
+    if want("downsample"):
+        results["downsample_sugar"] = bench_downsample(args.repeat, args.days)
+
+    if want("repo") or want("report") or want("insert") or want("import"):
+        main_db = os.path.join(work_dir, "population.sqlite3")
+        db = Database(main_db, readers=1)
+        await db.open()
+        t = time.perf_counter()
+        counts = await populate(db, args.users, args.days, per_day=args.per_day)
+        await db.close()
+        results["population"] = {"build_s": time.perf_counter() - t, **counts}
+        if want("repo"):
+            results.update(await bench_queries(main_db, args.repeat))
+        if want("report"):
+            results.update(await bench_reports(main_db, max(3, args.repeat // 3), os.path.join(work_dir, "out")))
+            results.update(bench_report_dense(max(3, args.repeat // 3), os.path.join(work_dir, "out")))
+        if want("insert"):
+            results["insert_sugar_batched"] = await bench_insert(
+                main_db, args.inserts, args.insert_concurrency, min(args.users, 50)
+            )
+        if want("import"):
+            results.update(await bench_import(main_db, args.import_lines, min(args.users, 5)))
+
+    if want("schedule"):
+        slots_db = os.path.join(work_dir, "slots.sqlite3")
+        db = Database(slots_db, readers=1)
+        await db.open()
+        counts = await populate(db, -(-args.slots // 7), days=0, slots_per_user=7)
+        await db.close()
+        results["schedule_all_from_db"] = await bench_schedule_all(slots_db, max(3, args.repeat // 3), counts["slots"])
+    return results
+
+def compare(results: dict[str, Result], baseline: dict[str, Result], tolerance: float) -> list[str]:
+    regressions = []
+    for name, base in baseline.items():
+        cur = results.get(name)
+        if not cur or "median_s" not in cur or not base.get("median_s"):
+            continue
+        ratio = cur["median_s"] / base["median_s"]
+        cur["vs_baseline"] = round(ratio, 3)
+        if ratio > 1 + tolerance:
+            regressions.append(f"{name}: {base['median_s']:.6f}s -> {cur['median_s']:.6f}s (x{ratio:.2f})")
+    return regressions
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m bench.run")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--per-day", type=int, default=4)
+    parser.add_argument("--slots", type=int, default=100_000, help="reminder slots for schedule_all_from_db")
+    parser.add_argument("--inserts", type=int, default=2000)
+    parser.add_argument("--import-lines", type=int, default=10_000, help="lines per bulk import")
+    parser.add_argument("--insert-concurrency", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=9)
+    parser.add_argument("--only", nargs="*", help="name prefixes: parse aggregate downsample repo report insert import schedule")
+    parser.add_argument("--dir", default=None, help="where to build the temp databases (default: system tmp)")
+    parser.add_argument("--out", default=None, help="write JSON here instead of stdout")
+    parser.add_argument("--compare", default=None, help="baseline JSON from an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs baseline (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="healthbot-bench-", dir=args.dir)
+    try:
+        results = asyncio.run(run_all(args, work_dir))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    regressions: list[str] = []
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f)["results"], args.tolerance)
+
+    doc = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": {k: v for k, v in vars(args).items() if k not in ("out", "compare", "dir")},
+        },
+        "results": results,
+        "regressions": regressions,
+    }
+    text = json.dumps(doc, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    for r in regressions:
+        print(f"REGRESSION {r}", file=sys.stderr)
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Cold-start benchmark: import time and RSS of the bot process, and time until it polls.
+
+    python bench/startup.py [--runs 5] [--max-import-ms N] [--max-rss-mb N] [--max-ready-ms N] [--json]
+
+Each run is a fresh interpreter doing `python -X importtime -c "import app.main"`,
+then a fresh `python -m app.main` against a stub Bot API on localhost, timed
+from spawn to its first getUpdates call (empty data dir, so no backfill).
+Reports the best-of-N times, peak RSS, the slowest modules, and fails (exit 1)
+if a threshold is exceeded or a module that must stay lazy (matplotlib,
+reportlab) got imported.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LAZY_MODULES = ("matplotlib", "reportlab", "app.services.plotting")
+
+_PROBE = (
+    "import resource, sys\n"
+    "import app.main\n"
+    "print('RSS_KB', resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)\n"
+    f"print('LOADED', ' '.join(m for m in {LAZY_MODULES!r} if m in sys.modules))\n"
+)
+
+def _run_once() -> dict:
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    modules: dict[str, tuple[int, int]] = {}
+    total_us = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|", 2)
+        modules[name.strip()] = (int(self_us), int(cum_us))
+        if not name.startswith("  "):  # top-level import: cumulative covers its subtree
+            total_us += int(cum_us)
+    out = dict(l.split(" ", 1) for l in proc.stdout.splitlines() if " " in l)
+    return {
+        "import_ms": total_us / 1000,
+        "rss_mb": int(out.get("RSS_KB", "0")) / 1024,
+        "lazy_loaded": out.get("LOADED", "").split(),
+        "modules": modules,
+    }
+
+async def _time_to_polling(timeout: float) -> float:
+    """Seconds from spawning `python -m app.main` to its first getUpdates."""
+    from aiohttp import web
+
+    polling = asyncio.Event()
+
+    async def handle(request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        if method == "getUpdates":
+            polling.set()
+            return web.json_response({"ok": True, "result": []})
+        if method == "getMe":
+            return web.json_response({"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "bench"}})
+        return web.json_response({"ok": True, "result": True})
+
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    data_dir = tempfile.mkdtemp(prefix="healthbot-startup-")
+    env = dict(
+        os.environ,
+        PYTHONPATH=ROOT,
+        BOT_TOKEN="123456:STARTUP",
+        BOT_API_URL=f"http://127.0.0.1:{port}",
+        BOT_MODE="polling",
+        DATA_DIR=data_dir,
+        LOG_LEVEL="WARNING",
+    )
+    t = time.perf_counter()
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "app.main", cwd=ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        await asyncio.wait_for(polling.wait(), timeout)
+        return time.perf_counter() - t
+    finally:
+        proc.terminate()
+        await proc.wait()
+        await runner.cleanup()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python bench/startup.py")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="slowest modules to list")
+    parser.add_argument("--max-import-ms", type=float, default=None)
+    parser.add_argument("--max-rss-mb", type=float, default=None)
+    parser.add_argument("--max-ready-ms", type=float, default=None, help="spawn to first getUpdates")
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    args = parser.parse_args()
+
+    runs = [_run_once() for _ in range(max(1, args.runs))]
+    ready = [asyncio.run(_time_to_polling(timeout=60)) * 1000 for _ in range(max(1, args.runs))]
+    best = min(runs, key=lambda r: r["import_ms"])
+    slowest = sorted(best["modules"].items(), key=lambda kv: kv[1][0], reverse=True)[: args.top]
+    result = {
+        "import_ms": round(best["import_ms"], 1),
+        "import_ms_runs": [round(r["import_ms"], 1) for r in runs],
+        "ready_ms": round(min(ready), 1),
+        "ready_ms_runs": [round(r, 1) for r in ready],
+        "rss_mb": round(max(r["rss_mb"] for r in runs), 1),
+        "lazy_loaded": best["lazy_loaded"],
+        "slowest_self_ms": [(name, round(self_us / 1000, 1)) for name, (self_us, _) in slowest],
+    }
+
+    failures = []
+    if result["lazy_loaded"]:
+        failures.append(f"imported at startup: {', '.join(result['lazy_loaded'])}")
+    if args.max_import_ms is not None and result["import_ms"] > args.max_import_ms:
+        failures.append(f"import {result['import_ms']} ms > {args.max_import_ms} ms")
+    if args.max_rss_mb is not None and result["rss_mb"] > args.max_rss_mb:
+        failures.append(f"RSS {result['rss_mb']} MB > {args.max_rss_mb} MB")
+    if args.max_ready_ms is not None and result["ready_ms"] > args.max_ready_ms:
+        failures.append(f"polling after {result['ready_ms']} ms > {args.max_ready_ms} ms")
+    result["failures"] = failures
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print(f"import app.main: {result['import_ms']} ms (best of {len(runs)}), peak RSS {result['rss_mb']} MB")
+        print(f"spawn to first getUpdates: {result['ready_ms']} ms (best of {len(ready)})")
+        print("slowest modules (self time):")
+        for name, ms in result["slowest_self_ms"]:
+            print(f"  {ms:8.1f} ms  {name}")
+        for f in failures:
+            print(f"FAIL: {f}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
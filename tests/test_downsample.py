@@ -0,0 +1,50 @@
+"""Min/max downsampling: point budget, extremes and endpoints survive."""
+from __future__ import annotations
+
+import numpy as np
+
+from app.domain.downsample import downsample_bp, downsample_sugar
+from app.domain.models import BPSeries, SugarSeries
+
+def _ts(n: int) -> np.ndarray:
+    return 1704067200000 + np.arange(n, dtype=np.int64) * 300_000  # every 5 minutes
+
+def _sugar(n: int, seed: int = 1) -> SugarSeries:
+    rng = np.random.default_rng(seed)
+    return SugarSeries(_ts(n), rng.normal(6.5, 1.0, n))
+
+def test_sugar_under_budget_is_unchanged():
+    series = _sugar(100)
+    assert downsample_sugar(series, 100) is series
+    assert downsample_sugar(series, 0) is series
+
+def test_sugar_keeps_budget_endpoints_and_spikes():
+    series = _sugar(20_000)
+    series.value[7_777] = 1.9   # hypo
+    series.value[12_345] = 27.0  # hyper
+    out = downsample_sugar(series, 500)
+    assert len(out) <= 500
+    assert out.ts_ms[0] == series.ts_ms[0] and out.ts_ms[-1] == series.ts_ms[-1]
+    assert np.all(np.diff(out.ts_ms) > 0)
+    assert out.value.min() == 1.9 and out.value.max() == 27.0
+    assert series.ts_ms[7_777] in out.ts_ms and series.ts_ms[12_345] in out.ts_ms
+
+def test_sugar_points_are_original_readings():
+    series = _sugar(5_000)
+    out = downsample_sugar(series, 300)
+    idx = np.searchsorted(series.ts_ms, out.ts_ms)
+    assert np.array_equal(series.value[idx], out.value)
+
+def test_bp_keeps_extremes_of_every_column():
+    n = 10_000
+    rng = np.random.default_rng(2)
+    pulse = rng.normal(70, 5, n)
+    pulse[::3] = np.nan  # pulse is optional
+    series = BPSeries(_ts(n), rng.normal(125, 8, n), rng.normal(80, 5, n), pulse)
+    series.sys[4_000] = 210.0
+    series.dia[6_000] = 40.0
+    out = downsample_bp(series, 600)
+    assert len(out) <= 600
+    assert out.sys.max() == 210.0 and out.dia.min() == 40.0
+    assert np.nanmax(out.pulse) == np.nanmax(series.pulse)
+    assert np.nanmin(out.pulse) == np.nanmin(series.pulse)
@@ -0,0 +1,89 @@
+"""Bulk import: pasted lines and CSV parsing, rejections, the line limit and dedup on insert."""
+from __future__ import annotations
+
+import asyncio
+from decimal import Decimal
+
+import pytest
+
+from app.domain.models import BP
+from app.infra import repo
+from app.infra.db import Database
+from app.services.importer import MAX_REJECTS_SHOWN, decode_upload, parse_import, parse_line
+
+@pytest.mark.parametrize(
+    "line, values",
+    [
+        ("2024-03-05 08:30 5.6", [Decimal("5.6")]),
+        ("05.03.2024 21:10 135/85 72", [BP(135, 85, 72)]),
+        ("05.03.24 21:10 120 80", [BP(120, 80, None)]),
+        ("05.03.2024 21:10 6,1 135/85/72", [Decimal("6.1"), BP(135, 85, 72)]),
+    ],
+)
+def test_parse_line_formats(line, values):
+    assert [r.value for r in parse_line(line, "UTC")] == values
+
+def test_parse_line_local_time_and_explicit_offset():
+    assert parse_line("2024-03-05 08:30 5.6", "Europe/Moscow")[0].measured_at_utc.startswith("2024-03-05T05:30")
+    # an explicit offset (our own export) wins over the user's zone
+    row = parse_line("2024-03-05T08:30:00+00:00 5.6", "Europe/Moscow")[0]
+    assert row.measured_at_utc.startswith("2024-03-05T08:30")
+
+@pytest.mark.parametrize("line", ["5.6", "2024-03-05 08:30", "2024-02-30 08:30 5.6", "2024-03-05 08:30 5.6 6.1"])
+def test_parse_line_rejects(line):
+    with pytest.raises(ValueError):
+        parse_line(line, "UTC")
+
+def test_parse_import_csv_with_header():
+    text = "Дата;Время;Сахар;САД;ДАД;Пульс\n05.03.2024;08:30;5,6;;;\n05.03.2024;21:10;;135;85;72\n"
+    result = parse_import(text, "UTC", 100)
+    assert result.lines == 2 and result.rejected_count == 0
+    assert [r.value for r in result.rows] == [Decimal("5.6"), BP(135, 85, 72)]
+
+def test_parse_import_counts_rejections():
+    bad = ["garbage"] * (MAX_REJECTS_SHOWN + 5)
+    result = parse_import("\n".join(["2024-03-05 08:30 5.6", *bad]), "UTC", 100)
+    assert result.lines == len(bad) + 1
+    assert len(result.rows) == 1
+    assert result.rejected_count == len(bad)
+    assert len(result.rejected) == MAX_REJECTS_SHOWN
+    assert result.rejected[0][0] == 2  # line numbers are 1-based
+    assert not result.truncated
+
+def test_parse_import_limit_truncates_without_rejecting():
+    text = "\n".join(f"2024-03-05 08:{m:02d} 5.6" for m in range(10))
+    result = parse_import(text, "UTC", 4)
+    assert result.truncated
+    assert result.lines == 4 and len(result.rows) == 4
+    assert result.rejected_count == 0
+
+    exact = parse_import(text, "UTC", 10)
+    assert not exact.truncated and exact.lines == 10
+
+def test_decode_upload_falls_back_to_cp1251():
+    assert decode_upload("﻿Дата;Сахар".encode("utf-8")) == "Дата;Сахар"
+    assert decode_upload("Дата;Сахар".encode("cp1251")) == "Дата;Сахар"
+
+def test_insert_bulk_skips_duplicates(tmp_path):
+    rows = [
+        ("2024-03-05T08:30:00+00:00", Decimal("5.6")),
+        ("2024-03-05T08:30:00+00:00", Decimal("5.6")),  # repeated within the file
+        ("2024-03-05T08:30:00+00:00", BP(120, 80, None)),  # same instant, other kind
+        ("2024-03-05T09:30:00+00:00", Decimal("5.60")),
+    ]
+
+    async def run() -> tuple[tuple[int, int], tuple[int, int]]:
+        db = Database(str(tmp_path / "import.sqlite3"), readers=1)
+        await db.open()
+        try:
+            await repo.upsert_user(db, 1, "UTC")
+            first = await repo.insert_measurements_bulk(db, 1, rows, chunk_size=2)
+            # importing the same file again adds nothing
+            again = await repo.insert_measurements_bulk(db, 1, rows)
+            return first, again
+        finally:
+            await db.close()
+
+    first, again = asyncio.run(run())
+    assert first == (3, 1)
+    assert again == (0, 4)
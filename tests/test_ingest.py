@@ -0,0 +1,77 @@
+"""WriteBatcher: a failing op fails only its own submitter; the batcher outlives a broken flush."""
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from app.infra.db import Database
+from app.infra.ingest import WriteBatcher
+
+def _insert(x: int, calls: list[int]):
+    async def op(conn):
+        calls.append(x)
+        await conn.execute("INSERT INTO t(x) VALUES (?)", (x,))
+        return x
+    return op
+
+async def _open(tmp_path) -> Database:
+    db = Database(str(tmp_path / "ingest.sqlite3"), readers=1)
+    await db.open()
+    async with db.writer() as conn:
+        await conn.execute("CREATE TABLE t (x INTEGER PRIMARY KEY)")
+        await conn.commit()
+    return db
+
+async def _stored(db: Database) -> list[int]:
+    async with db.reader() as conn:
+        cur = await conn.execute("SELECT x FROM t ORDER BY x")
+        return [x for (x,) in await cur.fetchall()]
+
+def test_failing_op_is_isolated_by_replay(tmp_path):
+    async def run():
+        db = await _open(tmp_path)
+        batcher = WriteBatcher(db, max_batch=16, max_delay=0.05)
+        await batcher.start()
+        calls: list[int] = []
+        try:
+            # 2 twice: the second insert violates the primary key and fails the shared transaction
+            results = await asyncio.gather(
+                *(batcher.submit(_insert(x, calls)) for x in (1, 2, 3, 2, 4)), return_exceptions=True
+            )
+            return results, calls, await _stored(db)
+        finally:
+            await batcher.close()
+            await db.close()
+
+    results, calls, stored = asyncio.run(run())
+    assert results[:3] == [1, 2, 3] and results[4] == 4
+    assert isinstance(results[3], Exception)
+    assert stored == [1, 2, 3, 4]
+    # ops 1..3 ran in the failed batch and again one by one
+    assert calls[:4] == [1, 2, 3, 2] and calls[4:] == [1, 2, 3, 2, 4]
+
+def test_batcher_survives_failed_flush(tmp_path, monkeypatch):
+    async def run():
+        db = await _open(tmp_path)
+        batcher = WriteBatcher(db, max_delay=0)
+        await batcher.start()
+        flush = batcher._flush
+
+        async def broken_once(batch):
+            # e.g. the rollback after a failed op raised as well
+            monkeypatch.setattr(batcher, "_flush", flush)
+            raise RuntimeError("rollback failed")
+
+        monkeypatch.setattr(batcher, "_flush", broken_once)
+        calls: list[int] = []
+        try:
+            with pytest.raises(RuntimeError, match="rollback failed"):
+                await batcher.submit(_insert(1, calls))
+            assert await batcher.submit(_insert(2, calls)) == 2
+            return await _stored(db)
+        finally:
+            await batcher.close()
+            await db.close()
+
+    assert asyncio.run(run()) == [2]
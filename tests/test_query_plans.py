@@ -0,0 +1,37 @@
+"""Report queries must stay on the measurements indexes (EXPLAIN QUERY PLAN on a fresh, migrated DB)."""
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from app.infra import repo
+from app.infra.db import SCHEMA_VERSION, connect, explain_query_plan, init_db, migrate
+
+MEASUREMENT_INDEXES = ("USING INDEX ix_measurements_user_ms", "USING INDEX ix_measurements_user_kind_ms")
+
+REPORT_QUERIES = [
+    ("measurements since", repo.SQL_MEASUREMENTS_SINCE, (1, 1704067200000)),
+    ("measurements all", repo.SQL_MEASUREMENTS_ALL, (1,)),
+    ("measurement columns", repo.SQL_MEASUREMENT_COLUMNS, (1, 1704067200000)),
+]
+
+def _plans(tmp_path) -> dict[str, list[str]]:
+    async def run() -> dict[str, list[str]]:
+        conn = await connect(str(tmp_path / "plans.sqlite3"))
+        try:
+            await init_db(conn)
+            assert await migrate(conn) == SCHEMA_VERSION
+            return {label: await explain_query_plan(conn, sql, params) for label, sql, params in REPORT_QUERIES}
+        finally:
+            await conn.close()
+
+    return asyncio.run(run())
+
+@pytest.mark.parametrize("label", [label for label, _, _ in REPORT_QUERIES])
+def test_report_query_uses_measurement_index(tmp_path, label):
+    plan = _plans(tmp_path)[label]
+    measurement_steps = [line for line in plan if "measurements" in line]
+    assert measurement_steps, plan
+    for line in measurement_steps:
+        assert any(ix in line for ix in MEASUREMENT_INDEXES), f"{label}: {plan}"